@@ -1,66 +1,105 @@
 
 # ai_insights.py
 import pandas as pd
+import numpy as np
 
 VERSION = "7-Layer-Framework-v3.0"
 
 def generate_insight(row):
     """
     Generates a structured, institutional-grade narrative based on the 7-Layer Framework.
+    Single-row wrapper around generate_insights.
     """
+    out = generate_insights(pd.DataFrame([row]))
+    return out["AI_Insight"].iloc[0], out["Risk_Note"].iloc[0], out["AI_Version"].iloc[0]
+
+def _col(df, name, default):
+    """Numeric column, or the scalar default when the column is absent (NaN values stay NaN)."""
+    if name not in df.columns:
+        return np.full(len(df), default, dtype=float)
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+
+def generate_insights(df, top_n=None):
+    """
+    Batch narrative generation. The framework's threshold rules are evaluated as
+    column masks in one pass; strings are only assembled for the top_n rows by
+    TotalScore (every row if top_n is None or there is no TotalScore).
+    Returns AI_Insight / Risk_Note / AI_Version aligned to df.index, None for rows not emitted.
+    """
+    out = pd.DataFrame({"AI_Insight": None, "Risk_Note": None, "AI_Version": None}, index=df.index, dtype=object)
+    if df.empty:
+        return out
+    if top_n is not None and "TotalScore" in df.columns:
+        # Same ordering the scanner exports with, so the emitted rows are exactly the ones shown
+        df = df.sort_values("TotalScore", ascending=False).head(top_n)
+
     # Fundamentals
-    rev_cagr = row.get("Rev_CAGR_3Y", 0)
-    roic = row.get("ROIC", 0)
+    rev_cagr = _col(df, "Rev_CAGR_3Y", 0)
+    roic = _col(df, "ROIC", 0)
     # Valuation
-    pe = row.get("ForwardPE", 0)
-    peg = row.get("PegRatio", 0)
+    pe = _col(df, "ForwardPE", 0)
+    peg = _col(df, "PegRatio", 0)
     # Technicals
-    price = row.get("Price", 0)
-    ma200 = row.get("MA200", 0)
-    rsi = row.get("RSI", 50)
+    price = _col(df, "Price", 0)
+    ma200 = _col(df, "MA200", 0)
+    rsi = _col(df, "RSI", 50)
     # Risk
-    beta = row.get("Beta", 1.0)
+    beta = _col(df, "Beta", 1.0)
     
     # Scores
-    score_qual = row.get("Score_Quality", 50)
-    score_val = row.get("Score_Valuation", 50)
-    score_tech = row.get("Score_Technicals", 50)
+    score_qual = _col(df, "Score_Quality", 50)
+    score_val = _col(df, "Score_Valuation", 50)
+    score_tech = _col(df, "Score_Technicals", 50)
     
     # Thesis Hook
-    rank = int(row.get('Rank', 0))
-    sector = row.get('Sector', 'Market')
-    thesis = f"Ranked #{rank} in {sector}."
-    if score_qual > 70 and score_val > 70:
-        thesis += " A rare 'Double Threat' offering both high quality and deep value."
-    elif score_qual > 80:
-        thesis += " A premium quality compounder with industry-leading fundamentals."
-    elif score_val > 80:
-        thesis += " A Deep Value play trading at a significant discount."
-    elif score_tech > 80:
-        thesis += " Showing strong momentum; technicals suggest accumulation."
-        
+    rank = _col(df, "Rank", 0).astype(int)
+    sector = df["Sector"] if "Sector" in df.columns else pd.Series("Market", index=df.index)
+    hook = np.select(
+        [(score_qual > 70) & (score_val > 70), score_qual > 80, score_val > 80, score_tech > 80],
+        [" A rare 'Double Threat' offering both high quality and deep value.",
+         " A premium quality compounder with industry-leading fundamentals.",
+         " A Deep Value play trading at a significant discount.",
+         " Showing strong momentum; technicals suggest accumulation."],
+        "",
+    )
+    
     # Fundamentals
-    fund_notes = []
-    if rev_cagr > 0.15: fund_notes.append(f"Hyper-growth ({rev_cagr:.1%})")
-    elif rev_cagr > 0.05: fund_notes.append(f"Steady growth ({rev_cagr:.1%})")
-    if roic > 0.15: fund_notes.append(f"Wide Moat (ROIC {roic:.1%})")
-    fund_str = f"**Business:** {' & '.join(fund_notes)}." if fund_notes else "Business: Reliable steady-state metrics."
-
+    growth = np.select([rev_cagr > 0.15, rev_cagr > 0.05], ["Hyper-growth", "Steady growth"], "")
+    moat = roic > 0.15
+    
     # Valuation
-    val_notes = []
-    if pe < 15: val_notes.append(f"Cheap P/E ({pe:.1f}x)")
-    elif pe > 30: val_notes.append(f"Premium P/E ({pe:.1f}x)")
-    if peg > 0 and peg < 1.0: val_notes.append(f"Undervalued PEG ({peg:.2f})")
-    val_str = f"**Value:** {', '.join(val_notes)}." if val_notes else f"**Value:** Fairly priced (P/E {pe:.1f}x)."
-
+    pe_label = np.select([pe < 15, pe > 30], ["Cheap P/E", "Premium P/E"], "")
+    cheap_peg = (peg > 0) & (peg < 1.0)
+    
     # Timing
-    tech_notes = []
-    if pd.notnull(ma200) and price > ma200: tech_notes.append("Uptrend (>200DMA)")
-    elif pd.notnull(ma200): tech_notes.append("Below 200DMA (Caution)")
-    if rsi < 35: tech_notes.append("Oversold (Bounce potential)")
-    tech_str = f"**Timing:** {', '.join(tech_notes)}." if tech_notes else "**Timing:** Neutral setup."
+    has_ma = ~np.isnan(ma200)
+    uptrend = has_ma & (price > ma200)
+    oversold = rsi < 35
+
+    insights, risks = [], []
+    for i, sec in enumerate(sector):
+        fund_notes = []
+        if growth[i]: fund_notes.append(f"{growth[i]} ({rev_cagr[i]:.1%})")
+        if moat[i]: fund_notes.append(f"Wide Moat (ROIC {roic[i]:.1%})")
+        fund_str = f"**Business:** {' & '.join(fund_notes)}." if fund_notes else "Business: Reliable steady-state metrics."
+
+        val_notes = []
+        if pe_label[i]: val_notes.append(f"{pe_label[i]} ({pe[i]:.1f}x)")
+        if cheap_peg[i]: val_notes.append(f"Undervalued PEG ({peg[i]:.2f})")
+        val_str = f"**Value:** {', '.join(val_notes)}." if val_notes else f"**Value:** Fairly priced (P/E {pe[i]:.1f}x)."
+
+        tech_notes = []
+        if has_ma[i]: tech_notes.append("Uptrend (>200DMA)" if uptrend[i] else "Below 200DMA (Caution)")
+        if oversold[i]: tech_notes.append("Oversold (Bounce potential)")
+        tech_str = f"**Timing:** {', '.join(tech_notes)}." if tech_notes else "**Timing:** Neutral setup."
+
+        insights.append(f"Ranked #{rank[i]} in {sec}.{hook[i]} {fund_str} {val_str} {tech_str}")
+        risks.append(f"Beta: {beta[i]:.2f}")
 
-    return f"{thesis} {fund_str} {val_str} {tech_str}", f"Beta: {beta:.2f}", VERSION
+    out.loc[df.index, "AI_Insight"] = insights
+    out.loc[df.index, "Risk_Note"] = risks
+    out.loc[df.index, "AI_Version"] = VERSION
+    return out
 
 def generate_fidelity_card(ticker, rating, metrics):
     """
@@ -0,0 +1,92 @@
+import numpy as np
+
+# Per-ticker analysis context shared by the four analyzers (fundamentals, valuation,
+# technicals, risk). It wraps one data_fetcher.get_stock_data dict and computes derived
+# data lazily, once: close returns, drawdowns, statement rows / latest values, and
+# (via technicals.py) the batch-engine indicators. Analyzers accept either the raw dict
+# or a context; scoring.analyze() runs all four on one context so nothing is derived twice,
+# and scoring.analyze_many() fills the technicals of many contexts in one batch pass.
+
+_MISSING = object() # Memoized "statement / row not available"
+
+class AnalysisContext:
+    """One ticker's data plus memoized derived series and statement lookups."""
+    def __init__(self, data):
+        self.data = data
+        self.symbol = data.get("symbol", "TICKER")
+        self.info = data.get("info", {})
+        self.history = data.get("history")
+        self._memo = {}
+
+    def get(self, key, default=None):
+        """dict-style access to the raw data, so a context can stand in for the data dict."""
+        return self.data.get(key, default)
+
+    def memo(self, key, fn):
+        """fn() computed on first use and cached under key."""
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def is_cached(self, key):
+        return key in self._memo
+
+    def put(self, key, value):
+        """Stores a value computed elsewhere (e.g. in a batch over many contexts)."""
+        self._memo[key] = value
+
+    def has_history(self):
+        return self.history is not None and not self.history.empty
+
+    # --- Price history ---
+
+    @property
+    def close(self):
+        return self.history["Close"]
+
+    @property
+    def returns(self):
+        """Daily simple returns of the close (first bar dropped)."""
+        return self.memo("returns", lambda: self.close.pct_change().dropna())
+
+    def volatility(self, periods=252):
+        """Annualized standard deviation of daily returns."""
+        return self.memo(("volatility", periods), lambda: self.returns.std() * np.sqrt(periods))
+
+    def max_drawdown(self, window=252):
+        """Deepest peak-to-trough fall of the close over the last `window` bars (<= 0)."""
+        def compute():
+            close = self.close.iloc[-window:]
+            rolling_max = close.cummax()
+            return ((close - rolling_max) / rolling_max).min()
+        return self.memo(("max_drawdown", window), compute)
+
+    # --- Statements (yfinance layout: rows are line items, columns are periods, latest first) ---
+
+    def statement(self, name):
+        return self.data.get(name)
+
+    def row(self, name, key):
+        """Line item `key` of statement `name` as a Series. KeyError if the statement or item is missing."""
+        def lookup():
+            df = self.statement(name)
+            if df is None or df.empty or key not in df.index:
+                return _MISSING
+            return df.loc[key]
+        value = self.memo(("row", name, key), lookup)
+        if value is _MISSING:
+            raise KeyError(f"{name}: {key}")
+        return value
+
+    def latest(self, name, key, default=0):
+        """Most recent value of a line item, or default if it is not available."""
+        try:
+            return self.row(name, key).iloc[0]
+        except:
+            return default
+
+def context(data):
+    """AnalysisContext for a data dict (an existing context is returned as is); None for no data."""
+    if data is None or isinstance(data, AnalysisContext):
+        return data
+    return AnalysisContext(data)
@@ -1,18 +1,31 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
-import os
 
 # Import modules
 import data_fetcher
-import fundamentals
-import valuation
-import technicals
-import risk
-import scoring
 import utils
+import providers
+import app_cache # Cached wrappers around data_fetcher, the analyzers and scanner output
+import watchlist_service
+import profiling
+import dcf_engine
+
+# Rank History chart window (scan dates); keeps the render cost flat as history grows
+RANK_HISTORY_SCANS = 90
+# Dashboard cards per page (the scan results hold the whole ranked universe)
+DASHBOARD_PAGE_SIZE = 20
+
+def lazy_expander(label, key):
+    """
+    Expander whose body only needs to run while it is open. Returns (expander, is_open).
+    Streamlit versions without expander state tracking always report open.
+    """
+    try:
+        exp = st.expander(label, expanded=False, key=key, on_change="rerun")
+    except TypeError:
+        return st.expander(label, expanded=False), True
+    return exp, bool(getattr(exp, "open", True))
 
 # Set page config
 st.set_page_config(page_title="Stock Analyzer | Pro", layout="wide", initial_sidebar_state="collapsed")
@@ -151,13 +164,11 @@ with st.sidebar:
     # --- MARKET MINI-BOARD ---
     st.markdown("### Market Pulse")
     try:
-        import yfinance as yf
         indices = {"SPY": "S&P 500", "QQQ": "Nasdaq", "DIA": "Dow 30"}
+        pulse = app_cache.market_pulse(tuple(indices))
         for sym, name in indices.items():
-            idx_data = yf.Ticker(sym).history(period="2d")
-            if not idx_data.empty:
-                last_price = idx_data['Close'].iloc[-1]
-                prev_price = idx_data['Close'].iloc[-2]
+            if sym in pulse:
+                last_price, prev_price = pulse[sym]
                 chg = last_price - prev_price
                 pct = (chg / prev_price) * 100
                 color = "#128848" if chg >= 0 else "#D32F2F"
@@ -177,10 +188,11 @@ with st.sidebar:
     st.markdown("---")
     
     # --- SCANNER & WATCHLIST STATS ---
-    if os.path.exists("scan_history.csv"):
-        hist_df = pd.read_csv("scan_history.csv")
-        ticker_count = hist_df['Ticker'].nunique()
-        last_update = hist_df['Date'].max()
+    hist_dates = app_cache.history_dates()
+    if hist_dates:
+        # Served from the history index, no scan files are read
+        ticker_count = app_cache.history_ticker_count()
+        last_update = hist_dates[-1]
         st.markdown(f"""
         <div style='background: #f8f9fa; padding: 10px; border-radius: 4px; border: 1px solid #eee;'>
             <div style='font-size: 10px; color: #888; text-transform: uppercase; font-weight: 800;'>Analysis Universe</div>
@@ -194,7 +206,16 @@ with st.sidebar:
         st.markdown(f"⭐ **{len(wl)}** Saved Stocks")
 
     st.markdown("---")
-    st.markdown("v3.0.0 | Connected")
+    if st.button("🔄 Refresh data", help="Drop cached market data and scanner output"):
+        app_cache.clear()
+        st.rerun()
+    st.markdown(f"v3.0.0 | Connected ({providers.get_provider().name})")
+    if profiling.enabled():
+        with st.expander("⏱ Profile (this session)"):
+            st.dataframe(pd.DataFrame(profiling.report()["stages"]), hide_index=True)
+
+# Page handler timing (no-op unless STOCK_PROFILE is set)
+_page_profile = profiling.begin(f"app:{page}")
 
 # --- PAGE: DASHBOARD (Top 10) ---
 if page == "Dashboard":
@@ -202,18 +223,17 @@ if page == "Dashboard":
     st.markdown("## Top Opportunities 🚀")
     
     # --- MARKET CONTEXT PANEL ("WHAT CHANGED") ---
-    if os.path.exists("scan_history.csv"):
+    if hist_dates:
         try:
-            hist_df = pd.read_csv("scan_history.csv")
-            dates = sorted(hist_df['Date'].unique(), reverse=True)
+            dates = hist_dates[::-1]
             
             if len(dates) >= 2:
                 latest = dates[0]
                 prev = dates[1]
                 
-                # Get Top 10 for both days
-                df_lat = hist_df[hist_df['Date'] == latest].sort_values("Rank").head(10)
-                df_prev = hist_df[hist_df['Date'] == prev].sort_values("Rank").head(10)
+                # Get Top 10 for both days (one partition each)
+                df_lat = app_cache.history_date(latest).sort_values("Rank").head(10)
+                df_prev = app_cache.history_date(prev).sort_values("Rank").head(10)
                 
                 lat_tickers = set(df_lat['Ticker'])
                 prev_tickers = set(df_prev['Ticker'])
@@ -260,7 +280,8 @@ if page == "Dashboard":
             
     # Load Data
     try:
-        df_top = pd.read_excel("top10_pro.xlsx")
+        df_all = app_cache.top_picks() # Full ranked universe, best first
+        df_top = df_all.head(DASHBOARD_PAGE_SIZE)
         
         # --- MARKET PULSE AI SUMMARY ---
         if not df_top.empty:
@@ -283,7 +304,7 @@ if page == "Dashboard":
                 sort_by = st.selectbox("Sort By", ["Score (High to Low)", "Score (Low to High)", "Ticker (A-Z)"], index=0)
             
             with ctrl2:
-                all_sectors = ["All Sectors"] + sorted(df_top['Sector'].unique().tolist())
+                all_sectors = ["All Sectors"] + sorted(df_all['Sector'].dropna().unique().tolist())
                 filter_sector = st.multiselect("Filter by Sector", all_sectors, default=["All Sectors"])
             
             with ctrl3:
@@ -291,7 +312,7 @@ if page == "Dashboard":
                 st.caption("Ratings: 💡 AI-Driven")
         
         # Apply filters
-        df_filtered = df_top.copy()
+        df_filtered = df_all.copy()
         
         # 0. Pre-calculate Rating for Filtering (Nomenclature: BUY/HOLD/SELL)
         def get_rating(s):
@@ -325,7 +346,15 @@ if page == "Dashboard":
         elif sort_by == "Ticker (A-Z)":
             df_filtered = df_filtered.sort_values("Ticker")
         
-        df_top = df_filtered.reset_index(drop=True)
+        # Paging: cards, KPIs and charts cover one page; the full table below has every row
+        df_filtered = df_filtered.reset_index(drop=True)
+        n_pages = max(1, -(-len(df_filtered) // DASHBOARD_PAGE_SIZE))
+        page_no = 1
+        if n_pages > 1:
+            page_no = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
+        page_start = (page_no - 1) * DASHBOARD_PAGE_SIZE
+        df_top = df_filtered.iloc[page_start:page_start + DASHBOARD_PAGE_SIZE].reset_index(drop=True)
+        st.caption(f"Showing {page_start + 1 if len(df_top) else 0}-{page_start + len(df_top)} of {len(df_filtered)} ranked tickers")
         
         # 1. KPI Cards
         c1, c2, c3 = st.columns(3)
@@ -377,7 +406,7 @@ if page == "Dashboard":
                     "DebtToEquity": row.get('Debt_EBITDA', 0) * 20, # Heuristic mapping for display
                     "Beta": row.get('Beta', 1.0),
                     "CompanyName": row.get('Name', row.get('Ticker', 'Unknown')),
-                    "Rank": i + 1,
+                    "Rank": page_start + i + 1,
                     "TotalScore": row['TotalScore'] * 0.6, # Scaling to 60 as per new UI
                     "Score_Fundamentals": row.get('Score_Quality', 50),
                     "Score_Technicals": row.get('Score_Technicals', 50),
@@ -389,15 +418,16 @@ if page == "Dashboard":
                 rating_label = "BUY" if score > 80 else "HOLD" if score > 60 else "SELL"
                 
                 # Render Card
-                st.markdown(f"**#{i+1}**")
+                st.markdown(f"**#{page_start + i + 1}**")
                 card_html = generate_fidelity_card(row['Ticker'], rating_label, metrics_scan)
                 st.markdown(card_html, unsafe_allow_html=True)
                 
             # Fallback Table in Expander
             with st.expander("View Full Data Table"):
-                 st.dataframe(df_top)
+                 st.dataframe(df_filtered)
 
         with col_charts:
+            import plotly.graph_objects as go # Only the chart sections need plotly; imported after the table paints
             # --- ENHANCED SECTOR PIE CHART ---
             st.markdown("#### Sector Allocation")
             sector_counts = df_top['Sector'].value_counts()
@@ -439,11 +469,10 @@ if page == "Dashboard":
             
             # --- ENHANCED RANK HISTORY CHART ---
             st.markdown("#### Rank History")
-            if os.path.exists("scan_history.csv"):
-                hist_df = pd.read_csv("scan_history.csv")
+            if hist_dates:
                 # Filter for top 5 current
                 top_5_tickers = df_top.head(5)['Ticker'].tolist()
-                hist_filtered = hist_df[hist_df['Ticker'].isin(top_5_tickers)]
+                hist_filtered = app_cache.history_tickers(top_5_tickers, last_n=RANK_HISTORY_SCANS)
                 
                 fig_trend = go.Figure()
                 
@@ -507,17 +536,14 @@ if page == "Dashboard":
 elif page == "Stock Analysis":
     if run_btn or ticker_input:
         with st.spinner("Fetching data..."):
-            data = data_fetcher.get_stock_data(ticker_input)
+            data = app_cache.stock_data(ticker_input)
 
         if not data:
             st.error(f"Ticker '{ticker_input}' not found.")
         else:
-            # Run Analysis
-            fund_res = fundamentals.analyze_fundamentals(data)
-            val_res = valuation.analyze_valuation(data)
-            tech_res = technicals.analyze_technicals(data)
-            risk_res = risk.analyze_risk(data)
-            score_res = scoring.factor_scores(fund_res, val_res, tech_res, risk_res)
+            import plotly.graph_objects as go # Deferred to the page that draws charts
+            # Run Analysis (cached per ticker + data version)
+            fund_res, val_res, tech_res, risk_res, score_res = app_cache.analysis(ticker_input)
             
             # --- HEADER SECTION ---
             curr_price = data_fetcher.get_market_price(data)
@@ -594,11 +620,11 @@ elif page == "Stock Analysis":
                     chart_style_label = st.radio("Style", list(style_map.keys()), index=0, horizontal=True, label_visibility="collapsed")
                     chart_style = style_map[chart_style_label]
                 
-                df_chart = hist.copy()
+                df_chart = hist
                 if selected_period == "1D": 
                     with st.spinner("Loading intraday data..."):
                         try:
-                            intraday = data['ticker'].history(period="1d", interval="5m")
+                            intraday = app_cache.intraday(ticker_input, "1d", "5m")
                             if not intraday.empty:
                                 df_chart = intraday
                         except:
@@ -606,7 +632,7 @@ elif page == "Stock Analysis":
                 elif selected_period == "5D":
                     with st.spinner("Loading intraday data..."):
                         try:
-                            intraday = data['ticker'].history(period="5d", interval="15m")
+                            intraday = app_cache.intraday(ticker_input, "5d", "15m")
                             if not intraday.empty:
                                 df_chart = intraday
                         except:
@@ -621,7 +647,9 @@ elif page == "Stock Analysis":
                     else: delta = None
                     if delta:
                         cutoff = pd.Timestamp.now(tz=df_chart.index.tz) - delta
-                        df_chart = df_chart[df_chart.index >= cutoff]
+                        # Slice the window straight from the local price store (no full-series copy)
+                        window = data_fetcher.get_price_window(ticker_input, start=cutoff)
+                        df_chart = window if window is not None and not window.empty else df_chart[df_chart.index >= cutoff]
 
                 try:
                     current_price_disp = df_chart['Close'].iloc[-1]
@@ -751,12 +779,46 @@ elif page == "Stock Analysis":
                         st.progress(v['score'] / 10)
                         reasons = v.get('reasons', [])
                         if reasons: st.caption(f"• {reasons[0]}")
+                # --- DCF SENSITIVITY (computed only while open) ---
+                dcf_exp, dcf_open = lazy_expander("DCF Sensitivity: upside by discount rate x FCF growth", key="dcf_sensitivity")
+                if dcf_open:
+                    with dcf_exp:
+                        cf = data.get('cashflow')
+                        fcf = cf.loc["Free Cash Flow"].iloc[0] if cf is not None and "Free Cash Flow" in cf.index else 0
+                        shares = info.get('sharesOutstanding') or 0
+                        if fcf > 0 and shares > 0 and curr_price:
+                            table = dcf_engine.sensitivity_table(fcf, shares, curr_price, info.get('sector'))
+                            table = table.rename(index=lambda r: f"{r:.0%}", columns=lambda g: f"{g:.0%}")
+                            st.dataframe(table.style.format("{:+.0%}", na_rep="-"))
+                            a = dcf_engine.assumptions_for([info.get('sector')])
+                            st.caption(f"Rows: discount rate. Columns: FCF growth for {a['years']} years, "
+                                       f"then {np.ravel(a['terminal'])[0]:.0%} terminal growth.")
+                        else:
+                            st.caption("DCF needs positive free cash flow and a share count.")
+                # --- MONTE CARLO (computed only while open) ---
+                mc_exp, mc_open = lazy_expander("Monte Carlo: DCF value and 1-year return distributions", key="monte_carlo")
+                if mc_open:
+                    with mc_exp:
+                        import monte_carlo # Deferred: pulls in pyarrow and the process pool only when opened
+                        mc = monte_carlo.simulate_ticker(data)
+                        pcts = (5, 50, 95)
+                        mc1, mc2 = st.columns(2)
+                        with mc1:
+                            st.metric("P(DCF value > price)", "-" if pd.isna(mc['MC_P_Upside']) else f"{mc['MC_P_Upside']:.0%}")
+                            st.caption("DCF upside P5 / P50 / P95: " + " / ".join(
+                                "-" if pd.isna(mc[f'MC_Upside_P{p}']) else f"{mc[f'MC_Upside_P{p}']:+.0%}" for p in pcts))
+                        with mc2:
+                            st.metric("P(gain over 1Y)", "-" if pd.isna(mc['MC_P_Gain']) else f"{mc['MC_P_Gain']:.0%}")
+                            st.caption("Return P5 / P50 / P95: " + " / ".join(
+                                "-" if pd.isna(mc[f'MC_Return_P{p}']) else f"{mc[f'MC_Return_P{p}']:+.0%}" for p in pcts)
+                                + ("" if pd.isna(mc['MC_MaxDD_P95']) else f" | 95th pct drawdown {mc['MC_MaxDD_P95']:.0%}"))
+                        st.caption(f"{monte_carlo.N_PATHS:,} paths: DCF with random FCF growth and discount rate; "
+                                   f"returns bootstrapped from up to {monte_carlo.LOOKBACK_YEARS}Y of daily returns.")
                 st.markdown("---")
                 # --- RATING HISTORY TRACK ---
                 st.markdown("### 30-Day Rating History")
-                if os.path.exists("scan_history.csv"):
-                    hist_df = pd.read_csv("scan_history.csv")
-                    t_hist = hist_df[hist_df['Ticker'] == ticker_input].sort_values("Date").tail(30)
+                if hist_dates:
+                    t_hist = app_cache.history_tickers([ticker_input], last_n=30).sort_values("Date").tail(30)
                     if not t_hist.empty:
                         def score_to_rating(s):
                             if s > 80: return 3
@@ -791,49 +853,25 @@ elif page == "Watchlist":
     else:
         st.caption(f"{len(watchlist)} stocks saved")
         
-        # Display each watchlist stock with mini analysis
+        # Fetch + analyze every saved stock concurrently (cached fetch, analysis memoized per last bar)
+        results = watchlist_service.evaluate_many(watchlist, fetch=app_cache.stock_data, thread_init=app_cache.thread_init())
+        
+        # Display each watchlist stock; the card is only built while its row is open
         for ticker in watchlist:
-            with st.expander(f"**{ticker}**", expanded=False):
-                try:
-                    # Fetch data
-                    import data_fetcher
-                    data = data_fetcher.get_stock_data(ticker)
-                    
-                    # Run analysis
-                    fund_res = fundamentals.analyze_fundamentals(data)
-                    val_res = valuation.analyze_valuation(data)
-                    tech_res = technicals.analyze_technicals(data)
-                    risk_res = risk.analyze_risk(data)
-                    score_res = scoring.factor_scores(fund_res, val_res, tech_res, risk_res)
-                    
-                    # Build metrics for card
-                    metrics_wl = {
-                        "ROE": (fund_res['metrics'].get('ROE') or 0) * 100,
-                        "RevenueGrowth": fund_res['metrics'].get('Revenue Growth (3Y)') or fund_res['metrics'].get('Revenue Growth (1Y)') or 0,
-                        "EPSGrowth": data['info'].get('earningsGrowth', 0),
-                        "PE": val_res['metrics'].get('Trailing P/E') or 0,
-                        "ForwardPE": val_res['metrics'].get('Forward P/E') or 0,
-                        "DebtToEquity": (data['info'].get('debtToEquity') or 0),
-                        "Price": tech_res['metrics'].get('Price') or 0,
-                        "Beta": risk_res['metrics'].get('Beta') or 1.0,
-                        "CompanyName": data['info'].get('longName', ticker),
-                        "Rank": "N/A",
-                        "TotalScore": score_res['total_score'] * 0.6,
-                        "Score_Fundamentals": fund_res.get('score', 0) * 10,
-                        "Score_Technicals": tech_res.get('score', 0) * 10,
-                        "Score_Risk": risk_res.get('score', 0) * 10
-                    }
-                    
-                    from ai_insights import generate_fidelity_card
-                    card_html = generate_fidelity_card(ticker, score_res['recommendation'].split(" ")[0].upper(), metrics_wl)
-                    st.markdown(card_html, unsafe_allow_html=True)
-                    
-                    # Remove button
-                    if st.button(f"Remove {ticker}", key=f"rm_{ticker}"):
-                        utils.toggle_watchlist(ticker)
-                        st.success(f"Removed {ticker} from watchlist")
-                        st.rerun()
-                        
-                except Exception as e:
-                    st.error(f"Error loading {ticker}: {str(e)}")
+            res = results[ticker]
+            exp, is_open = lazy_expander(f"**{ticker}**", key=f"wl_exp_{ticker}")
+            with exp:
+                if not is_open:
+                    continue
+                if res.get("error"):
+                    st.error(f"Error loading {ticker}: {res['error']}")
+                else:
+                    st.markdown(watchlist_service.card_html(res), unsafe_allow_html=True)
+                
+                # Remove button
+                if st.button(f"Remove {ticker}", key=f"rm_{ticker}"):
+                    utils.toggle_watchlist(ticker)
+                    st.success(f"Removed {ticker} from watchlist")
+                    st.rerun()
 
+profiling.end(_page_profile)
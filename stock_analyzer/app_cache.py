@@ -0,0 +1,125 @@
+import streamlit as st
+import threading
+import data_fetcher
+import scoring
+import history_store
+import results_store
+import providers
+import utils
+import watchlist_service
+
+# Cached data layer for app.py. Every widget interaction reruns the whole script,
+# so anything that touches the network or disk goes through here.
+# - Each data type has its own TTL and a max_entries bound (least recently used entries are evicted).
+# - Cached functions take a `version` argument built from utils.load_output_versions():
+#   when data_update.py / scanner_pro.py finish they bump their stamp, the key changes
+#   and the next rerun reads the new output. clear() drops everything (sidebar button).
+
+TTL_STOCK_DATA = 15 * 60 # info + full history + statements
+TTL_INTRADAY = 60
+TTL_MARKET_PULSE = 5 * 60
+TTL_SCAN_OUTPUT = 24 * 60 * 60 # Invalidated by the scanner stamp long before this
+
+MAX_STOCKS = 32
+MAX_INTRADAY = 16
+MAX_HISTORY_QUERIES = 64
+
+def _versions():
+    return utils.load_output_versions()
+
+def data_version():
+    """Changes whenever data_update.py writes new market data."""
+    return _versions().get("data_update")
+
+def scan_version():
+    """Changes whenever scanner_pro.py writes new output (or the results file is replaced by hand)."""
+    return _versions().get("scanner"), results_store.results_mtime()
+
+def clear():
+    st.cache_data.clear()
+    watchlist_service.clear()
+
+def thread_init():
+    """
+    ThreadPoolExecutor initializer for workers that call the cached functions below:
+    attaches the current script context so they behave as on the main thread.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    return lambda: add_script_run_ctx(threading.current_thread(), ctx)
+
+# --- Per-ticker data ---
+
+@st.cache_data(ttl=TTL_STOCK_DATA, max_entries=MAX_STOCKS, show_spinner=False)
+def _stock_data(symbol, version):
+    data = data_fetcher.get_stock_data(symbol)
+    if data:
+        data.pop("ticker", None) # Live handle, not cacheable; intraday() makes its own
+    return data
+
+def stock_data(symbol):
+    return _stock_data(symbol.upper(), data_version())
+
+@st.cache_data(ttl=TTL_STOCK_DATA, max_entries=MAX_STOCKS, show_spinner=False)
+def _analysis(symbol, version):
+    data = _stock_data(symbol, version)
+    if not data:
+        return None
+    return scoring.analyze(data)
+
+def analysis(symbol):
+    """(fund_res, val_res, tech_res, risk_res, score_res) for a ticker, or None if it has no data."""
+    return _analysis(symbol.upper(), data_version())
+
+@st.cache_data(ttl=TTL_INTRADAY, max_entries=MAX_INTRADAY, show_spinner=False)
+def intraday(symbol, period, interval):
+    return providers.get_provider().ticker(symbol.upper()).history(period=period, interval=interval)
+
+@st.cache_data(ttl=TTL_MARKET_PULSE, max_entries=4, show_spinner=False)
+def market_pulse(symbols):
+    """{symbol: (last_close, prev_close)} for the sidebar mini-board."""
+    out = {}
+    for sym in symbols:
+        idx_data = providers.get_provider().ticker(sym).history(period="2d")
+        if len(idx_data) >= 2:
+            out[sym] = (idx_data["Close"].iloc[-1], idx_data["Close"].iloc[-2])
+    return out
+
+# --- Scanner output ---
+
+@st.cache_data(ttl=TTL_SCAN_OUTPUT, max_entries=2, show_spinner=False)
+def _top_picks(version):
+    return results_store.read_results()
+
+def top_picks():
+    """Latest scan's full ranked universe (results_store), best first."""
+    return _top_picks(scan_version())
+
+@st.cache_data(ttl=TTL_SCAN_OUTPUT, max_entries=2, show_spinner=False)
+def _history_index(version):
+    return history_store.list_dates(), history_store.load_index()
+
+def history_dates():
+    return _history_index(scan_version())[0]
+
+def history_ticker_count():
+    return len(_history_index(scan_version())[1]["tickers"])
+
+@st.cache_data(ttl=TTL_SCAN_OUTPUT, max_entries=MAX_HISTORY_QUERIES, show_spinner=False)
+def _history_date(date, version):
+    return history_store.read_date(date)
+
+def history_date(date):
+    return _history_date(date, scan_version())
+
+@st.cache_data(ttl=TTL_SCAN_OUTPUT, max_entries=MAX_HISTORY_QUERIES, show_spinner=False)
+def _history_tickers(tickers, last_n, version):
+    return history_store.read_tickers(list(tickers), last_n=last_n)
+
+def history_tickers(tickers, last_n=None):
+    return _history_tickers(tuple(tickers), last_n, scan_version())
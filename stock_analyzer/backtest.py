@@ -0,0 +1,341 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Ensure we can import modules from current directory
+sys.path.append(os.getcwd())
+
+import data_update
+import dcf_engine
+import market_cache
+import price_store
+import risk_engine
+import profiling
+import scanner_pro
+import snapshot_store
+import synthetic_market
+import technicals
+import universe
+
+# Point-in-time backtest of the scanner_pro scoring model.
+# For every rebalance date a snapshot is rebuilt from data that existed on that date:
+#   - technicals from the stored price history (technicals.technical_frames, one pass over all dates)
+#   - Beta, Volatility, Max_Drawdown and CVaR_95 from risk_engine over the trailing year, with the
+#     equal-weight universe as the beta benchmark
+#   - ROIC / Rev CAGR / FCF / Debt-EBITDA / margin trend from the cached annual statements,
+#     counting a fiscal year only once its filing lag has passed (market_cache.FILING_LAG_DAYS)
+#   - DCF upside from that filed FCF and share count against the date's close (dcf_engine)
+# and scored with the scanner's own apply_hard_filters -> add_dcf_upside -> normalize_metrics -> calculate_final_score.
+# Dates are scored in parallel worker processes. Forward returns run to the next rebalance date.
+# Limitations: info-only fields (ForwardPE, PegRatio, EPS growth) have no history and are left
+# missing, which normalize_metrics scores as neutral; history reaches back only as far as
+# price_store / the statement cache do. Each date only scores the tickers that were in the index
+# then (universe.membership, from the registry under market_data/universe); without a registry
+# it is today's stored tickers. Former members with no stored prices still cannot be scored,
+# so some survivorship bias remains - the run reports how many there are.
+# Usage:
+#   python backtest.py --freq W-FRI --top 10 --workers 4
+#   python backtest.py --synthetic 500 --years 10        (generated market, no stored data needed)
+
+RESULTS_DIR = "backtest_results"
+REBALANCE_FREQ = "W-FRI"
+TOP_N = 10
+WARMUP_BARS = 252 # SMA200 / 52W range / beta need a year of bars
+BETA_WINDOW = 252
+
+def load_universe(market_dir=data_update.MARKET_DATA_DIR):
+    """(Ticker, Name, Sector) for every ticker with stored prices (but the risk benchmark); names/sectors from the latest snapshot."""
+    tickers = [t for t in price_store.list_tickers(os.path.join(market_dir, "prices")) if t != risk_engine.BENCHMARK]
+    snapshot_dir = os.path.join(market_dir, "snapshots")
+    meta = pd.DataFrame({"Ticker": tickers})
+    if snapshot_store.latest_snapshot_date(snapshot_dir) is not None:
+        names = snapshot_store.read_snapshot(snapshot_dir=snapshot_dir)[["Ticker", "Name", "Sector"]]
+        meta = meta.merge(names, on="Ticker", how="left")
+    else:
+        meta["Name"], meta["Sector"] = meta["Ticker"], None
+    return meta
+
+def load_prices(tickers, market_dir=data_update.MARKET_DATA_DIR):
+    """(close, volume) (dates x tickers) matrices from price_store."""
+    root = os.path.join(market_dir, "prices")
+    histories = {t: price_store.load(t, fields=("Close", "Volume"), root=root) for t in tickers}
+    return technicals.price_matrix(histories)
+
+def load_statements(tickers, market_dir=data_update.MARKET_DATA_DIR):
+    cache_dir = os.path.join(market_dir, "cache")
+    out = {}
+    for t in tickers:
+        stmts = market_cache.load_statements(t, cache_dir)
+        if stmts is not None:
+            out[t] = stmts
+    return out
+
+def rebalance_dates(index, freq=REBALANCE_FREQ, start=None, end=None, warmup=WARMUP_BARS):
+    """Last trading day of each `freq` period, after `warmup` bars of history."""
+    days = pd.Series(index[warmup:], index=index[warmup:])
+    if start is not None:
+        days = days[days >= pd.Timestamp(start)]
+    if end is not None:
+        days = days[days <= pd.Timestamp(end)]
+    return pd.DatetimeIndex(days.resample(freq).last().dropna().unique())
+
+def _as_of(statement, cutoff):
+    """Statement columns with fiscal period end <= cutoff, newest first (as yfinance returns them)."""
+    cols = sorted((c for c in statement.columns if pd.Timestamp(c) <= cutoff), reverse=True)
+    return statement[cols]
+
+def fundamentals_panel(statements, tickers, dates, lag_days=market_cache.FILING_LAG_DAYS):
+    """
+    {column: (dates x tickers) array} of statement-derived snapshot fields as known on each date.
+    Metrics only change when a new fiscal year is filed, so each ticker runs the live
+    calculate_custom_metrics once per filing state, not once per date.
+    """
+    fields = ["ROIC", "Rev_CAGR_3Y", "FCF_Positive", "Debt_EBITDA", "GrossMarginTrend", "FCF", "Shares"]
+    out = {f: np.full((len(dates), len(tickers)), np.nan) for f in fields}
+    day_values = pd.DatetimeIndex(dates).values
+    lag = pd.Timedelta(days=lag_days)
+    for j, t in enumerate(tickers):
+        stmts = statements.get(t)
+        if stmts is None:
+            continue
+        ends = sorted(pd.Timestamp(c) for c in stmts["financials"].columns)
+        filed = np.array([e + lag for e in ends], dtype="datetime64[ns]")
+        state = np.searchsorted(filed, day_values, side="right") # Fiscal years on file per date
+        for k in np.unique(state):
+            if k == 0:
+                continue
+            cutoff = ends[k - 1]
+            fins, bs, cf = (_as_of(stmts[kind], cutoff) for kind in market_cache.STATEMENTS)
+            metrics = data_update.calculate_custom_metrics(t, {}, fins, bs, cf, None)
+            metrics["GrossMarginTrend"] = data_update.gross_margin_trend(fins)
+            rows = state == k
+            for f in fields:
+                out[f][rows, j] = float(metrics.get(f, np.nan))
+    return out
+
+def price_panel(close, volume, dates):
+    """{snapshot column: (dates x tickers) array} of technicals and trailing risk metrics on each date."""
+    frames = technicals.technical_frames(close, volume)
+    out = {field: frames[src].loc[dates].to_numpy() for field, src in data_update.SNAPSHOT_TECHNICALS.items()}
+    rets = close.pct_change(fill_method=None)
+    market = rets.mean(axis=1)
+    risk_fields = ["Beta", "Volatility", "Max_Drawdown", "CVaR_95"]
+    for field in risk_fields:
+        out[field] = np.full((len(dates), close.shape[1]), np.nan)
+    for i, pos in enumerate(close.index.get_indexer(dates)):
+        lo = max(pos - BETA_WINDOW, 0)
+        risk = risk_engine.compute_risk(close.iloc[lo:pos + 1], rets.iloc[lo + 1:pos + 1], market.iloc[lo + 1:pos + 1])
+        for field in risk_fields:
+            out[field][i] = risk[field].to_numpy()
+    return out
+
+def build_panel(close, volume, statements, meta, dates, members=None):
+    """
+    Long frame of point-in-time snapshot rows (snapshot_store.SCHEMA columns) for every rebalance date.
+    members: optional (dates x tickers) bool frame; non-members are left out of that date.
+    """
+    tickers = list(close.columns)
+    arrays = {**price_panel(close, volume, dates), **fundamentals_panel(statements, tickers, dates)}
+    n_dates, n_tickers = len(dates), len(tickers)
+    panel = pd.DataFrame({f: a.ravel() for f, a in arrays.items()})
+    panel["AsOf"] = np.repeat(pd.DatetimeIndex(dates).date, n_tickers)
+    panel["Ticker"] = np.tile(tickers, n_dates)
+    info = meta.set_index("Ticker").reindex(tickers)
+    panel["Name"] = np.tile(info["Name"].to_numpy(), n_dates)
+    panel["Sector"] = np.tile(info["Sector"].to_numpy(), n_dates)
+    panel["FCF_Positive"] = panel["FCF_Positive"] == 1
+    for col in ("ForwardPE", "PegRatio", "Employees", "EPS_Growth_3Y"):
+        panel[col] = np.nan # No point-in-time source (see header)
+    keep = panel["Price"].notna()
+    if members is not None:
+        keep &= members.reindex(index=pd.DatetimeIndex(dates), columns=tickers, fill_value=False).to_numpy().ravel()
+    return panel[keep].reset_index(drop=True)
+
+def score_snapshot(snapshot):
+    """Scanner scoring for one date. Returns the passing tickers' TotalScore, best first."""
+    df = scanner_pro.apply_hard_filters(snapshot)
+    if df.empty:
+        return pd.Series(dtype=float)
+    df = dcf_engine.add_dcf_upside(df)
+    df = scanner_pro.calculate_final_score(scanner_pro.normalize_metrics(df))
+    return df.set_index("Ticker")["TotalScore"].sort_values(ascending=False)
+
+def score_chunk(chunk):
+    """Worker entry point: scores every date in a slice of the panel. {date: TotalScore Series}."""
+    with contextlib.redirect_stdout(io.StringIO()): # Silence per-date filter logs
+        return {d: score_snapshot(snap) for d, snap in chunk.groupby("AsOf", sort=True)}
+
+def score_dates(panel, workers=1):
+    """Scores each rebalance date; dates are split into chunks across worker processes."""
+    groups = panel["AsOf"].unique()
+    if workers <= 1 or len(groups) < 2:
+        return score_chunk(panel)
+    bounds = np.array_split(groups, min(len(groups), workers * 4))
+    chunks = [panel[panel["AsOf"].isin(set(b))] for b in bounds if len(b)]
+    scores = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(score_chunk, chunks):
+            scores.update(part)
+    return scores
+
+def evaluate(scores, close, dates, top_n=TOP_N, members=None):
+    """
+    Per-date results: the top_n picks' equal-weight forward return vs the equal-weight universe,
+    hit rate (share of picks beating the universe), turnover vs the previous picks and the
+    rank IC (Spearman correlation of TotalScore with forward return across passing tickers).
+    With members, the benchmark universe is the index members trading on each date.
+    """
+    prices = close.ffill().loc[dates]
+    fwd = prices.shift(-1) / prices - 1
+    rows, prev = [], None
+    for d in dates[:-1]:
+        ranked = scores.get(d.date(), pd.Series(dtype=float))
+        picks = list(ranked.index[:top_n])
+        r = fwd.loc[d]
+        trading = close.loc[:d].iloc[-1].notna() # Names trading on the date
+        if members is not None:
+            trading &= members.loc[d].reindex(trading.index, fill_value=False)
+        universe_ret = r[trading].mean()
+        pick_ret = r.reindex(picks)
+        row = {
+            "Date": d.date().isoformat(),
+            "passed": len(ranked),
+            "picks": ",".join(picks),
+            "portfolio_return": pick_ret.mean() if picks else np.nan,
+            "universe_return": universe_ret,
+            "hit_rate": (pick_ret > universe_ret).mean() if picks else np.nan,
+            "turnover": 1 - len(set(picks) & prev) / top_n if prev is not None and picks else np.nan,
+            "ic": ranked.rank().corr(r.reindex(ranked.index).rank()) if len(ranked) > 2 else np.nan,
+        }
+        row["excess_return"] = row["portfolio_return"] - universe_ret
+        rows.append(row)
+        prev = set(picks)
+    return pd.DataFrame(rows)
+
+def summarize(results, dates):
+    if results.empty:
+        return {}
+    periods_per_year = 365.25 / max(np.median(np.diff(dates.values).astype("timedelta64[D]").astype(int)), 1)
+    active = results.dropna(subset=["portfolio_return"])
+    def annualized(r):
+        return (1 + r).prod() ** (periods_per_year / len(r)) - 1 if len(r) else np.nan
+    ic = results["ic"].dropna()
+    summary = {
+        "start": results["Date"].iloc[0],
+        "end": results["Date"].iloc[-1],
+        "periods": len(results),
+        "periods_with_picks": len(active),
+        "portfolio_cagr": annualized(active["portfolio_return"]),
+        "universe_cagr": annualized(active["universe_return"]),
+        "mean_excess_return": active["excess_return"].mean(),
+        "hit_rate": active["hit_rate"].mean(),
+        "turnover": results["turnover"].mean(),
+        "mean_ic": ic.mean(),
+        "ic_t_stat": ic.mean() / ic.std() * np.sqrt(len(ic)) if len(ic) > 1 and ic.std() > 0 else np.nan,
+    }
+    return {k: (round(float(v), 6) if isinstance(v, (float, np.floating)) else v) for k, v in summary.items()}
+
+def run_backtest(market_dir=data_update.MARKET_DATA_DIR, freq=REBALANCE_FREQ, top_n=TOP_N,
+                 start=None, end=None, workers=1, universe_name=universe.DEFAULT_UNIVERSE):
+    """Loads the stores under market_dir and runs the backtest. Returns (per-date results, summary)."""
+    t0 = time.perf_counter()
+    with profiling.stage("load_inputs"):
+        meta = load_universe(market_dir)
+        close, volume = load_prices(meta["Ticker"], market_dir)
+        statements = load_statements(close.columns, market_dir)
+    dates = rebalance_dates(close.index, freq, start, end)
+    if len(dates) < 2:
+        print(f"Not enough stored history for a backtest ({len(close)} bars, {WARMUP_BARS} needed for warm-up).")
+        return pd.DataFrame(), {}
+    print(f"Backtest: {close.shape[1]} tickers, {len(close)} bars, {len(dates)} rebalance dates "
+          f"({dates[0].date()} .. {dates[-1].date()}), {len(statements)} with statements.")
+
+    members, registry = None, os.path.join(market_dir, "universe")
+    sets = universe.member_sets(dates, universe_name, registry)
+    if sets is not None:
+        members = universe.membership(dates, close.columns, sets=sets)
+        former = set().union(*sets.values()) - set(close.columns)
+        print(f"Point-in-time {universe_name} membership: {members.sum(axis=1).mean():.0f} scored names per date; "
+              f"{len(former)} past members have no stored prices (survivorship gap).")
+
+    with profiling.stage("build_panel") as s:
+        panel = build_panel(close, volume, statements, meta, dates, members)
+        s.rows = len(panel)
+    t1 = time.perf_counter()
+    with profiling.stage("score_dates", rows=len(dates)):
+        scores = score_dates(panel, workers)
+    t2 = time.perf_counter()
+    results = evaluate(scores, close, dates, top_n, members)
+    summary = summarize(results, dates)
+    summary.update({"tickers": close.shape[1], "freq": freq, "top_n": top_n, "workers": workers,
+                    "build_sec": round(t1 - t0, 2), "score_sec": round(t2 - t1, 2),
+                    "total_sec": round(time.perf_counter() - t0, 2)})
+    return results, summary
+
+def build_synthetic_market(n, years, market_dir):
+    """Writes a synthetic universe (prices, statements, snapshot names) under market_dir."""
+    days = 252 * years + WARMUP_BARS
+    snapshot = synthetic_market.synthetic_snapshot(n)
+    snapshot_store.write_snapshot(snapshot, snapshot_dir=os.path.join(market_dir, "snapshots"))
+    for t in snapshot["Ticker"]:
+        price_store.write(t, synthetic_market.synthetic_history(t, days), full_history=True,
+                          root=os.path.join(market_dir, "prices"))
+        fins, bs, cf = synthetic_market.synthetic_statements(t, periods=years + 4)
+        market_cache.save_statements(t, {"financials": fins, "balance_sheet": bs, "cashflow": cf},
+                                     os.path.join(market_dir, "cache"))
+    price_store.write(risk_engine.BENCHMARK, synthetic_market.synthetic_history(risk_engine.BENCHMARK, days),
+                      full_history=True, root=os.path.join(market_dir, "prices"))
+
+def write_results(results, summary, out_dir=RESULTS_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"backtest_{datetime.datetime.now():%Y%m%d_%H%M%S}")
+    results.to_csv(base + ".csv", index=False)
+    with open(base + ".json", "w") as f:
+        json.dump(summary, f, indent=1)
+    return base + ".json"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Point-in-time backtest of the scanner_pro scoring model.")
+    parser.add_argument("--market-data", default=data_update.MARKET_DATA_DIR)
+    parser.add_argument("--freq", default=REBALANCE_FREQ, help="Rebalance frequency (pandas offset, e.g. W-FRI, ME).")
+    parser.add_argument("--top", type=int, default=TOP_N)
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Scoring processes (1 = serial).")
+    parser.add_argument("--synthetic", type=int, default=None, help="Backtest a generated universe of N tickers.")
+    parser.add_argument("--years", type=int, default=10, help="Years of generated history (with --synthetic).")
+    parser.add_argument("--universe", default=universe.DEFAULT_UNIVERSE,
+                        help="Registry universe for point-in-time membership (sp500 or a CSV's file name).")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    market_dir, scratch = args.market_data, None
+    if args.synthetic:
+        scratch = tempfile.mkdtemp(prefix="backtest_")
+        market_dir = scratch
+        start = time.perf_counter()
+        build_synthetic_market(args.synthetic, args.years, market_dir)
+        print(f"Generated {args.synthetic} synthetic tickers x {args.years}Y in {time.perf_counter() - start:.1f}s")
+    try:
+        results, summary = run_backtest(market_dir, args.freq, args.top, args.start, args.end, args.workers,
+                                        universe.registry_name(args.universe))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    if summary:
+        print("\n--- BACKTEST ---")
+        for k, v in summary.items():
+            print(f"{k:<20} {v}")
+        print(f"\nSaved to {write_results(results, summary, args.out)}")
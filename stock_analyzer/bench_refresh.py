@@ -0,0 +1,63 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+
+# Ensure we can import modules from current directory
+sys.path.append(os.getcwd())
+
+import data_update
+import snapshot_store
+import synthetic_market
+
+# Wall-clock benchmark of serial vs concurrent refresh against the synthetic provider.
+# Usage: python bench_refresh.py --sizes 500,5000 --latency 0.02 --failure-rate 0.02 --workers 32
+
+def run_refresh(tickers_df, out_dir, workers, args):
+    factory = synthetic_market.make_ticker_factory(args.latency, args.jitter, args.failure_rate, seed=42)
+    return data_update.update_market_data(
+        tickers_df, workers=workers, rate_limit=args.rate_limit, retries=args.retries,
+        backoff=0.01, out_dir=out_dir, ticker_factory=factory, verbose=False,
+    )
+
+def outputs_match(dir_a, dir_b):
+    """True when both runs wrote identical snapshots."""
+    snap_a = snapshot_store.read_snapshot(snapshot_dir=os.path.join(dir_a, "snapshots"))
+    snap_b = snapshot_store.read_snapshot(snapshot_dir=os.path.join(dir_b, "snapshots"))
+    return not snap_a.empty and snap_a.equals(snap_b)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="500,5000")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per simulated network call.")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--retries", type=int, default=data_update.MAX_RETRIES)
+    parser.add_argument("--rate-limit", type=float, default=0, help="Requests/sec per host (0 = unlimited).")
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    rows = []
+    for n in [int(s) for s in args.sizes.split(",")]:
+        uni = synthetic_market.synthetic_universe(n)
+        tmp = tempfile.mkdtemp(prefix="bench_refresh_")
+        try:
+            conc = run_refresh(uni, os.path.join(tmp, "concurrent"), args.workers, args)
+            row = {"tickers": n, "workers": args.workers, "concurrent_sec": conc["elapsed_sec"], "failed": conc["failed"]}
+            if not args.skip_serial:
+                serial = run_refresh(uni, os.path.join(tmp, "serial"), 1, args)
+                row["serial_sec"] = serial["elapsed_sec"]
+                row["speedup"] = round(serial["elapsed_sec"] / conc["elapsed_sec"], 1)
+                # Identical output is only expected when no ticker exhausted its retries
+                if args.failure_rate == 0:
+                    row["identical_output"] = outputs_match(os.path.join(tmp, "serial"), os.path.join(tmp, "concurrent"))
+            rows.append(row)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\n--- REFRESH BENCHMARK ---")
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,156 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+# Cold-start benchmark for the CLI entry points and the Streamlit app.
+# Every measurement runs in a fresh interpreter, so nothing is already imported or cached:
+#   import:<module>   python -X importtime -c "import <module>": wall time of the whole process,
+#                     the module's cumulative import time and its heaviest third-party imports
+#   app:first_paint   streamlit AppTest runs app.py once (Dashboard) in a scratch directory with
+#                     copies of the scanner output; process start -> script finished
+#   app:rerun         the next interaction's rerun in the same process (modules + caches warm)
+#   app:analysis      first switch to the Stock Analysis page (charts, analyzers)
+# The app uses STOCK_PROVIDER=synthetic by default so the Market Pulse never waits on the network.
+# Usage:
+#   python bench_startup.py --repeat 5
+#   python bench_startup.py --src /path/to/other/checkout      (same benchmark on another tree)
+# Results go to bench_results/startup_{timestamp}.json ("stages" in the profiling report layout,
+# so `python profiling.py old.json new.json` diffs two runs).
+
+RESULTS_DIR = "bench_results"
+TARGETS = ["scanner_pro", "scanner_stream", "data_update", "stock_picker_daily", "backtest", "app_cache"]
+APP_SCRIPT = "app.py"
+# Copied into the app's scratch cwd (same relative paths)
+APP_FILES = (os.path.join("market_data", "results", "scan_results.parquet"), "top10_pro.xlsx",
+             "scan_history.csv", "watchlist.json")
+TOP_IMPORTS = 5
+
+APP_RUNNER = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=300)
+at.run()
+t2 = time.perf_counter()
+at.run()
+t3 = time.perf_counter()
+at.sidebar.radio[0].set_value("Stock Analysis").run()
+t4 = time.perf_counter()
+print(json.dumps({"streamlit_import": t1 - t0, "first_run": t2 - t1, "rerun": t3 - t2, "analysis": t4 - t3,
+                  "exceptions": [str(e.value) for e in at.exception]}))
+"""
+
+def run_python(args, cwd, env=None):
+    """Runs a fresh interpreter; returns (wall seconds, completed process)."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable] + args, cwd=cwd, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, proc
+
+def parse_importtime(stderr):
+    """-X importtime lines -> DataFrame(module, self_sec, cumulative_sec)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1e6, int(cum_us) / 1e6))
+    return pd.DataFrame(rows, columns=["module", "self_sec", "cumulative_sec"])
+
+def local_modules(src):
+    return {os.path.splitext(f)[0] for f in os.listdir(src) if f.endswith(".py")}
+
+def bench_import(module, src, repeat):
+    """Median cold import of one module, plus its heaviest third-party top-level imports."""
+    walls, imports, last = [], [], None
+    env = {**os.environ, "PYTHONPATH": src}
+    for _ in range(repeat):
+        wall, proc = run_python(["-X", "importtime", "-c", f"import {module}"], src, env)
+        if proc.returncode != 0:
+            return {"module": module, "error": proc.stderr.strip().splitlines()[-1]}
+        last = parse_importtime(proc.stderr)
+        walls.append(wall)
+        imports.append(last.loc[last["module"] == module, "cumulative_sec"].iloc[-1])
+    # Per third-party package: its costliest import (e.g. scipy.stats, not the cheap scipy/__init__)
+    packages = last.assign(package=last["module"].str.split(".").str[0])
+    packages = packages[~packages["package"].isin(local_modules(src))]
+    heaviest = packages.groupby("package")["cumulative_sec"].max().nlargest(TOP_IMPORTS)
+    return {"module": module, "process_sec": statistics.median(walls), "import_sec": statistics.median(imports),
+            "heaviest": {m: round(s, 3) for m, s in heaviest.items()}}
+
+def bench_app(src, repeat, provider):
+    """Median first paint / rerun / page switch of app.py in a scratch working directory."""
+    runs = []
+    for _ in range(repeat):
+        scratch = tempfile.mkdtemp(prefix="bench_app_")
+        try:
+            for name in APP_FILES:
+                if os.path.exists(os.path.join(src, name)):
+                    os.makedirs(os.path.join(scratch, os.path.dirname(name)), exist_ok=True)
+                    shutil.copy(os.path.join(src, name), os.path.join(scratch, name))
+            env = {**os.environ, "PYTHONPATH": src, "STOCK_PROVIDER": provider}
+            wall, proc = run_python(["-c", APP_RUNNER, os.path.join(src, APP_SCRIPT)], scratch, env)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1]}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result["first_paint"] = result["streamlit_import"] + result["first_run"]
+        runs.append(result)
+    out = {k: statistics.median(r[k] for r in runs) for k in ("first_paint", "streamlit_import", "first_run", "rerun", "analysis")}
+    out["exceptions"] = runs[-1]["exceptions"]
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start benchmark: module imports and the app's first paint.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--src", default=os.path.dirname(os.path.abspath(__file__)), help="stock_analyzer directory to measure.")
+    parser.add_argument("--provider", default="synthetic", help="STOCK_PROVIDER for the app run.")
+    parser.add_argument("--skip-app", action="store_true")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    args = parser.parse_args()
+    src = os.path.abspath(args.src)
+
+    rows, stages = [], []
+    for module in args.targets.split(","):
+        r = bench_import(module, src, args.repeat)
+        rows.append(r)
+        if "error" in r:
+            print(f"  {module:<20} failed: {r['error']}")
+            continue
+        stages.append({"stage": f"import:{module}", "seconds": round(r["import_sec"], 4)})
+        stages.append({"stage": f"process:{module}", "seconds": round(r["process_sec"], 4)})
+        print(f"  {module:<20} import {r['import_sec']:6.3f}s  process {r['process_sec']:6.3f}s  "
+              f"heaviest: " + ", ".join(f"{m} {s:.2f}s" for m, s in r["heaviest"].items()))
+
+    app = None
+    if not args.skip_app:
+        app = bench_app(src, args.repeat, args.provider)
+        if "error" in app:
+            print(f"  app failed: {app['error']}")
+        else:
+            for k in ("first_paint", "rerun", "analysis"):
+                stages.append({"stage": f"app:{k}", "seconds": round(app[k], 4)})
+            print(f"  app                  first paint {app['first_paint']:6.3f}s (streamlit import "
+                  f"{app['streamlit_import']:.3f}s)  rerun {app['rerun']:6.3f}s  analysis page {app['analysis']:6.3f}s")
+            if app["exceptions"]:
+                print(f"  app raised: {app['exceptions']}")
+
+    report = {"script": "bench_startup.py", "argv": sys.argv[1:], "src": src, "python": sys.version.split()[0],
+              "finished": datetime.datetime.now().isoformat(), "imports": rows, "app": app,
+              "stages": stages, "counters": {}}
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"startup_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"\n(median of {args.repeat} fresh processes) Saved to {path}")
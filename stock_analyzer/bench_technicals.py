@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Ensure we can import modules from current directory
+sys.path.append(os.getcwd())
+
+import synthetic_market
+import technicals
+
+# Batch technicals engine vs the per-ticker loop it replaced.
+# Usage: python bench_technicals.py --sizes 500,5000 --days 252
+
+def per_ticker_loop(histories):
+    """The legacy per-ticker pandas path: separate rolling / ewm calls on each Series."""
+    rows = {}
+    for t, h in histories.items():
+        close, vol = h["Close"], h["Volume"]
+        delta = close.diff()
+        ema_up = delta.clip(lower=0).ewm(com=13, adjust=False).mean()
+        ema_down = (-1 * delta.clip(upper=0)).ewm(com=13, adjust=False).mean()
+        macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        avg_vol = vol.rolling(window=20).mean().iloc[-1]
+        low_52 = close.tail(252).min() # Whatever the trailing year holds (a 1Y fetch is ~251 bars)
+        high_52 = close.tail(252).max()
+        rows[t] = {
+            "Price": close.iloc[-1],
+            "SMA50": close.rolling(window=50).mean().iloc[-1],
+            "SMA200": close.rolling(window=200).mean().iloc[-1],
+            "RSI": (100 - (100 / (1 + ema_up / ema_down))).iloc[-1],
+            "MACD": macd.iloc[-1],
+            "MACD_Signal": macd.ewm(span=9, adjust=False).mean().iloc[-1],
+            "Vol_Ratio": vol.iloc[-1] / avg_vol if avg_vol > 0 else 1.0,
+            "Low_52W": low_52,
+            "High_52W": high_52,
+            "Range_Pos": (close.iloc[-1] - low_52) / (high_52 - low_52) if high_52 > low_52 else np.nan,
+        }
+    return pd.DataFrame(rows).T
+
+def batch(histories):
+    close, volume = technicals.price_matrix(histories)
+    return technicals.compute_technicals(close, volume)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="500,5000")
+    parser.add_argument("--days", type=int, default=252)
+    args = parser.parse_args()
+
+    rows = []
+    for n in [int(s) for s in args.sizes.split(",")]:
+        tickers = synthetic_market.synthetic_universe(n)["Ticker"]
+        histories = {t: synthetic_market.synthetic_history(t, args.days) for t in tickers}
+
+        start = time.perf_counter()
+        looped = per_ticker_loop(histories)
+        loop_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = batch(histories)
+        batch_sec = time.perf_counter() - start
+
+        same = np.allclose(looped[technicals.TECHNICAL_COLUMNS].astype(float),
+                           batched.loc[looped.index, technicals.TECHNICAL_COLUMNS], equal_nan=True)
+        rows.append({"tickers": n, "days": args.days, "loop_sec": round(loop_sec, 3),
+                     "batch_sec": round(batch_sec, 3), "speedup": round(loop_sec / batch_sec, 1), "match": same})
+
+    print("\n--- TECHNICALS BENCHMARK ---")
+    print(pd.DataFrame(rows).to_string(index=False))
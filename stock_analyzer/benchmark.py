@@ -0,0 +1,276 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import numpy as np
+
+# Ensure we can import modules from current directory
+sys.path.append(os.getcwd())
+
+import dcf_engine
+import fundamentals
+import history_store
+import monte_carlo
+import profiling
+import results_store
+import risk
+import risk_engine
+import scanner_pro
+import scoring
+import snapshot_store
+import synthetic_market
+import technicals
+import valuation
+
+# Benchmark suite for the scanner pipeline, the scan history store and the single-ticker analyzers.
+# Each universe size gets a scratch directory holding a synthetic market_data snapshot and a
+# scan_history.csv (same schemas the live pipeline writes), and every stage runs against it
+# `--repeat` times with its inputs prepared outside the timer.
+# Usage:
+#   python benchmark.py --sizes 500,5000,50000 --years 5 --history-days 60 --repeat 3
+#   python benchmark.py --sizes 500 --compare bench_results/benchmark_20260108_101500.json
+# Results go to bench_results/benchmark_{timestamp}.json; its "stages" list uses the
+# profiling report layout, so `python profiling.py old.json new.json` diffs two runs.
+
+RESULTS_DIR = "bench_results"
+ANALYZER_SIZE = "single" # Results key for the per-ticker analyzers
+
+def timed(fn, repeat, prepare=None):
+    """
+    Runs fn(*prepare()) `repeat` times; prepare (copies etc.) is not timed.
+    Returns (best_seconds, median_seconds, last_result). Stage output is silenced.
+    """
+    times, result = [], None
+    for _ in range(repeat):
+        args = prepare() if prepare else ()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn(*args)
+            times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+def _rows(result):
+    return len(result) if hasattr(result, "__len__") else None
+
+def build_universe(n, history_days, seed=0):
+    """Writes today's snapshot + scan_history.csv for n tickers into the current directory."""
+    today = datetime.date.today()
+    snapshot = synthetic_market.synthetic_snapshot(n, as_of=today, seed=seed)
+    snapshot_store.write_snapshot(snapshot, today)
+    dates = pd.bdate_range(end=today - datetime.timedelta(days=1), periods=history_days)
+    history = synthetic_market.synthetic_scan_history(snapshot["Ticker"], dates, seed=seed)
+    history.to_csv(history_store.LEGACY_CSV, index=False)
+    return snapshot
+
+def bench_scanner(n, args):
+    """Times every scanner_pro stage for one universe size. Returns result rows."""
+    rows = []
+
+    def record(stage, best, median, rows_in, result):
+        rows.append({"size": n, "stage": stage, "best_sec": round(best, 6), "median_sec": round(median, 6),
+                     "repeat": args.repeat, "rows_in": rows_in, "rows_out": _rows(result)})
+        print(f"  {stage:<24} {best * 1000:10.1f} ms  ({rows_in} -> {_rows(result)} rows)")
+
+    start = time.perf_counter()
+    build_universe(n, args.history_days, seed=args.seed)
+    print(f"Universe {n}: generated in {time.perf_counter() - start:.1f}s")
+
+    # One-time import of the CSV into the partitioned store (the first scan after an upgrade)
+    best, median, _ = timed(history_store.migrate_csv, 1)
+    record("migrate_history", best, median, args.history_days * n, None)
+
+    best, median, df = timed(scanner_pro.load_market_data, args.repeat)
+    record("load_market_data", best, median, n, df)
+
+    best, median, filtered = timed(scanner_pro.apply_hard_filters, args.repeat, lambda: (df,))
+    record("apply_hard_filters", best, median, len(df), filtered)
+
+    # Two-phase read: filter columns for everyone, the rest only for survivors
+    best, median, candidates = timed(scanner_pro.load_candidates, args.repeat)
+    record("load_candidates", best, median, n, candidates)
+
+    best, median, valued = timed(dcf_engine.add_dcf_upside, args.repeat, lambda: (filtered.copy(),))
+    record("add_dcf_upside", best, median, len(filtered), valued)
+
+    # Full discount rate x growth sensitivity grids for every candidate (not part of a scan)
+    best, median, _ = timed(dcf_engine.upside_grid, args.repeat,
+                            lambda: (valued["FCF"], valued["Shares"], valued["Price"]))
+    record("dcf_sensitivity_grid", best, median, len(valued), valued)
+
+    # Risk engine math over a (years x 252 days) x n returns matrix (the scan adds the price_store reads)
+    rng = np.random.default_rng(args.seed)
+    rets = pd.DataFrame(rng.normal(0.0004, 0.02, (252 * args.years, n)))
+    close = (1 + rets).cumprod()
+    best, median, risk_out = timed(risk_engine.compute_risk, args.repeat, lambda: (close, rets, rets.mean(axis=1)))
+    record("compute_risk", best, median, rets.size, risk_out)
+
+    # N_PATHS DCF scenarios per candidate (not part of a scan)
+    best, median, simulated = timed(monte_carlo.simulate_valuation, args.repeat, lambda: (valued,))
+    record("monte_carlo_valuation", best, median, len(valued), simulated)
+
+    best, median, normalized = timed(scanner_pro.normalize_metrics, args.repeat, lambda: (valued,))
+    record("normalize_metrics", best, median, len(valued), normalized)
+
+    # The remaining stages write columns into their input, so each repeat gets a fresh copy
+    best, median, scored = timed(scanner_pro.calculate_final_score, args.repeat, lambda: (normalized.copy(),))
+    record("calculate_final_score", best, median, len(normalized), scored)
+
+    best, median, ranked = timed(scanner_pro.update_history, args.repeat, lambda: (scored.copy(),))
+    record("update_history", best, median, len(scored), ranked)
+
+    best, median, final = timed(scanner_pro.generate_explanations, args.repeat,
+                                lambda: (ranked.copy(), scanner_pro.SCAN_CONFIG["explain_top_n"]))
+    record("generate_explanations", best, median, len(ranked), final)
+
+    # Scanner output: the full ranked universe as parquet vs the old top-N Excel export
+    best, median, _ = timed(results_store.write_results, args.repeat, lambda: (final,))
+    record("write_results", best, median, len(final), final)
+    best, median, page = timed(results_store.read_results, args.repeat)
+    record("read_results", best, median, len(final), page)
+    top = final.sort_values("TotalScore", ascending=False).head(scanner_pro.EXPORT_TOP_N)
+    best, median, _ = timed(lambda: top.to_excel(scanner_pro.OUTPUT_FILE, index=False), args.repeat)
+    record("write_excel", best, median, len(top), top)
+    best, median, excel = timed(pd.read_excel, args.repeat, lambda: (scanner_pro.OUTPUT_FILE,))
+    record("read_excel", best, median, len(top), excel)
+
+    # Dashboard-style history query: a few names over the last 90 scans
+    picks = final.sort_values("TotalScore", ascending=False)["Ticker"].head(10).tolist()
+    best, median, hist = timed(history_store.read_tickers, args.repeat, lambda: (picks, 90))
+    record("history_read_tickers", best, median, len(picks), hist)
+    return rows
+
+def analyzer_inputs(count, years):
+    """data_fetcher.get_stock_data-shaped dicts for `count` synthetic tickers with `years` of bars."""
+    inputs = []
+    for t in synthetic_market.synthetic_universe(count)["Ticker"]:
+        hist = synthetic_market.synthetic_history(t, days=252 * years)
+        fins, bs, cf = synthetic_market.synthetic_statements(t)
+        info = {**synthetic_market.synthetic_info(t), "currentPrice": float(hist["Close"].iloc[-1])}
+        inputs.append({"symbol": t, "info": info, "history": hist,
+                       "financials": fins, "balance_sheet": bs, "cashflow": cf})
+    return inputs
+
+def bench_analyzers(args):
+    """Per-call cost of each single-ticker analyzer (averaged over --analyzer-tickers names)."""
+    inputs = analyzer_inputs(args.analyzer_tickers, args.years)
+    stages = [
+        ("analyze_fundamentals", fundamentals.analyze_fundamentals),
+        ("analyze_valuation", valuation.analyze_valuation),
+        ("analyze_technicals", technicals.analyze_technicals),
+        ("analyze_risk", risk.analyze_risk),
+    ]
+    print(f"Analyzers: {len(inputs)} tickers x {args.years}Y of bars")
+    rows, results = [], {}
+    for name, fn in stages:
+        best, median, out = timed(lambda: [fn(d) for d in inputs], args.repeat)
+        results[name] = out
+        rows.append({"size": ANALYZER_SIZE, "stage": name, "best_sec": round(best / len(inputs), 6),
+                     "median_sec": round(median / len(inputs), 6), "repeat": args.repeat,
+                     "rows_in": 252 * args.years, "rows_out": 1})
+        print(f"  {name:<24} {best / len(inputs) * 1000:10.3f} ms/ticker")
+
+    best, median, _ = timed(lambda: [scoring.factor_scores(*r) for r in zip(
+        results["analyze_fundamentals"], results["analyze_valuation"],
+        results["analyze_technicals"], results["analyze_risk"])], args.repeat)
+    rows.append({"size": ANALYZER_SIZE, "stage": "factor_scores", "best_sec": round(best / len(inputs), 6),
+                 "median_sec": round(median / len(inputs), 6), "repeat": args.repeat, "rows_in": 4, "rows_out": 1})
+    print(f"  {'factor_scores':<24} {best / len(inputs) * 1000:10.3f} ms/ticker")
+
+    # All four + factor_scores on one shared AnalysisContext, then batched (technicals in one pass)
+    for name, fn in (("analyze_shared_context", lambda: [scoring.analyze(d) for d in inputs]),
+                     ("analyze_many", lambda: scoring.analyze_many(inputs))):
+        best, median, _ = timed(fn, args.repeat)
+        rows.append({"size": ANALYZER_SIZE, "stage": name, "best_sec": round(best / len(inputs), 6),
+                     "median_sec": round(median / len(inputs), 6), "repeat": args.repeat,
+                     "rows_in": 252 * args.years, "rows_out": 1})
+        print(f"  {name:<24} {best / len(inputs) * 1000:10.3f} ms/ticker")
+
+    # N_PATHS x HORIZON bootstrapped return paths per ticker (monte_carlo.py, not part of a scan)
+    log_rets = [monte_carlo.log_returns(d["history"]["Close"].to_numpy()) for d in inputs]
+    best, median, _ = timed(lambda: [monte_carlo.simulate_paths(r, rng=monte_carlo.ticker_rng(args.seed, str(i)))
+                                     for i, r in enumerate(log_rets)], args.repeat)
+    rows.append({"size": ANALYZER_SIZE, "stage": "monte_carlo_returns", "best_sec": round(best / len(inputs), 6),
+                 "median_sec": round(median / len(inputs), 6), "repeat": args.repeat,
+                 "rows_in": 252 * args.years, "rows_out": monte_carlo.N_PATHS})
+    print(f"  {'monte_carlo_returns':<24} {best / len(inputs) * 1000:10.3f} ms/ticker")
+    return rows
+
+def write_results(rows, args):
+    """Writes the results JSON. Returns the report dict and its path."""
+    report = {
+        "script": "benchmark.py",
+        "argv": sys.argv[1:],
+        "started": args.started,
+        "finished": datetime.datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": rows,
+        # profiling.py report layout, so runs can be diffed with `python profiling.py old new`
+        "stages": [{"stage": f"{r['size']}/{r['stage']}", "seconds": r["best_sec"]} for r in rows],
+        "counters": {},
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+    return report, path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scanner stages and analyzers on synthetic data.")
+    parser.add_argument("--sizes", default="500,5000", help="Universe sizes, e.g. 500,5000,50000.")
+    parser.add_argument("--years", type=int, default=5, help="Years of daily bars per analyzer ticker.")
+    parser.add_argument("--history-days", type=int, default=60, help="Prior scan dates in scan_history.csv.")
+    parser.add_argument("--analyzer-tickers", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-analyzers", action="store_true")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--compare", help="Earlier results JSON to diff against.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories.")
+    args = parser.parse_args()
+    args.started = datetime.datetime.now().isoformat()
+    args.out = os.path.abspath(args.out)
+
+    rows = []
+    cwd = os.getcwd()
+    for n in [int(s) for s in args.sizes.split(",")]:
+        # scanner_pro / history_store use paths relative to the working directory
+        tmp = tempfile.mkdtemp(prefix=f"bench_{n}_")
+        os.chdir(tmp)
+        try:
+            rows.extend(bench_scanner(n, args))
+        finally:
+            os.chdir(cwd)
+            if args.keep:
+                print(f"  scratch data kept in {tmp}")
+            else:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    if not args.skip_analyzers:
+        rows.extend(bench_analyzers(args))
+
+    report, path = write_results(rows, args)
+    print("\n--- BENCHMARK ---")
+    table = pd.DataFrame(rows).pivot_table(index="stage", columns="size", values="best_sec", sort=False)
+    print((table * 1000).round(2).to_string())
+    print(f"\n(best of {args.repeat}, milliseconds; analyzers per ticker) Saved to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print(f"\n{'stage':<40} {'old s':>10} {'new s':>10} {'change':>9}")
+        for name, sa, sb, change in profiling.diff_reports(old, report):
+            fmt = lambda v: f"{v:10.4f}" if v is not None else f"{'-':>10}"
+            print(f"{name:<40} {fmt(sa)} {fmt(sb)} {change:>9}")
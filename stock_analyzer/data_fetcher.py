@@ -1,29 +1,72 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
+import datetime
+import price_store
+import providers
+import profiling
 
+# Exchange-local time after which the day's bar is final (US close plus a settling margin)
+BAR_FINAL_TIME = datetime.time(16, 30)
+
+def _is_stale(last):
+    """
+    True when the stored series needs a delta: it ends before today, or today's bar
+    was stored while the market may still be open. How often this re-fetches a
+    partial bar is bounded by the app_cache TTL on get_stock_data.
+    """
+    now = pd.Timestamp.now(tz=last.tz)
+    if last.date() < now.date():
+        return True
+    return now.time() < BAR_FINAL_TIME
+
+def _load_history(ticker, ticker_symbol):
+    """
+    Full price history, served from the local price_store when possible.
+    - Stored with full history: only bars from the last stored date on are downloaded
+      (overlapping one stored bar; a split/dividend re-adjustment re-fetches period="max").
+    - Not stored (or only the scanner's 1Y window): period="max" once, then persisted.
+    """
+    symbol = ticker_symbol.upper()
+    meta = price_store.load_meta(symbol)
+    last = price_store.last_date(symbol)
+
+    if last is not None and meta.get("full_history"):
+        if _is_stale(last):
+            start = price_store.overlap_start(symbol)
+            new_bars = ticker.history(start=start.strftime("%Y-%m-%d"))
+            _, rewritten = price_store.refresh(symbol, new_bars, lambda _: ticker.history(period="max"))
+            if rewritten:
+                print(f"{symbol}: history re-adjusted by the provider, re-fetched in full")
+        return price_store.load(symbol)
+
+    history = ticker.history(period="max")
+    if not history.empty:
+        price_store.write(symbol, history, full_history=True)
+    return history
+
+@profiling.profiled()
 def get_stock_data(ticker_symbol):
     """
-    Fetches raw data for a given ticker from yfinance.
+    Fetches raw data for a given ticker from the configured data provider (yfinance by default).
     Returns a dictionary containing:
     - info: Dictionary of stock info
-    - history: DataFrame of price history (max period)
+    - history: DataFrame of price history (max period, via the local price_store)
     - financials: DataFrame of annual financials
     - balance_sheet: DataFrame of annual balance sheet
     - cashflow: DataFrame of annual cashflow
     """
-    ticker = yf.Ticker(ticker_symbol)
+    ticker = providers.get_provider().ticker(ticker_symbol)
     
     # Fetch data
     try:
         info = ticker.info
-        history = ticker.history(period="max")
+        history = _load_history(ticker, ticker_symbol)
         financials = ticker.financials
         balance_sheet = ticker.balance_sheet
         cashflow = ticker.cashflow
         
         # Basic validation
-        if history.empty:
+        if history is None or history.empty:
             return None
             
         return {
@@ -39,6 +82,10 @@ def get_stock_data(ticker_symbol):
         print(f"Error fetching data for {ticker_symbol}: {e}")
         return None
 
+def get_price_window(ticker_symbol, start=None, end=None):
+    """Slice of stored daily OHLCV for [start, end] without network I/O. None if not stored."""
+    return price_store.load(ticker_symbol.upper(), start=start, end=end)
+
 def get_market_price(data):
     """Extracts current market price from data."""
     if not data or "info" not in data:
@@ -1,33 +1,55 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import os
 import datetime
 import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import market_cache
+import snapshot_store
+import price_store
+import risk_engine
+import technicals
+import providers
+import universe
+import utils
+import profiling
 
 MARKET_DATA_DIR = "market_data"
-SP500_WIKI_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
 
-def get_sp500_tickers():
-    """Fetches identifying info for S&P 500 companies from Wikipedia."""
-    print("Fetching S&P 500 universe...")
-    try:
-        # Wikipedia blocks generic python requests, so we need a User-Agent
-        import requests
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(SP500_WIKI_URL, headers=headers)
-        response.raise_for_status()
-        
-        tables = pd.read_html(pd.io.common.BytesIO(response.content))
-        df = tables[0]
-        # Rename Symbol to Ticker and GICS Sector to Sector
-        df = df.rename(columns={"Symbol": "Ticker", "GICS Sector": "Sector"})
-        return df[["Ticker", "Sector", "Security"]]
-    except Exception as e:
-        print(f"Error fetching S&P 500 list: {e}")
-        return pd.DataFrame()
+# Concurrent refresh defaults
+YAHOO_HOST = "query2.finance.yahoo.com"
+DEFAULT_WORKERS = 8
+DEFAULT_RATE_LIMIT = 10.0 # requests / sec per host
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5 # seconds, doubled each retry
+HISTORY_WINDOW = pd.DateOffset(years=1) # Scanner metrics use the trailing 1Y of bars
+
+# Compute stage (build_record) defaults: chunks of tickers spread over worker processes
+DEFAULT_COMPUTE_WORKERS = os.cpu_count() or 1
+COMPUTE_CHUNK = 64
+# The only info keys build_record reads; the rest of the (large) info dict is not shipped to workers
+RECORD_INFO_FIELDS = ("beta", "forwardPE", "pegRatio", "fullTimeEmployees", "earningsGrowth", "profitMargins")
+
+# Snapshot column -> technicals.compute_technicals column
+SNAPSHOT_TECHNICALS = {
+    "Price": "Price",
+    "MA50": "SMA50",
+    "MA200": "SMA200",
+    "RSI": "RSI",
+    "Vol_Avg": "Vol_Ratio",
+    "Range_Pos": "Range_Pos",
+}
+
+def get_sp500_tickers(provider=None, spec=universe.DEFAULT_UNIVERSE, refresh=False):
+    """
+    Universe list (Ticker, Sector, Security): S&P 500 by default, or a CSV path.
+    Served from the local universe registry; the provider is only asked when the copy is stale.
+    """
+    return universe.load(spec, provider or providers.get_provider(), refresh=refresh)
 
 def calculate_custom_metrics(ticker, info, financials, balance_sheet, cashflow, history):
     """
@@ -87,9 +109,20 @@ def calculate_custom_metrics(ticker, info, financials, balance_sheet, cashflow,
 
     # --- 3. HARD FILTER DATA ---
     metrics["FCF_Positive"] = False
+    metrics["FCF"] = np.nan
     try:
         fcf = cashflow.loc["Free Cash Flow"].iloc[0] if "Free Cash Flow" in cashflow.index else -1
         if fcf > 0: metrics["FCF_Positive"] = True
+        if "Free Cash Flow" in cashflow.index: metrics["FCF"] = fcf
+    except:
+        pass
+    
+    # --- 4. DCF INPUTS ---
+    # Shares: info when available, else the balance sheet's latest share count (point-in-time for backtests)
+    metrics["Shares"] = info.get("sharesOutstanding") or np.nan
+    try:
+        if not metrics["Shares"] > 0 and "Ordinary Shares Number" in balance_sheet.index:
+            metrics["Shares"] = balance_sheet.loc["Ordinary Shares Number"].iloc[0]
     except:
         pass
         
@@ -103,139 +136,428 @@ def calculate_custom_metrics(ticker, info, financials, balance_sheet, cashflow,
         
     return metrics
 
-def update_market_data(tickers_df, limit=None):
-    if not os.path.exists(MARKET_DATA_DIR):
-        os.makedirs(MARKET_DATA_DIR)
-        
+def gross_margin_trend(financials):
+    """Latest gross margin minus the prior year's (0 when fewer than two periods)."""
+    try:
+        if len(financials.columns) >= 2:
+            curr_gm = financials.loc["Gross Profit"].iloc[0] / financials.loc["Total Revenue"].iloc[0]
+            prev_gm = financials.loc["Gross Profit"].iloc[1] / financials.loc["Total Revenue"].iloc[1]
+            return curr_gm - prev_gm
+    except:
+        pass
+    return 0
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter shared by all refresh workers.
+    Each host gets its own bucket so one slow endpoint does not starve another.
+    """
+    def __init__(self, rate_per_sec=DEFAULT_RATE_LIMIT, burst=None):
+        self.rate = rate_per_sec
+        self.burst = burst or max(1, int(rate_per_sec))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host=YAHOO_HOST):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+def call_with_retry(fn, limiter=None, host=YAHOO_HOST, retries=MAX_RETRIES, backoff=BACKOFF_BASE):
+    """
+    Runs a single network call behind the rate limiter, retrying with
+    exponential backoff (plus jitter) on any exception.
+    Returns (result, attempts). Re-raises the last error once retries are exhausted.
+    """
+    for attempt in range(retries + 1):
+        if limiter:
+            limiter.acquire(host)
+        try:
+            return fn(), attempt + 1
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+def fetch_ticker_bundle(y_ticker, ticker_factory=None, limiter=None, retries=MAX_RETRIES, backoff=BACKOFF_BASE,
+                        history_start=None, fetch_history=True, fetch_statements=True):
+    """
+    Fetches the raw yfinance payloads for one ticker.
+    Full refresh pulls all five; the incremental path narrows it down with
+    history_start (delta bars only) and fetch_history / fetch_statements.
+    Returns (bundle dict, total attempts, network calls).
+    """
+    ticker_factory = ticker_factory or providers.get_provider().ticker
+    ticker_obj = ticker_factory(y_ticker)
+    calls = {"info": lambda: ticker_obj.info}
+    if fetch_history:
+        if history_start is not None:
+            calls["history"] = lambda: ticker_obj.history(start=history_start.strftime("%Y-%m-%d"))
+        else:
+            calls["history"] = lambda: ticker_obj.history(period="1y") # 1 Year for Risk/Tech
+    if fetch_statements:
+        calls["financials"] = lambda: ticker_obj.financials
+        calls["balance_sheet"] = lambda: ticker_obj.balance_sheet
+        calls["cashflow"] = lambda: ticker_obj.cashflow
+
+    bundle = {}
+    attempts = 0
+    for key, fn in calls.items():
+        bundle[key], n = call_with_retry(fn, limiter, retries=retries, backoff=backoff)
+        attempts += n
+    return bundle, attempts, len(calls)
+
+def refetch_history(y_ticker, start, ticker_factory=None, limiter=None, retries=MAX_RETRIES, backoff=BACKOFF_BASE):
+    """
+    Re-downloads a stored series after the provider re-adjusted it (price_store.refresh):
+    from start, or period="max" when start is None. Returns (history, attempts).
+    """
+    ticker_factory = ticker_factory or providers.get_provider().ticker
+    ticker_obj = ticker_factory(y_ticker)
+    if start is not None:
+        fetch = lambda: ticker_obj.history(start=start.strftime("%Y-%m-%d"))
+    else:
+        fetch = lambda: ticker_obj.history(period="max")
+    return call_with_retry(fetch, limiter, retries=retries, backoff=backoff)
+
+def build_record(ticker_sym, name, sector, bundle):
+    """
+    Turns a raw fetch bundle into the flat scanner row (fundamentals + info fields).
+    Price technicals are filled in afterwards for the whole universe at once by
+    apply_technicals. Pure computation (no I/O) so the serial and concurrent
+    paths produce identical output. Returns None when there is no price history
+    (the compute stage passes bundles without "history"; the fetch stage already checked it).
+    """
+    info = bundle["info"]
+    hist = bundle.get("history")
+    fins = bundle["financials"]
+    bs = bundle["balance_sheet"]
+    cf = bundle["cashflow"]
+
+    if hist is not None and hist.empty:
+        return None
+
+    # Calculate Pro Metrics
+    custom = calculate_custom_metrics(ticker_sym, info, fins, bs, cf, hist)
+
+    # Calc Gross Margin Trend
+    gm_trend = gross_margin_trend(fins)
+
+    # Flatten Info + Custom Metrics into a single scanner row
+    return {
+        "Ticker": ticker_sym,
+        "Name": name,
+        "Sector": sector,
+        "GrossMarginTrend": gm_trend,
+        "Beta": info.get("beta", np.nan),
+        "ForwardPE": info.get("forwardPE", np.nan),
+        "PegRatio": info.get("pegRatio", np.nan),
+        "Employees": info.get("fullTimeEmployees", np.nan),
+        "EPS_Growth_3Y": info.get("earningsGrowth", 0),
+        # Custom
+        "ROIC": custom.get("ROIC"),
+        "Rev_CAGR_3Y": custom.get("Rev_CAGR_3Y"),
+        "FCF_Positive": custom.get("FCF_Positive"),
+        "Debt_EBITDA": custom.get("Debt_EBITDA"),
+        "FCF": custom.get("FCF"),
+        "Shares": custom.get("Shares")
+    }
+
+def _compute_chunk(items):
+    """Worker entry point: build_record for a chunk of (ticker, name, sector, bundle). Returns plain dicts."""
+    return [build_record(t, name, sector, bundle) for t, name, sector, bundle in items]
+
+def compute_records(items, workers=DEFAULT_COMPUTE_WORKERS, chunk_size=COMPUTE_CHUNK):
+    """
+    Compute stage of the refresh: builds the scanner row for every fetched ticker.
+    items = [(ticker, name, sector, bundle)] with bundle = info subset + statements.
+    workers>1 spreads chunks of chunk_size tickers over a process pool (the metric math is
+    CPU-bound pandas work, so threads would serialize on the GIL). workers<=1, or fewer
+    items than two chunks, runs in this process - the mode to debug in.
+    Returns the record dicts in input order.
+    """
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                return [r for part in pool.map(_compute_chunk, chunks) for r in part]
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Process pool unavailable ({e}); computing serially.")
+    return _compute_chunk(items)
+
+def apply_technicals(records, histories):
+    """
+    Fills the snapshot's price fields from technicals.compute_technicals, run once
+    over the (dates x tickers) matrix of every refreshed ticker's trailing window.
+    """
+    if records.empty:
+        return records
+    close, volume = technicals.price_matrix(histories)
+    tech = technicals.compute_technicals(close, volume)
+    for field, source in SNAPSHOT_TECHNICALS.items():
+        records[field] = records["Ticker"].map(tech[source])
+    return records
+
+@profiling.profiled()
+def refresh_ticker(ticker_sym, meta, out_dir=MARKET_DATA_DIR, ticker_factory=None, limiter=None,
+                   retries=MAX_RETRIES, backoff=BACKOFF_BASE, manifest=None, cache_dir=None):
+    """
+    Fetch stage for one ticker (network + local stores only). Never raises; returns a
+    status dict consumed by the progress/summary report, carrying the compute stage's
+    inputs under "inputs" (info subset + statements, see compute_records) and the
+    trailing Close/Volume window under "history".
+
+    Fetched bars go to the price_store, which keeps the full OHLCV series for the
+    analyzers and the app: a full 1Y fetch replaces the stored series, a delta is appended.
+
+    When a manifest dict is passed the refresh is incremental: only bars from the
+    last complete stored bar on are downloaded (re-fetched in full if the provider has
+    re-adjusted the history, see price_store.refresh) and statements are re-used until
+    a new fiscal period can exist (see market_cache.statements_due). The manifest is updated in place.
+    """
+    # Handle dot in ticker (BRK.B -> BRK-B)
+    y_ticker = ticker_sym.replace(".", "-")
+    cache_dir = cache_dir or os.path.join(out_dir, "cache")
+    price_dir = os.path.join(out_dir, "prices")
+    start = time.perf_counter()
+    status = {"ticker": ticker_sym, "status": "failed", "attempts": 0, "calls": 0, "error": None,
+              "inputs": None, "history": None}
+
+    try:
+        entry = manifest.get(ticker_sym) if manifest is not None else None
+        last_bar = price_store.last_date(ticker_sym, price_dir) if entry else None
+        cached_stmts = None
+        if entry and not market_cache.statements_due(entry):
+            cached_stmts = market_cache.load_statements(ticker_sym, cache_dir)
+
+        # Already holding today's bar -> nothing new to download
+        history_start = price_store.overlap_start(ticker_sym, price_dir) if last_bar is not None else None
+        fetch_history = last_bar is None or last_bar.date() < datetime.date.today()
+
+        bundle, status["attempts"], status["calls"] = fetch_ticker_bundle(
+            y_ticker, ticker_factory, limiter, retries, backoff,
+            history_start=history_start, fetch_history=fetch_history, fetch_statements=cached_stmts is None,
+        )
+        fetched = {"info"}
+        if fetch_history:
+            fetched.add("history")
+            if history_start is None:
+                if not bundle["history"].empty:
+                    price_store.write(ticker_sym, bundle["history"], root=price_dir)
+            else:
+                def refetch(since):
+                    hist, n = refetch_history(y_ticker, since, ticker_factory, limiter, retries, backoff)
+                    status["attempts"] += n
+                    status["calls"] += 1
+                    return hist
+                price_store.refresh(ticker_sym, bundle["history"], refetch, root=price_dir)
+        if history_start is not None:
+            # Delta only: rebuild the trailing window from the store
+            latest = price_store.last_date(ticker_sym, price_dir)
+            bundle["history"] = price_store.load(ticker_sym, start=latest - HISTORY_WINDOW + pd.Timedelta(days=1), root=price_dir)
+        if cached_stmts is None:
+            fetched.add("statements")
+        else:
+            bundle.update(cached_stmts)
+
+        if bundle["history"].empty:
+            status["status"] = "skipped"
+            status["error"] = "No history"
+        else:
+            info = bundle["info"] or {}
+            status["inputs"] = {"info": {k: info[k] for k in RECORD_INFO_FIELDS if k in info},
+                                **{kind: bundle[kind] for kind in market_cache.STATEMENTS}}
+            status["history"] = bundle["history"][["Close", "Volume"]]
+            # Keep raw statements so the next run can skip them until a new period is due
+            if "statements" in fetched:
+                market_cache.save_statements(ticker_sym, bundle, cache_dir)
+            if manifest is not None:
+                manifest[ticker_sym] = market_cache.make_entry(entry, bundle["history"], bundle["financials"], fetched)
+            status["status"] = "ok"
+    except Exception as e:
+        status["error"] = str(e)
+
+    status["seconds"] = time.perf_counter() - start
+    return status
+
+def refresh_benchmark(symbol=risk_engine.BENCHMARK, out_dir=MARKET_DATA_DIR, ticker_factory=None, limiter=None,
+                      retries=MAX_RETRIES, backoff=BACKOFF_BASE):
+    """
+    Appends the benchmark's new bars to the price_store (history only: no info, statements
+    or snapshot row), re-fetching the stored range if the provider re-adjusted it.
+    Never raises; returns the number of stored bars (0 if it could not be fetched).
+    """
+    price_dir = os.path.join(out_dir, "prices")
+    try:
+        last_bar = price_store.last_date(symbol, price_dir)
+        if last_bar is not None and last_bar.date() >= datetime.date.today():
+            return price_store.length(symbol, price_dir)
+        ticker_factory = ticker_factory or providers.get_provider().ticker
+        ticker_obj = ticker_factory(symbol)
+        if last_bar is None:
+            hist, _ = call_with_retry(lambda: ticker_obj.history(period="1y"), limiter, retries=retries, backoff=backoff)
+            return price_store.append(symbol, hist, root=price_dir)
+        start = price_store.overlap_start(symbol, price_dir)
+        hist, _ = call_with_retry(lambda: ticker_obj.history(start=start.strftime("%Y-%m-%d")),
+                                  limiter, retries=retries, backoff=backoff)
+        refetch = lambda since: refetch_history(symbol, since, ticker_factory, limiter, retries, backoff)[0]
+        return price_store.refresh(symbol, hist, refetch, root=price_dir)[0]
+    except Exception as e:
+        print(f"Benchmark {symbol} not refreshed: {e}")
+        return price_store.length(symbol, price_dir)
+
+def _print_progress(done, total, status):
+    label = {"ok": "Done.", "skipped": f"Skipped ({status['error']})", "failed": f"Failed: {status['error']}"}
+    retry_note = f" [{status['attempts'] - status['calls']} retries]" if status["attempts"] > status["calls"] else ""
+    print(f"[{done}/{total}] {status['ticker']}: {label[status['status']]}{retry_note}", flush=True)
+
+def update_market_data(tickers_df, limit=None, workers=1, rate_limit=DEFAULT_RATE_LIMIT,
+                       retries=MAX_RETRIES, backoff=BACKOFF_BASE, out_dir=MARKET_DATA_DIR,
+                       ticker_factory=None, incremental=False, verbose=True,
+                       compute_workers=DEFAULT_COMPUTE_WORKERS, compute_chunk=COMPUTE_CHUNK):
+    """
+    Refreshes the universe and writes today's consolidated snapshot
+    (market_data/snapshots/date=YYYY-MM-DD/snapshot.parquet) in one atomic write.
+
+    workers=1 runs the original serial loop; workers>1 fans tickers out over a
+    thread pool (the work is network-bound). All workers share one per-host RateLimiter.
+    Fetching is followed by a separate compute stage (compute_records) that runs
+    build_record across compute_workers processes (1 = in-process), so the
+    snapshot is identical whatever the worker counts.
+    ticker_factory defaults to providers.get_provider().ticker (yfinance unless
+    STOCK_PROVIDER says otherwise); any provider's .ticker can be passed to run offline.
+
+    incremental=True re-uses the per-ticker manifest in market_data/cache so daily
+    cost scales with new bars / new filings rather than universe x history length.
+
+    Returns a summary report dict.
+    """
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
     tickers_list = tickers_df["Ticker"].unique()
     if limit:
         tickers_list = tickers_list[:limit]
-        
-    print(f"Updating data for {len(tickers_list)} tickers...")
-    
-    success_count = 0
-    
-    for i, ticker_sym in enumerate(tickers_list):
-        # Handle dot in ticker (BRK.B -> BRK-B)
-        y_ticker = ticker_sym.replace(".", "-")
-        
-        file_path = os.path.join(MARKET_DATA_DIR, f"{ticker_sym}_data.parquet")
-        
-        # Simple cache check (skip if modified today)
-        # In prod, we might want to force update on weekends etc.
-        # For now, always fetch if running update.
-        
-        try:
-            print(f"[{i+1}/{len(tickers_list)}] Fetching {ticker_sym}...", end=" ", flush=True)
-            ticker_obj = yf.Ticker(y_ticker)
-            
-            # Fetch ALL data needed
-            # 1. Info
-            info = ticker_obj.info
-            
-            # 2. History (1 Year for Risk/Tech)
-            hist = ticker_obj.history(period="1y")
-            
-            # 3. Financials
-            fins = ticker_obj.financials
-            bs = ticker_obj.balance_sheet
-            cf = ticker_obj.cashflow
-            
-            if hist.empty:
-                print("Skipped (No history)")
-                continue
-
-            # Calculate Pro Metrics
-            custom = calculate_custom_metrics(ticker_sym, info, fins, bs, cf, hist)
-            
-            # Fetch Name from uni
-            name = tickers_df[tickers_df["Ticker"] == ticker_sym]["Security"].iloc[0] if "Security" in tickers_df.columns else ticker_sym
-            
-            # Pack data for storage
-            # We can't easily save objects to parquet. We'll save a combined DataFrame of metrics
-            # and a separate Price DataFrame if needed. 
-            # Strategy: Save a "Meta" row with all scalar metrics, and maybe latest price.
-            # Real scanner needs full history for MA calc.
-            
-            # Let's save a dictionary of dataframes using pickle or separate files? 
-            # Plan said Parquet.
-            # Best approach for file-per-ticker:
-            # 1. metrics.csv (single row)
-            # 2. history.csv (timeseries)
-            
-            # Or simpler: Save everything into a structured dict and pickle it? 
-            # Parquet is strictly tabular.
-            # Let's verify instructions: "Save to market_data/{ticker}_data.parquet"
-            # We will flatten the scalar data into columns.
-            
-            # Flatten Info + Custom Metrics
-            
-            # Flatten Info + Custom Metrics
-            
-            # Calc Gross Margin Trend
-            gm_trend = 0
-            try:
-                if len(fins.columns) >= 2:
-                    curr_gm = fins.loc["Gross Profit"].iloc[0] / fins.loc["Total Revenue"].iloc[0]
-                    prev_gm = fins.loc["Gross Profit"].iloc[1] / fins.loc["Total Revenue"].iloc[1]
-                    gm_trend = curr_gm - prev_gm
-            except:
-                pass
-
-            # Calc RSI
-            rsi_val = 50
-            try:
-                delta = hist["Close"].diff()
-                gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-                loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-                rs = gain / loss
-                rsi_series = 100 - (100 / (1 + rs))
-                rsi_val = rsi_series.iloc[-1]
-            except:
-                pass
-
-            flat_data = {
-                "Ticker": ticker_sym,
-                "Name": name,
-                "Sector": tickers_df[tickers_df["Ticker"] == ticker_sym]["Sector"].iloc[0],
-                "Price": hist["Close"].iloc[-1],
-                "MA200": hist["Close"].rolling(200).mean().iloc[-1] if len(hist) > 200 else np.nan,
-                "MA50": hist["Close"].rolling(50).mean().iloc[-1] if len(hist) > 50 else np.nan,
-                "RSI": rsi_val,
-                "GrossMarginTrend": gm_trend,
-                "Beta": info.get("beta", np.nan),
-                "ForwardPE": info.get("forwardPE", np.nan),
-                "PegRatio": info.get("pegRatio", np.nan),
-                "Employees": info.get("fullTimeEmployees", np.nan),
-                "EPS_Growth_3Y": info.get("earningsGrowth", 0),
-                # Custom
-                "ROIC": custom.get("ROIC"),
-                "Rev_CAGR_3Y": custom.get("Rev_CAGR_3Y"),
-                "FCF_Positive": custom.get("FCF_Positive"),
-                "Debt_EBITDA": custom.get("Debt_EBITDA")
-            }
-            
-            # Save Flattened Data
-            df_flat = pd.DataFrame([flat_data])
-            df_flat.to_parquet(file_path) # Fast and efficient
-            
-            # NOTE: For "History tracking", we need daily outputs. 
-            # For "Scanner", we need cross-sectional data.
-            # This flat file is perfect for the scanner.
-            
-            print("Done.")
-            success_count += 1
-            
-        except Exception as e:
-            print(f"Failed: {e}")
-            
-    print(f"Update Complete. {success_count} tickers processed.")
+
+    # Name / Sector lookup built once instead of filtering the frame per ticker
+    names = tickers_df["Security"] if "Security" in tickers_df.columns else tickers_df["Ticker"]
+    meta = dict(zip(tickers_df["Ticker"], zip(names, tickers_df["Sector"])))
+
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+    cache_dir = os.path.join(out_dir, "cache")
+    manifest = market_cache.load_manifest(cache_dir) if incremental else None
+    total = len(tickers_list)
+    mode = "serial" if workers <= 1 else f"concurrent ({workers} workers)"
+    if incremental:
+        mode += ", incremental"
+    print(f"Updating data for {total} tickers [{mode}]...")
+
+    start = time.perf_counter()
+    results = []
+
+    def run(sym):
+        return refresh_ticker(sym, meta, out_dir, ticker_factory, limiter, retries, backoff, manifest, cache_dir)
+
+    with profiling.stage("fetch", rows=total):
+        if workers <= 1:
+            for sym in tickers_list:
+                results.append(run(sym))
+                if verbose: _print_progress(len(results), total, results[-1])
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(run, sym) for sym in tickers_list]
+                for fut in as_completed(futures):
+                    results.append(fut.result())
+                    if verbose: _print_progress(len(results), total, results[-1])
+
+    if manifest is not None:
+        market_cache.save_manifest(manifest, cache_dir)
+
+    # Benchmark bars for risk_engine's beta (price-only: not a snapshot row)
+    with profiling.stage("fetch_benchmark"):
+        refresh_benchmark(risk_engine.BENCHMARK, out_dir, ticker_factory, limiter, retries, backoff)
+
+    # Fundamentals: CPU-bound, across processes once all network I/O is done
+    with profiling.stage("compute") as s:
+        items = [(r["ticker"], *meta.get(r["ticker"], (r["ticker"], None)), r.pop("inputs"))
+                 for r in results if r["inputs"] is not None]
+        records = [rec for rec in compute_records(items, compute_workers, compute_chunk) if rec is not None]
+        for rec in records:
+            rec["AsOf"] = datetime.date.today()
+        s.rows = len(records)
+
+    # Technicals for the whole universe in one vectorized pass
+    with profiling.stage("apply_technicals") as s:
+        records = pd.DataFrame(records)
+        histories = {r["ticker"]: r.pop("history") for r in results if r["history"] is not None}
+        records = apply_technicals(records, histories)
+        s.rows = len(records)
+
+    # One consolidated write; tickers not refreshed this run are carried forward
+    snapshot_dir = os.path.join(out_dir, "snapshots")
+    with profiling.stage("write_snapshot") as s:
+        snapshot = snapshot_store.merge_with_previous(records, snapshot_dir=snapshot_dir)
+        s.rows = len(snapshot)
+        if not snapshot.empty:
+            path = snapshot_store.write_snapshot(snapshot, snapshot_dir=snapshot_dir)
+    if not snapshot.empty:
+        print(f"Snapshot written: {path} ({len(snapshot)} tickers)")
+        utils.bump_output_version("data_update", root=out_dir) # Invalidates the app's cached market data
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "mode": mode,
+        "tickers": total,
+        "ok": sum(r["status"] == "ok" for r in results),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "retried": sum(r["attempts"] > r["calls"] for r in results),
+        "network_calls": sum(r["calls"] for r in results),
+        "elapsed_sec": round(elapsed, 2),
+        "tickers_per_sec": round(total / elapsed, 2) if elapsed > 0 else None,
+        "failures": {r["ticker"]: r["error"] for r in results if r["status"] == "failed"},
+    }
+    profiling.count("fetch_retries", sum(r["attempts"] - r["calls"] for r in results))
+    profiling.count("tickers_failed", report["failed"])
+
+    print(f"Update Complete. {report['ok']} tickers processed, {report['skipped']} skipped, "
+          f"{report['failed']} failed in {report['elapsed_sec']}s ({report['tickers_per_sec']} tickers/s, "
+          f"{report['network_calls']} network calls).")
+    if report["failures"]:
+        print("Failed tickers: " + ", ".join(sorted(report["failures"])))
+    return report
 
 if __name__ == "__main__":
-    uni = get_sp500_tickers()
+    parser = argparse.ArgumentParser(description="Refresh market_data for the S&P 500 (or a CSV) universe.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent fetch workers (1 = serial).")
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT, help="Max requests/sec per host (0 = unlimited).")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--compute-workers", type=int, default=DEFAULT_COMPUTE_WORKERS,
+                        help="Processes for the metric computations (1 = serial, in-process).")
+    parser.add_argument("--limit", type=int, default=None, help="Only refresh the first N tickers.")
+    parser.add_argument("--full", action="store_true", help="Ignore the cache manifest and re-download everything.")
+    parser.add_argument("--universe", default=universe.DEFAULT_UNIVERSE, help="sp500 or a CSV of tickers (Ticker[, Sector, Security]).")
+    parser.add_argument("--refresh-universe", action="store_true", help="Re-fetch the universe list even if the cached copy is fresh.")
+    parser.add_argument("--provider", default=None,
+                        help="Data provider spec, e.g. record:recordings/today or replay:recordings/today (default: $STOCK_PROVIDER or yfinance).")
+    args = parser.parse_args()
+
+    provider = providers.get_provider(args.provider)
+    uni = get_sp500_tickers(provider, args.universe, args.refresh_universe)
     if not uni.empty:
-        # Default run: 5 tickers for Testing, user can edit for full run
-        print("Running FULL MODE (All S&P 500 tickers). This may take 5-10 minutes.")
-        update_market_data(uni, limit=None)
+        print("Running " + ("FULL" if args.full else "INCREMENTAL") + f" MODE ({len(uni)} {args.universe} tickers, provider: {provider.name}).")
+        update_market_data(uni, limit=args.limit, workers=args.workers, rate_limit=args.rate_limit,
+                           retries=args.retries, ticker_factory=provider.ticker, incremental=not args.full,
+                           compute_workers=args.compute_workers)
     else:
         print("Could not load universe.")
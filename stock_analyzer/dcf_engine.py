@@ -0,0 +1,151 @@
+import pandas as pd
+import numpy as np
+import argparse
+import time
+import snapshot_store
+import profiling
+
+# Batch DCF engine. One closed-form expression, broadcast over NumPy arrays, values every
+# ticker at once (and any discount-rate x growth grid) instead of a Python loop per ticker:
+#   value = FCF * sum_{t=1..N} q^t + FCF * (1+g)^N * (1+tg) / (r - tg) / (1+r)^N,  q = (1+g)/(1+r)
+#   per share = value / shares,  upside = per share / price - 1
+# Same model as the original single-stock DCF in valuation.py (5-year growth phase + Gordon
+# terminal value). Assumptions come from DCF_ASSUMPTIONS, overridden per sector by SECTOR_ASSUMPTIONS.
+# The scanner adds DCF_Upside as a Valuation factor (add_dcf_upside); the app shows
+# sensitivity_table() for one ticker.
+# Usage:
+#   python dcf_engine.py --top 20              (highest DCF upside in the latest snapshot)
+#   python dcf_engine.py --ticker AAPL         (discount rate x growth upside table)
+
+DCF_ASSUMPTIONS = {
+    "growth": 0.08,   # FCF growth over the projection years
+    "discount": 0.10, # Discount rate
+    "terminal": 0.03, # Terminal (perpetual) growth
+    "years": 5,       # Projection years
+}
+# Per-sector overrides of any DCF_ASSUMPTIONS key except years,
+# e.g. {"Utilities": {"growth": 0.04, "discount": 0.08}}
+SECTOR_ASSUMPTIONS = {}
+
+# Sensitivity grid axes
+GRID_DISCOUNT = np.round(np.arange(0.07, 0.135, 0.01), 2)
+GRID_GROWTH = np.round(np.arange(0.0, 0.165, 0.02), 2)
+
+INPUT_COLUMNS = ["Sector", "FCF", "Shares", "Price"] # Snapshot fields add_dcf_upside reads
+
+def assumptions_for(sectors, assumptions=None, sector_assumptions=None):
+    """
+    {"growth", "discount", "terminal", "years"} for an array of sectors: per-row arrays where a
+    sector overrides the assumption, scalars (which broadcast) otherwise. sectors may be None.
+    """
+    base = {**DCF_ASSUMPTIONS, **(assumptions or {})}
+    overrides = SECTOR_ASSUMPTIONS if sector_assumptions is None else sector_assumptions
+    out = dict(base)
+    if sectors is None:
+        return out
+    sectors = pd.Series(np.asarray(sectors, dtype=object))
+    for key in ("growth", "discount", "terminal"):
+        per_sector = {s: o[key] for s, o in overrides.items() if key in o}
+        if per_sector:
+            out[key] = sectors.map(per_sector).fillna(base[key]).to_numpy(dtype=np.float64)
+    return out
+
+def intrinsic_value(fcf, shares, growth, discount, terminal, years=DCF_ASSUMPTIONS["years"]):
+    """
+    Per-share DCF value. All array arguments broadcast against each other.
+    NaN where FCF <= 0, shares <= 0 or the discount rate does not exceed terminal growth.
+    """
+    fcf, shares, g, r, tg = (np.asarray(a, dtype=np.float64) for a in (fcf, shares, growth, discount, terminal))
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        q = (1 + g) / (1 + r)
+        # Growth phase: geometric sum of q^1..q^N (N terms of 1 when g == r)
+        ratio = np.where(np.isclose(q, 1.0), years, q * (1 - q ** years) / (1 - q))
+        terminal_value = (1 + g) ** years * (1 + tg) / (r - tg) / (1 + r) ** years
+        value = fcf * (ratio + terminal_value) / shares
+    valid = (fcf > 0) & (shares > 0) & (r > tg)
+    return np.where(valid, value, np.nan)
+
+def upside(value, price):
+    """value / price - 1; NaN where price is not positive."""
+    value, price = np.asarray(value, dtype=np.float64), np.asarray(price, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(price > 0, value / price - 1, np.nan)
+
+@profiling.profiled()
+def add_dcf_upside(df, assumptions=None, sector_assumptions=None):
+    """
+    Adds Intrinsic_Value (per share) and DCF_Upside columns for every row in one pass.
+    Rows without positive FCF, shares or price get NaN (normalize_metrics scores them neutral).
+    """
+    if not {"FCF", "Shares", "Price"}.issubset(df.columns):
+        df["Intrinsic_Value"] = np.nan
+        df["DCF_Upside"] = np.nan
+        return df
+    a = assumptions_for(df["Sector"] if "Sector" in df.columns else None, assumptions, sector_assumptions)
+    value = intrinsic_value(df["FCF"].to_numpy(dtype=np.float64), df["Shares"].to_numpy(dtype=np.float64),
+                            a["growth"], a["discount"], a["terminal"], a["years"])
+    df["Intrinsic_Value"] = value
+    df["DCF_Upside"] = upside(value, df["Price"].to_numpy(dtype=np.float64))
+    return df
+
+def sensitivity_grid(fcf, shares, discount_rates=GRID_DISCOUNT, growth_rates=GRID_GROWTH,
+                     terminal=DCF_ASSUMPTIONS["terminal"], years=DCF_ASSUMPTIONS["years"]):
+    """
+    Per-share values as a (tickers x discount rates x growth rates) array.
+    terminal may be a scalar or one value per ticker.
+    """
+    fcf = np.atleast_1d(np.asarray(fcf, dtype=np.float64))[:, None, None]
+    shares = np.atleast_1d(np.asarray(shares, dtype=np.float64))[:, None, None]
+    terminal = np.asarray(terminal, dtype=np.float64)
+    if terminal.ndim == 1:
+        terminal = terminal[:, None, None]
+    r = np.asarray(discount_rates, dtype=np.float64)[None, :, None]
+    g = np.asarray(growth_rates, dtype=np.float64)[None, None, :]
+    return intrinsic_value(fcf, shares, g, r, terminal, years)
+
+def upside_grid(fcf, shares, price, discount_rates=GRID_DISCOUNT, growth_rates=GRID_GROWTH,
+                terminal=DCF_ASSUMPTIONS["terminal"], years=DCF_ASSUMPTIONS["years"]):
+    """sensitivity_grid as upside vs each ticker's price (same shape)."""
+    price = np.atleast_1d(np.asarray(price, dtype=np.float64))[:, None, None]
+    return upside(sensitivity_grid(fcf, shares, discount_rates, growth_rates, terminal, years), price)
+
+def sensitivity_table(fcf, shares, price, sector=None, discount_rates=GRID_DISCOUNT, growth_rates=GRID_GROWTH):
+    """One ticker's upside grid: DataFrame with discount rates as rows and growth rates as columns."""
+    a = assumptions_for(None if sector is None else [sector])
+    terminal = np.ravel(a["terminal"])[0]
+    grid = upside_grid(fcf, shares, price, discount_rates, growth_rates, terminal, a["years"])[0]
+    return pd.DataFrame(grid, index=pd.Index(discount_rates, name="Discount rate"),
+                        columns=pd.Index(growth_rates, name="FCF growth"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch DCF over the latest market_data snapshot.")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--ticker", help="Print this ticker's discount rate x growth upside table.")
+    args = parser.parse_args()
+
+    date = snapshot_store.latest_snapshot_date()
+    if date is None:
+        print("No market data found. Please run data_update.py first.")
+        exit()
+    df = snapshot_store.read_snapshot(date, columns=["Ticker", "Name"] + INPUT_COLUMNS)
+
+    start = time.perf_counter()
+    df = add_dcf_upside(df)
+    grid = upside_grid(df["FCF"], df["Shares"], df["Price"])
+    elapsed = time.perf_counter() - start
+    print(f"DCF for {len(df)} tickers + {grid.shape[1]}x{grid.shape[2]} sensitivity grids in {elapsed * 1000:.1f} ms "
+          f"({df['DCF_Upside'].notna().sum()} with positive FCF).")
+
+    if args.ticker:
+        row = df[df["Ticker"] == args.ticker.upper()]
+        if row.empty:
+            print(f"{args.ticker.upper()} is not in the {date} snapshot.")
+            exit()
+        row = row.iloc[0]
+        print(f"\n{row['Ticker']}  price {row['Price']:.2f}  intrinsic {row['Intrinsic_Value']:.2f}  "
+              f"upside {row['DCF_Upside']:.1%}")
+        table = sensitivity_table(row["FCF"], row["Shares"], row["Price"], row["Sector"])
+        print((table * 100).round(1).to_string())
+    else:
+        top = df.nlargest(args.top, "DCF_Upside")
+        print(top[["Ticker", "Name", "Sector", "Price", "Intrinsic_Value", "DCF_Upside"]].to_string(index=False))
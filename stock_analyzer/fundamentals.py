@@ -1,37 +1,27 @@
 import pandas as pd
 import numpy as np
+import analysis_context
+import profiling
 
+@profiling.profiled()
 def analyze_fundamentals(data):
     """
     Analyzes fundamental metrics and returns a dictionary with raw values and a score (0-10).
+    `data` is a get_stock_data dict or an AnalysisContext.
     """
-    if data is None:
+    ctx = analysis_context.context(data)
+    if ctx is None:
         return None
 
-    financials = data.get("financials")
-    balance_sheet = data.get("balance_sheet")
-    cashflow = data.get("cashflow")
-    info = data.get("info", {})
+    info = ctx.info
 
     metrics = {}
     scores = {}
     reasons = []
 
-    # Helper to get latest value with fallback
-    def get_latest(df, key):
-        if df is None or df.empty:
-            return 0
-        try:
-            # yfinance rows are metrics, cols are dates. Get latest date.
-            if key in df.index:
-                return df.loc[key].iloc[0]
-        except:
-            pass
-        return 0
-
     # 1. Revenue Growth (CAGR 3Y if possible, else 1Y)
     try:
-        rev = financials.loc["Total Revenue"]
+        rev = ctx.row("financials", "Total Revenue")
         if len(rev) >= 3:
             # CAGR 3 Year
             latest = rev.iloc[0]
@@ -83,8 +73,8 @@ def analyze_fundamentals(data):
 
     # 4. FCF Margin
     try:
-        fcf = get_latest(cashflow, "Free Cash Flow")
-        rev = get_latest(financials, "Total Revenue")
+        fcf = ctx.latest("cashflow", "Free Cash Flow")
+        rev = ctx.latest("financials", "Total Revenue")
         fcf_margin = fcf / rev if rev != 0 else 0
         metrics["FCF Margin"] = fcf_margin
         
@@ -102,11 +92,13 @@ def analyze_fundamentals(data):
     # 5. Margins Trend (Gross Margin)
     # Rising margins = efficiency/pricing power
     try:
-        current_rev = financials.loc["Total Revenue"].iloc[0]
-        prev_rev = financials.loc["Total Revenue"].iloc[1]
+        rev = ctx.row("financials", "Total Revenue")
+        gross = ctx.row("financials", "Gross Profit")
+        current_rev = rev.iloc[0]
+        prev_rev = rev.iloc[1]
         
-        current_gm = financials.loc["Gross Profit"].iloc[0] / current_rev
-        prev_gm = financials.loc["Gross Profit"].iloc[1] / prev_rev
+        current_gm = gross.iloc[0] / current_rev
+        prev_gm = gross.iloc[1] / prev_rev
         
         metrics["Gross Margin"] = current_gm
         metrics["Gross Margin Trend"] = current_gm - prev_gm
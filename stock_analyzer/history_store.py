@@ -0,0 +1,142 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argparse
+import datetime
+import json
+import os
+import profiling
+
+# Append-only scan history, one partition per scan date:
+#   market_data/history/date=2026-01-08/scan.parquet   (Ticker, TotalScore, Date, Rank; sorted by Ticker)
+#   market_data/history/index.json                      ({"dates": {date: rows}, "tickers": [...]})
+# A daily run writes one new partition (a rerun replaces only that day's file) and
+# never rewrites older ones. Readers open only the partitions they need, so a
+# dashboard render stays the same cost however many years of history accumulate.
+# Replaces scan_history.csv (migrated automatically on first use).
+
+HISTORY_DIR = os.path.join("market_data", "history")
+HISTORY_FILE = "scan.parquet"
+INDEX_FILE = "index.json"
+LEGACY_CSV = "scan_history.csv"
+
+SCHEMA = pa.schema([
+    ("Ticker", pa.string()),
+    ("TotalScore", pa.float64()),
+    ("Date", pa.string()), # ISO date, same as the legacy CSV
+    ("Rank", pa.float64()),
+])
+
+def _partition_path(date, history_dir=HISTORY_DIR):
+    return os.path.join(history_dir, f"date={date}", HISTORY_FILE)
+
+def _empty():
+    return SCHEMA.empty_table().to_pandas()
+
+def load_index(history_dir=HISTORY_DIR):
+    path = os.path.join(history_dir, INDEX_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"dates": {}, "tickers": []}
+
+def _save_index(index, history_dir=HISTORY_DIR):
+    path = os.path.join(history_dir, INDEX_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+def write_date(df, date=None, history_dir=HISTORY_DIR):
+    """Writes (or replaces) one scan date's ranks atomically and updates the index."""
+    date = date or datetime.date.today().isoformat()
+    part = pd.DataFrame({
+        "Ticker": df["Ticker"].astype(str).values,
+        "TotalScore": df["TotalScore"].astype("float64").values,
+        "Date": date,
+        "Rank": df["Rank"].astype("float64").values,
+    }).sort_values("Ticker")
+    path = _partition_path(date, history_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(part, schema=SCHEMA, preserve_index=False), tmp)
+    os.replace(tmp, path)
+
+    index = load_index(history_dir)
+    index["dates"][date] = len(part)
+    index["dates"] = dict(sorted(index["dates"].items()))
+    index["tickers"] = sorted(set(index["tickers"]).union(part["Ticker"]))
+    _save_index(index, history_dir)
+    return path
+
+def migrate_csv(csv_path=LEGACY_CSV, history_dir=HISTORY_DIR):
+    """One-time import of scan_history.csv. Returns the number of dates written (0 if nothing to do)."""
+    if not os.path.exists(csv_path) or load_index(history_dir)["dates"]:
+        return 0
+    legacy = pd.read_csv(csv_path)
+    if legacy.empty:
+        return 0
+    print(f"Migrating {csv_path} into {history_dir}...")
+    for date, part in legacy.groupby("Date", sort=True):
+        write_date(part, str(date), history_dir)
+    return legacy["Date"].nunique()
+
+def list_dates(history_dir=HISTORY_DIR):
+    """Sorted ISO dates with a scan. Served from the index, no data files are opened."""
+    if not load_index(history_dir)["dates"]:
+        migrate_csv(history_dir=history_dir)
+    return list(load_index(history_dir)["dates"])
+
+def read_date(date, history_dir=HISTORY_DIR):
+    """All ranks for one scan date (empty frame if there was no scan)."""
+    path = _partition_path(date, history_dir)
+    if not os.path.exists(path):
+        return _empty()
+    profiling.count_file_read(path)
+    return pq.read_table(path).to_pandas()
+
+def read_tickers(tickers, last_n=None, history_dir=HISTORY_DIR):
+    """
+    History rows for the given tickers, oldest first, over the last `last_n` scan
+    dates (all if None). Only those partitions are opened, and each one is
+    filtered on its sorted Ticker column during the read.
+    """
+    dates = list_dates(history_dir)
+    if last_n is not None:
+        dates = dates[-last_n:]
+    tickers = list(tickers)
+    if not dates or not tickers:
+        return _empty()
+    flt = [("Ticker", "in", tickers)]
+    tables = []
+    for d in dates:
+        path = _partition_path(d, history_dir)
+        tables.append(pq.read_table(path, filters=flt))
+        profiling.count_file_read(path)
+    return pa.concat_tables(tables).to_pandas()
+
+def previous_date(before, history_dir=HISTORY_DIR):
+    """Latest scan date strictly before `before`, or None."""
+    earlier = [d for d in list_dates(history_dir) if d < before]
+    return earlier[-1] if earlier else None
+
+def rank_delta(current, prev):
+    """
+    Vectorized Rank_Delta for `current` (Ticker, Rank) against a previous scan.
+    Positive means the rank improved (Prev 10, Curr 5 -> +5). A ticker absent from
+    the previous scan counts as previous rank 0, as the CSV version did.
+    """
+    prev_ranks = prev.set_index("Ticker")["Rank"]
+    return prev_ranks.reindex(current["Ticker"]).fillna(0).to_numpy() - current["Rank"].to_numpy()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect / migrate the scan history store.")
+    parser.add_argument("--migrate", action="store_true", help=f"Import {LEGACY_CSV}.")
+    args = parser.parse_args()
+
+    if args.migrate:
+        print(f"Migrated {migrate_csv()} dates.")
+    index = load_index()
+    for d, n in index["dates"].items():
+        print(f"{d}: {n} tickers")
+    print(f"{len(index['tickers'])} distinct tickers over {len(index['dates'])} scans.")
@@ -0,0 +1,96 @@
+import pandas as pd
+import json
+import os
+import profiling
+import datetime
+
+# Local cache backing the incremental refresh in data_update.py.
+# market_data/cache/manifest.json records, per ticker, what was fetched and when:
+#   {"AAPL": {"last_bar": "2026-01-08", "history_fetched": "...", "statements_fetched": "...",
+#             "last_period_end": "2025-09-30", "info_fetched": "..."}}
+# Raw statements are kept next to it; price history lives in price_store.py.
+
+CACHE_DIR = os.path.join("market_data", "cache")
+MANIFEST_FILE = "manifest.json"
+STATEMENTS = ("financials", "balance_sheet", "cashflow")
+
+STATEMENT_RECHECK_DAYS = 90 # Quarterly safety re-check
+FILING_LAG_DAYS = 60 # Time after fiscal year end before a 10-K is normally available
+
+def _path(ticker, kind, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{ticker}_{kind}.parquet")
+
+def load_manifest(cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest, cache_dir=CACHE_DIR):
+    """Atomic write (tmp + rename) so an interrupted refresh never leaves a corrupt manifest."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def statements_due(entry, today=None):
+    """
+    Financial statements only change when a new fiscal period is filed.
+    Due when: never fetched, a new fiscal year-end + filing lag has passed since
+    the last fetch, or the quarterly re-check interval has elapsed.
+    """
+    today = today or datetime.date.today()
+    if not entry or not entry.get("statements_fetched"):
+        return True
+    fetched = datetime.date.fromisoformat(entry["statements_fetched"])
+    last_end = entry.get("last_period_end")
+    if last_end:
+        next_available = datetime.date.fromisoformat(last_end) + datetime.timedelta(days=365 + FILING_LAG_DAYS)
+        if today >= next_available > fetched:
+            return True
+    return (today - fetched).days >= STATEMENT_RECHECK_DAYS
+
+def load_statements(ticker, cache_dir=CACHE_DIR):
+    """Returns {"financials": df, "balance_sheet": df, "cashflow": df} or None if any piece is missing."""
+    out = {}
+    for kind in STATEMENTS:
+        path = _path(ticker, kind, cache_dir)
+        if not os.path.exists(path):
+            return None
+        df = pd.read_parquet(path)
+        profiling.count_file_read(path)
+        # Parquet needs string column names; restore the fiscal period dates
+        df.columns = pd.to_datetime(df.columns)
+        out[kind] = df
+    return out
+
+def save_statements(ticker, bundle, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    for kind in STATEMENTS:
+        df = bundle[kind].copy()
+        df.columns = [str(c) for c in df.columns]
+        df.to_parquet(_path(ticker, kind, cache_dir))
+
+def last_period_end(financials):
+    try:
+        return pd.Timestamp(max(financials.columns)).date().isoformat()
+    except:
+        return None
+
+def make_entry(previous, hist, financials, fetched, today=None):
+    """
+    Builds the manifest entry after a refresh. `fetched` is the set of payloads
+    actually pulled from the network this run.
+    """
+    today = (today or datetime.date.today()).isoformat()
+    entry = dict(previous or {})
+    entry["last_bar"] = pd.Timestamp(hist.index[-1]).date().isoformat()
+    for kind in ("info", "history", "statements"):
+        if kind in fetched:
+            entry[f"{kind}_fetched"] = today
+    if "statements" in fetched:
+        entry["last_period_end"] = last_period_end(financials)
+    return entry
@@ -0,0 +1,278 @@
+import pandas as pd
+import numpy as np
+import argparse
+import collections
+import datetime
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+import pyarrow.parquet as pq
+import dcf_engine
+import price_store
+import results_store
+import snapshot_store
+import profiling
+
+# Monte Carlo engine: distributions instead of the point estimates of valuation.py / risk.py.
+#   Valuation   N_PATHS scenarios of year-by-year FCF growth and a discount rate around the
+#               dcf_engine assumptions. DCF value is linear in FCF per share, so the scenario
+#               multipliers are simulated once per assumption set and every ticker's distribution
+#               is that one rescaled: P(upside > 0) and the percentiles cost O(log paths) per ticker.
+#   Returns     N_PATHS bootstrapped HORIZON-day paths per ticker, resampled from its own daily log
+#               returns: P(gain), return percentiles and max drawdown percentiles over the horizon.
+#               Paths are generated CHUNK_ELEMENTS values at a time and reduced to summary stats
+#               right away; results stream out TICKER_CHUNK tickers at a time, optionally across
+#               worker processes. Memory does not grow with paths or universe size.
+# Every ticker draws from its own generator (seed, ticker), so results are reproducible and do
+# not depend on chunk sizes, ticker order or the number of workers.
+# Usage:
+#   python monte_carlo.py --paths 10000 --horizon 252 --workers 4
+#   python monte_carlo.py --tickers AAPL,MSFT --seed 7
+# Results go to market_data/results/monte_carlo.parquet (written as the chunks arrive).
+
+N_PATHS = 10_000
+HORIZON = 252 # Trading days simulated per return path
+LOOKBACK_YEARS = 5 # Return history the bootstrap resamples from
+MIN_HISTORY = 60 # Fewer daily returns than this: no return simulation
+PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_ELEMENTS = 1 << 16 # Path steps generated at once: 512 KB buffers stay in cache (~30% faster than 8 MB)
+TICKER_CHUNK = 32 # Tickers per streamed result chunk (and per worker task)
+SEED = 0
+OUTPUT_FILE = "monte_carlo.parquet"
+
+# Spread of the valuation scenarios around dcf_engine.DCF_ASSUMPTIONS
+VALUATION_UNCERTAINTY = {
+    "growth_sd": 0.04,   # Per-year FCF growth
+    "discount_sd": 0.01, # Discount rate (one draw per path)
+    "min_spread": 0.01,  # Discount rate is kept at least this far above terminal growth
+}
+
+def ticker_rng(seed, ticker):
+    return np.random.default_rng([seed, zlib.crc32(str(ticker).encode())])
+
+# --- Valuation ---
+
+def value_multipliers(n_paths=N_PATHS, assumptions=None, uncertainty=None, seed=SEED):
+    """
+    DCF value per unit of current FCF for n_paths scenarios, sorted ascending. Each path draws
+    one FCF growth rate per projection year and one discount rate; terminal growth is fixed.
+    With zero spread every path equals dcf_engine.intrinsic_value(1, 1, ...).
+    """
+    a = {**dcf_engine.DCF_ASSUMPTIONS, **(assumptions or {})}
+    u = {**VALUATION_UNCERTAINTY, **(uncertainty or {})}
+    rng = np.random.default_rng(seed)
+    years, tg = a["years"], a["terminal"]
+    growth = rng.normal(a["growth"], u["growth_sd"], (n_paths, years))
+    r = np.maximum(rng.normal(a["discount"], u["discount_sd"], n_paths), tg + u["min_spread"])
+    fcf_path = np.cumprod(1 + growth, axis=1) # FCF_t / FCF_0
+    discount = (1 + r)[:, None] ** np.arange(1, years + 1)
+    value = (fcf_path / discount).sum(axis=1)
+    value += fcf_path[:, -1] * (1 + tg) / (r - tg) / (1 + r) ** years
+    return np.sort(value)
+
+def valuation_columns(percentiles=PERCENTILES):
+    return ["MC_P_Upside"] + [f"MC_Upside_P{p}" for p in percentiles]
+
+@profiling.profiled()
+def simulate_valuation(df, n_paths=N_PATHS, assumptions=None, sector_assumptions=None, uncertainty=None,
+                       percentiles=PERCENTILES, seed=SEED):
+    """
+    Monte Carlo DCF upside for every row of a frame with FCF, Shares, Price (and Sector).
+    Returns a frame on df's index with valuation_columns(); NaN where FCF, shares or price
+    are not positive. Sectors in the overrides (dcf_engine.SECTOR_ASSUMPTIONS by default)
+    get their own scenario set; all sets share the seed.
+    """
+    overrides = dcf_engine.SECTOR_ASSUMPTIONS if sector_assumptions is None else sector_assumptions
+    out = pd.DataFrame(np.nan, index=df.index, columns=valuation_columns(percentiles))
+    if not {"FCF", "Shares", "Price"}.issubset(df.columns):
+        return out
+    fcf = df["FCF"].to_numpy(dtype=np.float64)
+    shares = df["Shares"].to_numpy(dtype=np.float64)
+    price = df["Price"].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where((fcf > 0) & (shares > 0) & (price > 0), fcf / shares / price, np.nan) # Upside = scale * M - 1
+    sectors = df["Sector"].to_numpy(dtype=object) if "Sector" in df.columns else np.full(len(df), None, dtype=object)
+    groups = np.where(pd.Series(sectors).isin(list(overrides)).to_numpy(), sectors, None)
+
+    values = np.full((len(df), len(out.columns)), np.nan)
+    for group in pd.unique(groups):
+        rows = np.flatnonzero((groups == group) & ~np.isnan(scale))
+        if not len(rows):
+            continue
+        m = value_multipliers(n_paths, {**(assumptions or {}), **overrides.get(group, {})}, uncertainty, seed)
+        k = scale[rows]
+        values[rows, 0] = 1 - np.searchsorted(m, 1 / k, side="right") / n_paths # P(k * M > 1)
+        values[rows, 1:] = k[:, None] * np.percentile(m, percentiles)[None, :] - 1
+    out[:] = values
+    return out
+
+# --- Returns ---
+
+def log_returns(close):
+    """Daily log returns of a close array; missing / non-positive prices are skipped."""
+    close = np.asarray(close, dtype=np.float64)
+    close = close[np.isfinite(close) & (close > 0)]
+    return np.diff(np.log(close))
+
+def simulate_paths(log_rets, n_paths=N_PATHS, horizon=HORIZON, rng=None, chunk_elements=CHUNK_ELEMENTS):
+    """
+    Bootstrapped horizon outcomes for one ticker: (total returns, max drawdowns <= 0), n_paths each.
+    Steps are resampled with replacement from log_rets, chunk_elements at a time.
+    """
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    log_rets = np.asarray(log_rets, dtype=np.float64)
+    per_chunk = max(1, chunk_elements // horizon)
+    total = np.empty(n_paths)
+    drawdown = np.empty(n_paths)
+    for start in range(0, n_paths, per_chunk):
+        n = min(per_chunk, n_paths - start)
+        level = log_rets[rng.integers(0, len(log_rets), size=(n, horizon))]
+        np.cumsum(level, axis=1, out=level) # Log price relative to the start
+        peak = np.maximum(level, 0) # The starting level (0) counts as a peak
+        np.maximum.accumulate(peak, axis=1, out=peak)
+        peak -= level # Log distance below the running peak
+        total[start:start + n] = np.expm1(level[:, -1])
+        drawdown[start:start + n] = np.expm1(-peak.max(axis=1))
+    return total, drawdown
+
+def return_columns(percentiles=PERCENTILES):
+    return (["History_Days", "MC_P_Gain", "MC_Mean_Return"] + [f"MC_Return_P{p}" for p in percentiles]
+            + ["MC_MaxDD_P50", "MC_MaxDD_P95"])
+
+def summarize_paths(total, drawdown, percentiles=PERCENTILES):
+    """Summary stats of one ticker's simulated outcomes (return_columns() minus History_Days)."""
+    row = {"MC_P_Gain": float((total > 0).mean()), "MC_Mean_Return": float(total.mean())}
+    row.update({f"MC_Return_P{p}": v for p, v in zip(percentiles, np.percentile(total, percentiles))})
+    row["MC_MaxDD_P50"] = float(np.median(drawdown))
+    row["MC_MaxDD_P95"] = float(np.percentile(drawdown, 5)) # 1 path in 20 falls at least this far
+    return row
+
+def _simulate_chunk(task):
+    """Worker entry point: summary rows for a chunk of (ticker, log returns)."""
+    items, n_paths, horizon, seed, percentiles, chunk_elements = task
+    rows = []
+    for ticker, log_rets in items:
+        row = {"Ticker": ticker, "History_Days": len(log_rets)}
+        if len(log_rets) >= MIN_HISTORY:
+            total, drawdown = simulate_paths(log_rets, n_paths, horizon, ticker_rng(seed, ticker), chunk_elements)
+            row.update(summarize_paths(total, drawdown, percentiles))
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["Ticker"] + return_columns(percentiles))
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_return_simulations(returns, n_paths=N_PATHS, horizon=HORIZON, seed=SEED, percentiles=PERCENTILES,
+                            ticker_chunk=TICKER_CHUNK, workers=1, chunk_elements=CHUNK_ELEMENTS):
+    """
+    Streams bootstrapped return summaries: yields one DataFrame (Ticker + return_columns())
+    per ticker_chunk tickers, in input order. `returns` is an iterable of (ticker, daily log
+    returns) consumed lazily; with workers > 1 at most 2 x workers chunks are in flight.
+    """
+    tasks = ((chunk, n_paths, horizon, seed, percentiles, chunk_elements) for chunk in _chunks(returns, ticker_chunk))
+    if workers <= 1:
+        for task in tasks:
+            yield _simulate_chunk(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.submit(_simulate_chunk, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def stored_returns(tickers, lookback_years=LOOKBACK_YEARS, end=None, root=price_store.PRICE_DIR):
+    """Lazily yields (ticker, daily log returns over the lookback) from price_store."""
+    end = pd.Timestamp(end or datetime.date.today())
+    start = end - pd.DateOffset(years=lookback_years)
+    for t in tickers:
+        if not price_store.has_ticker(t, root):
+            yield t, np.empty(0)
+            continue
+        _, cols = price_store.window(t, start, end, ("Close",), root)
+        yield t, log_returns(cols["Close"])
+
+def simulate_ticker(data, n_paths=N_PATHS, horizon=HORIZON, seed=SEED):
+    """
+    Both simulations for one get_stock_data dict (the app's Stock Analysis page).
+    Returns {valuation_columns..., return_columns...}; NaN where inputs are missing.
+    """
+    info = data.get("info", {})
+    history = data.get("history")
+    cashflow = data.get("cashflow")
+    fcf = np.nan
+    if cashflow is not None and "Free Cash Flow" in cashflow.index:
+        fcf = cashflow.loc["Free Cash Flow"].iloc[0]
+    price = info.get("currentPrice") or info.get("regularMarketPrice")
+    if not price and history is not None and not history.empty:
+        price = history["Close"].iloc[-1]
+    row = pd.DataFrame({"FCF": [fcf], "Shares": [info.get("sharesOutstanding") or np.nan],
+                        "Price": [price or np.nan], "Sector": [info.get("sector")]})
+    out = simulate_valuation(row, n_paths, seed=seed).iloc[0].to_dict()
+    symbol = data.get("symbol", info.get("symbol", "TICKER"))
+    close = history["Close"].to_numpy() if history is not None and not history.empty else []
+    returns = next(iter_return_simulations([(symbol, log_returns(close)[-252 * LOOKBACK_YEARS:])], n_paths, horizon, seed))
+    out.update(returns.iloc[0].drop("Ticker").to_dict())
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo DCF and bootstrapped return simulation.")
+    parser.add_argument("--paths", type=int, default=N_PATHS)
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="Trading days per return path.")
+    parser.add_argument("--lookback", type=int, default=LOOKBACK_YEARS, help="Years of returns to resample.")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--tickers", help="Comma-separated subset of the snapshot.")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default=os.path.join(results_store.RESULTS_DIR, OUTPUT_FILE))
+    args = parser.parse_args()
+
+    date = snapshot_store.latest_snapshot_date()
+    if date is None:
+        print("No market data found. Please run data_update.py first.")
+        exit()
+    snap = snapshot_store.read_snapshot(date, columns=["Ticker", "Name"] + dcf_engine.INPUT_COLUMNS)
+    if args.tickers:
+        snap = snap[snap["Ticker"].isin([t.strip().upper() for t in args.tickers.split(",")])]
+    snap = snap.set_index("Ticker")
+
+    start = time.perf_counter()
+    valuation = simulate_valuation(snap, args.paths, seed=args.seed)
+    print(f"Valuation: {len(snap)} tickers x {args.paths} scenarios in {time.perf_counter() - start:.2f}s")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    tmp = args.out + ".tmp"
+    writer, done, kept = None, 0, []
+    returns = stored_returns(snap.index, args.lookback, date)
+    for chunk in iter_return_simulations(returns, args.paths, args.horizon, args.seed, workers=args.workers):
+        chunk = chunk.join(snap[["Name", "Sector", "Price"]].join(valuation), on="Ticker")
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp, table.schema)
+        writer.write_table(table)
+        kept.append(chunk.nlargest(args.top, "MC_P_Upside")) # Only a few rows per chunk stay in memory
+        done += len(chunk)
+        print(f"\r  Returns: {done}/{len(snap)} tickers ({time.perf_counter() - start:.1f}s)", end="", flush=True)
+    if writer is None:
+        print("No tickers to simulate.")
+        exit()
+    writer.close()
+    os.replace(tmp, args.out)
+    elapsed = time.perf_counter() - start
+    print(f"\n{done} tickers x {args.paths} paths x {args.horizon} days in {elapsed:.1f}s. Saved to {args.out}")
+
+    top = pd.concat(kept).nlargest(args.top, "MC_P_Upside")
+    pd.set_option("display.width", 160)
+    print(top[["Ticker", "Price", "MC_P_Upside", "MC_Upside_P5", "MC_Upside_P50", "MC_Upside_P95",
+               "MC_P_Gain", "MC_Return_P5", "MC_Return_P50", "MC_MaxDD_P95"]].round(3).to_string(index=False))
@@ -0,0 +1,224 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import profiling
+
+# Persistent per-ticker OHLCV store with a contiguous columnar layout:
+#   market_data/prices/AAPL/Date.i64    (int64 days since epoch, ascending)
+#   market_data/prices/AAPL/Close.f64   (float64, one value per date) ... Open/High/Low/Volume
+#   market_data/prices/AAPL/meta.json   ({"tz": "America/New_York", "full_history": true})
+# Files are raw little-endian arrays, appended in place and memory-mapped on read,
+# so slicing a window touches only the pages it needs and never copies the full series.
+# The Date file is written last on append: its length is the committed row count.
+
+PRICE_DIR = os.path.join("market_data", "prices")
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+DATE_FIELD = "Date"
+META_FILE = "meta.json"
+
+def _file(ticker, field, root=PRICE_DIR):
+    ext = "i64" if field == DATE_FIELD else "f64"
+    return os.path.join(root, ticker, f"{field}.{ext}")
+
+def _memmap(path, dtype, n=None):
+    """Read-only memmap of the first n values (all if None). Empty arrays can't be mapped."""
+    if not os.path.exists(path):
+        return np.empty(0, dtype=dtype)
+    size = os.path.getsize(path) // np.dtype(dtype).itemsize
+    n = size if n is None else min(n, size)
+    if n == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+
+def load_meta(ticker, root=PRICE_DIR):
+    path = os.path.join(root, ticker, META_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+def _save_meta(ticker, meta, root=PRICE_DIR):
+    with open(os.path.join(root, ticker, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+def has_ticker(ticker, root=PRICE_DIR):
+    return length(ticker, root) > 0
+
+def list_tickers(root=PRICE_DIR):
+    if not os.path.exists(root):
+        return []
+    return sorted(t for t in os.listdir(root) if os.path.exists(_file(t, DATE_FIELD, root)))
+
+def length(ticker, root=PRICE_DIR):
+    path = _file(ticker, DATE_FIELD, root)
+    return os.path.getsize(path) // 8 if os.path.exists(path) else 0
+
+def dates(ticker, root=PRICE_DIR):
+    """Zero-copy datetime64[D] view of the stored dates."""
+    return _memmap(_file(ticker, DATE_FIELD, root), np.int64).view("datetime64[D]")
+
+def last_date(ticker, root=PRICE_DIR):
+    """Last stored bar as a (tz-aware if known) Timestamp, or None."""
+    d = dates(ticker, root)
+    if len(d) == 0:
+        return None
+    ts = pd.Timestamp(d[-1])
+    tz = load_meta(ticker, root).get("tz")
+    return ts.tz_localize(tz) if tz else ts
+
+def _to_days(index):
+    idx = pd.DatetimeIndex(index)
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    return idx.normalize().values.astype("datetime64[D]").astype(np.int64)
+
+def append(ticker, hist, full_history=None, root=PRICE_DIR):
+    """
+    Appends bars to the store. Stored rows on/after the first new date are
+    replaced (a previously stored bar may have been partial), everything older is kept.
+    full_history=True marks the series as complete back to listing (period="max");
+    None leaves the flag untouched (delta appends).
+    Returns the number of rows now stored.
+    """
+    if hist is None or hist.empty:
+        return length(ticker, root)
+    os.makedirs(os.path.join(root, ticker), exist_ok=True)
+
+    new_days = _to_days(hist.index)
+    keep_new = np.r_[True, np.diff(new_days) > 0] # Drop duplicate / out-of-order bars
+    new_days = new_days[keep_new]
+
+    n = length(ticker, root)
+    if n:
+        existing = _memmap(_file(ticker, DATE_FIELD, root), np.int64, n)
+        n = int(np.searchsorted(existing, new_days[0], side="left"))
+        del existing # Release the map before truncating (required on Windows)
+
+    # Truncate every column to the committed/kept row count, then append
+    for field in FIELDS + (DATE_FIELD,):
+        path = _file(ticker, field, root)
+        if os.path.exists(path):
+            os.truncate(path, n * 8)
+    for field in FIELDS:
+        values = hist[field].to_numpy(dtype=np.float64)[keep_new] if field in hist.columns \
+            else np.full(len(new_days), np.nan)
+        with open(_file(ticker, field, root), "ab") as f:
+            f.write(values.astype("<f8").tobytes())
+    with open(_file(ticker, DATE_FIELD, root), "ab") as f:
+        f.write(new_days.astype("<i8").tobytes())
+
+    meta = load_meta(ticker, root)
+    tz = pd.DatetimeIndex(hist.index).tz
+    meta["tz"] = str(tz) if tz is not None else None
+    if full_history is not None:
+        meta["full_history"] = bool(full_history)
+    _save_meta(ticker, meta, root)
+    return n + len(new_days)
+
+def write(ticker, hist, full_history=False, root=PRICE_DIR):
+    """Replaces the stored series entirely."""
+    for field in FIELDS + (DATE_FIELD,):
+        path = _file(ticker, field, root)
+        if os.path.exists(path):
+            os.remove(path)
+    meta_path = os.path.join(root, ticker, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    return append(ticker, hist, full_history=full_history, root=root)
+
+# Relative Close difference on the overlapping bar that means the provider re-adjusted the history
+ADJUST_TOLERANCE = 1e-4
+EVENT_COLUMNS = ("Stock Splits", "Dividends")
+
+def _check_index(n):
+    """Row of the last complete stored bar: the last one may have been stored partial."""
+    return n - 2 if n > 1 else n - 1
+
+def overlap_start(ticker, root=PRICE_DIR):
+    """
+    Start date for a delta fetch, as a (tz-aware if known) Timestamp, or None.
+    Overlaps the last complete stored bar so needs_rewrite() can compare it.
+    """
+    d = dates(ticker, root)
+    if len(d) == 0:
+        return None
+    ts = pd.Timestamp(d[_check_index(len(d))])
+    tz = load_meta(ticker, root).get("tz")
+    return ts.tz_localize(tz) if tz else ts
+
+def needs_rewrite(ticker, delta, root=PRICE_DIR):
+    """
+    True when a delta fetched from overlap_start() no longer lines up with the store:
+    yfinance returns split/dividend-adjusted prices, so after a corporate action every
+    stored bar is stale and appending would splice adjusted bars onto unadjusted ones.
+    Detected by a split/dividend in the new bars or a moved Close on the overlapping bar.
+    """
+    if delta is None or delta.empty:
+        return False
+    n = length(ticker, root)
+    if n == 0:
+        return False
+    i = _check_index(n)
+    check_day = _memmap(_file(ticker, DATE_FIELD, root), np.int64, n)[i]
+    new_days = _to_days(delta.index)
+
+    after = new_days > check_day
+    for col in EVENT_COLUMNS:
+        if col in delta.columns and (delta[col].to_numpy(dtype=np.float64)[after] != 0).any():
+            return True
+
+    hit = np.flatnonzero(new_days == check_day)
+    if len(hit) == 0: # Nothing to verify against
+        return True
+    stored = _memmap(_file(ticker, "Close", root), np.float64, n)[i]
+    fresh = float(delta["Close"].iloc[hit[0]])
+    return not np.isclose(fresh, stored, rtol=ADJUST_TOLERANCE, atol=0, equal_nan=True)
+
+def refresh(ticker, delta, refetch, root=PRICE_DIR):
+    """
+    Stores a delta fetched from overlap_start(). When needs_rewrite() flags it, the series
+    is replaced with refetch(start) instead: start is None for full-history series
+    (period="max"), else the first stored date. A failed re-fetch leaves the store as is.
+    Returns (rows stored, rewritten).
+    """
+    if not needs_rewrite(ticker, delta, root):
+        return append(ticker, delta, root=root), False
+    full_history = bool(load_meta(ticker, root).get("full_history"))
+    start = None if full_history else pd.Timestamp(dates(ticker, root)[0])
+    hist = refetch(start)
+    if hist is None or hist.empty:
+        return length(ticker, root), False
+    return write(ticker, hist, full_history=full_history, root=root), True
+
+def _bounds(d, start, end):
+    lo = 0 if start is None else int(np.searchsorted(d, np.datetime64(pd.Timestamp(start).date(), "D"), side="left"))
+    hi = len(d) if end is None else int(np.searchsorted(d, np.datetime64(pd.Timestamp(end).date(), "D"), side="right"))
+    return lo, hi
+
+def window(ticker, start=None, end=None, fields=FIELDS, root=PRICE_DIR):
+    """
+    Zero-copy slice: returns (dates, {field: array}) as memmap views for [start, end].
+    Use for vectorized math; call load() when a DataFrame is needed.
+    """
+    n = length(ticker, root)
+    d = _memmap(_file(ticker, DATE_FIELD, root), np.int64, n).view("datetime64[D]")
+    lo, hi = _bounds(d, start, end)
+    cols = {f: _memmap(_file(ticker, f, root), np.float64, n)[lo:hi] for f in fields}
+    profiling.count("bytes_read", (hi - lo) * 8 * (len(fields) + 1)) # Pages the window touches
+    return d[lo:hi], cols
+
+def load(ticker, start=None, end=None, fields=FIELDS, root=PRICE_DIR):
+    """
+    History frame in the yfinance layout (DatetimeIndex named Date, OHLCV columns)
+    for [start, end]. Only the requested window is copied out of the map.
+    Returns None if the ticker is not stored.
+    """
+    if not has_ticker(ticker, root):
+        return None
+    d, cols = window(ticker, start, end, fields, root)
+    index = pd.DatetimeIndex(d.astype("datetime64[ns]"), name="Date")
+    tz = load_meta(ticker, root).get("tz")
+    if tz:
+        index = index.tz_localize(tz)
+    return pd.DataFrame({f: np.array(v) for f, v in cols.items()}, index=index)
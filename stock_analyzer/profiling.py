@@ -0,0 +1,248 @@
+import argparse
+import atexit
+import csv
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Opt-in pipeline instrumentation: stage timers, row counts, peak memory and counters.
+# Off by default (every hook is a cheap no-op). Enable with:
+#   STOCK_PROFILE=1 python scanner_pro.py                 timers + row counts + counters
+#   STOCK_PROFILE=memory python scanner_pro.py            ... + per-stage peak memory (tracemalloc)
+#   STOCK_PROFILE=1 python -m streamlit run app.py
+# On exit a run report is written to profiles/ (or $STOCK_PROFILE_DIR) as
+#   {script}_{timestamp}.json  - metadata, per-stage stats, counters
+#   {script}_{timestamp}.csv   - the same stages/counters as flat rows
+# Compare two runs with: python profiling.py old.json new.json
+#
+# Stages nest: a stage entered inside another is reported as "outer/inner".
+# Identical paths are aggregated (calls, total seconds, summed rows, max peak).
+# Peak memory comes from tracemalloc (Python allocations, incl. numpy/pandas buffers);
+# it is process-wide, so stages running on worker threads share one peak. Tracing slows
+# allocation-heavy code several times over, so it is a separate level: compare timings
+# from runs without it.
+
+PROFILE_ENV = "STOCK_PROFILE"
+PROFILE_DIR_ENV = "STOCK_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = "profiles"
+
+_enabled = False
+_memory = False
+_lock = threading.Lock()
+_local = threading.local()
+_stages = {} # path -> aggregated stats
+_counters = {}
+_started = None
+
+def enabled():
+    return _enabled
+
+def enable(memory=False, write_at_exit=True):
+    """Turns instrumentation on for this process (idempotent). memory=True adds tracemalloc peaks."""
+    global _enabled, _memory, _started
+    if memory and not _memory:
+        _memory = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    if _enabled:
+        return
+    _enabled = True
+    _started = datetime.datetime.now()
+    if write_at_exit:
+        atexit.register(write_report)
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _record(path, seconds, cpu_seconds, rows, peak_bytes, net_bytes):
+    with _lock:
+        s = _stages.setdefault(path, {"calls": 0, "seconds": 0.0, "cpu_seconds": 0.0, "rows": None,
+                                      "peak_mb": None, "net_mb": None})
+        s["calls"] += 1
+        s["seconds"] += seconds
+        s["cpu_seconds"] += cpu_seconds
+        if rows is not None:
+            s["rows"] = (s["rows"] or 0) + int(rows)
+        if peak_bytes is not None:
+            s["peak_mb"] = max(s["peak_mb"] or 0.0, peak_bytes / 1e6)
+            s["net_mb"] = (s["net_mb"] or 0.0) + net_bytes / 1e6
+
+class stage:
+    """
+    Context manager timing one pipeline stage. Set .rows inside the block to record
+    how many rows the stage produced:
+        with profiling.stage("normalize_metrics") as s:
+            df = normalize_metrics(df)
+            s.rows = len(df)
+    """
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.child_peak = 0
+
+    def __enter__(self):
+        if not _enabled:
+            return self
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        self.path = f"{self.parent.path}/{self.name}" if self.parent else self.name
+        if _memory:
+            if self.parent is not None:
+                # reset_peak below would otherwise lose the parent's peak so far
+                self.parent.child_peak = max(self.parent.child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.start_mem = tracemalloc.get_traced_memory()[0]
+        self.t0 = time.perf_counter()
+        self.c0 = time.process_time()
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not _enabled or not hasattr(self, "t0"):
+            return False
+        seconds = time.perf_counter() - self.t0
+        cpu_seconds = time.process_time() - self.c0
+        peak = net = None
+        if _memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+            net = current - self.start_mem
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        _record(self.path, seconds, cpu_seconds, self.rows, peak, net)
+        return False
+
+def begin(name):
+    """
+    Starts a top-level stage without a with-block (e.g. around a whole Streamlit page,
+    whose script may st.stop()/st.rerun() before reaching end()). Any stage left open
+    on this thread by an interrupted previous run is discarded first.
+    """
+    if not _enabled:
+        return None
+    _stack().clear()
+    return stage(name).__enter__()
+
+def end(token, rows=None):
+    if token is not None:
+        if rows is not None:
+            token.rows = rows
+        token.__exit__(None, None, None)
+
+def _row_count(result):
+    if hasattr(result, "columns") and hasattr(result, "__len__"):
+        return len(result)
+    return None
+
+def profiled(name=None):
+    """Decorator form of stage(); DataFrame results record their row count."""
+    def deco(fn):
+        label = name or fn.__name__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with stage(label) as s:
+                result = fn(*args, **kwargs)
+                s.rows = _row_count(result)
+                return result
+        return wrapper
+    return deco
+
+def count(name, n=1):
+    """Adds n to a named counter (network_calls, bytes_read, ...). Thread-safe."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def count_file_read(path):
+    """Counts one file read and its on-disk size under files_read / bytes_read."""
+    if not _enabled:
+        return
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    count("files_read")
+    count("bytes_read", size)
+
+def report():
+    with _lock:
+        stages = [{"stage": path, **{k: (round(v, 6) if isinstance(v, float) else v) for k, v in s.items()}}
+                  for path, s in _stages.items()]
+        counters = dict(_counters)
+    return {
+        "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python",
+        "argv": sys.argv[1:],
+        "started": _started.isoformat() if _started else None,
+        "finished": datetime.datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "stages": stages,
+        "counters": counters,
+    }
+
+def write_report(directory=None, tag=None):
+    """Writes the JSON + CSV run report. Returns the JSON path (None if nothing was recorded)."""
+    rep = report()
+    if not rep["stages"] and not rep["counters"]:
+        return None
+    directory = directory or os.environ.get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    base = f"{tag or os.path.splitext(rep['script'])[0]}_{datetime.datetime.now():%Y%m%d_%H%M%S}"
+    json_path = os.path.join(directory, base + ".json")
+    with open(json_path, "w") as f:
+        json.dump(rep, f, indent=1)
+    fields = ["kind", "name", "calls", "seconds", "cpu_seconds", "rows", "peak_mb", "net_mb", "value"]
+    with open(os.path.join(directory, base + ".csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for s in rep["stages"]:
+            writer.writerow({"kind": "stage", "name": s["stage"], **{k: s[k] for k in fields[2:-1]}})
+        for name, value in rep["counters"].items():
+            writer.writerow({"kind": "counter", "name": name, "value": value})
+    print(f"Profile report written: {json_path}")
+    return json_path
+
+def diff_reports(old, new):
+    """Rows of (stage, old_seconds, new_seconds, change) for two report dicts."""
+    a = {s["stage"]: s["seconds"] for s in old["stages"]}
+    b = {s["stage"]: s["seconds"] for s in new["stages"]}
+    rows = []
+    for name in list(a) + [n for n in b if n not in a]:
+        sa, sb = a.get(name), b.get(name)
+        change = f"{(sb - sa) / sa:+.1%}" if sa and sb is not None else "n/a"
+        rows.append((name, sa, sb, change))
+    return rows
+
+if os.environ.get(PROFILE_ENV, "") not in ("", "0"):
+    enable(memory=os.environ[PROFILE_ENV].lower() == "memory")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two profiling run reports.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    with open(args.old) as f: old = json.load(f)
+    with open(args.new) as f: new = json.load(f)
+    print(f"{'stage':<50} {'old s':>10} {'new s':>10} {'change':>9}")
+    for name, sa, sb, change in diff_reports(old, new):
+        fmt = lambda v: f"{v:10.4f}" if v is not None else f"{'-':>10}"
+        print(f"{name:<50} {fmt(sa)} {fmt(sb)} {change:>9}")
+    for key in sorted(set(old["counters"]) | set(new["counters"])):
+        print(f"{'counter: ' + key:<50} {old['counters'].get(key, '-'):>10} {new['counters'].get(key, '-'):>10}")
@@ -0,0 +1,361 @@
+import pandas as pd
+import json
+import os
+import random
+import threading
+import time
+import zlib
+import profiling
+
+# Pluggable market data providers. Every fetch path (data_fetcher, data_update,
+# stock_picker_daily, the app) goes through one, so it can run offline.
+# A provider exposes:
+#   ticker(symbol) -> yf.Ticker-shaped handle (info, history(...), financials, balance_sheet, cashflow)
+#   universe()     -> tickers_df (Ticker, Sector, Security), like the S&P 500 list
+#   universe_changes() (optional) -> dated additions/removals (Date, Ticker, Action, Security)
+# Implementations:
+#   YFinanceProvider   live Yahoo Finance + Wikipedia universe (default)
+#   RecordingProvider  wraps another provider and saves every payload it returns
+#   ReplayProvider     serves a recording from local files, no network, optional simulated latency
+#   synthetic_market.SyntheticProvider  generated data for benchmarks
+# Pick one with the STOCK_PROVIDER environment variable (see get_provider):
+#   STOCK_PROVIDER=record:recordings/2026-01-08 python data_update.py
+#   STOCK_PROVIDER=replay:recordings/2026-01-08 python data_update.py
+
+PROVIDER_ENV = "STOCK_PROVIDER"
+DEFAULT_PROVIDER = "yfinance"
+SP500_WIKI_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+
+# Recording layout:
+#   {root}/universe.parquet
+#   {root}/{SYMBOL}/info.json
+#   {root}/{SYMBOL}/history_1d.parquet    (one file per interval; bars merged across calls)
+#   {root}/{SYMBOL}/financials.parquet ... balance_sheet / cashflow
+UNIVERSE_FILE = "universe.parquet"
+STATEMENTS = ("financials", "balance_sheet", "cashflow")
+
+def _sp500_page():
+    # Wikipedia blocks generic python requests, so we need a User-Agent
+    import requests
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    }
+    response = requests.get(SP500_WIKI_URL, headers=headers)
+    response.raise_for_status()
+    return response.content
+
+class YFinanceProvider:
+    name = "yfinance"
+
+    def ticker(self, symbol):
+        import yfinance as yf # Only paid for when the live provider is used
+        return yf.Ticker(symbol)
+
+    def universe(self):
+        """Fetches identifying info for S&P 500 companies from Wikipedia."""
+        print("Fetching S&P 500 universe...")
+        try:
+            tables = pd.read_html(pd.io.common.BytesIO(_sp500_page()))
+            df = tables[0]
+            # Rename Symbol to Ticker and GICS Sector to Sector
+            df = df.rename(columns={"Symbol": "Ticker", "GICS Sector": "Sector"})
+            return df[["Ticker", "Sector", "Security"]]
+        except Exception as e:
+            print(f"Error fetching S&P 500 list: {e}")
+            return pd.DataFrame()
+
+    def universe_changes(self):
+        """Dated S&P 500 additions/removals (Date, Ticker, Action, Security) from the same Wikipedia page."""
+        try:
+            table = pd.read_html(pd.io.common.BytesIO(_sp500_page()), match="Effective Date")[0]
+            return parse_sp500_changes(table)
+        except Exception as e:
+            print(f"Error fetching S&P 500 changes: {e}")
+            return pd.DataFrame()
+
+def parse_sp500_changes(table):
+    """Wikipedia's "Selected changes" table (Effective Date, Added/Removed Ticker + Security) -> long rows."""
+    # Two header rows ("Added", "Ticker"); flatten to "Added Ticker", "Effective Date"
+    table = table.copy()
+    table.columns = [" ".join(dict.fromkeys(str(x) for x in c)) if isinstance(c, tuple) else str(c)
+                     for c in table.columns]
+    date_col = next(c for c in table.columns if c.startswith("Effective Date") or c == "Date")
+    rows = []
+    for side, action in (("Added", "add"), ("Removed", "remove")):
+        part = pd.DataFrame({"Date": table[date_col], "Ticker": table.get(f"{side} Ticker"),
+                             "Action": action, "Security": table.get(f"{side} Security")})
+        rows.append(part[part["Ticker"].notna()])
+    return pd.concat(rows, ignore_index=True)
+
+# --- Recording / replay file helpers ---
+
+def _symbol_dir(root, symbol):
+    return os.path.join(root, symbol)
+
+def _history_path(root, symbol, interval):
+    return os.path.join(_symbol_dir(root, symbol), f"history_{interval}.parquet")
+
+def _write_parquet(df, path):
+    """tmp + rename, so a replay never reads a half-written recording."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_parquet(tmp)
+    os.replace(tmp, path)
+
+def _save_statement(df, path):
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns] # Parquet needs string column names
+    _write_parquet(df, path)
+
+def _load_statement(path):
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    df = pd.read_parquet(path)
+    df.columns = pd.to_datetime(df.columns)
+    return df
+
+def _slice_history(hist, period=None, start=None, end=None):
+    """
+    Applies yfinance-style window arguments to a recorded history, relative to the
+    last recorded bar (not today) so a replay is the same on any day.
+    "Nd" = last N sessions, "Nwk"/"Nmo"/"Ny" = calendar offsets, "ytd", "max".
+    """
+    if hist.empty:
+        return hist
+    tz = hist.index.tz
+    def _ts(x):
+        ts = pd.Timestamp(x)
+        return ts.tz_localize(tz) if tz is not None and ts.tz is None else ts
+    if start is not None:
+        hist = hist[hist.index >= _ts(start)]
+    if end is not None:
+        hist = hist[hist.index < _ts(end)]
+    if start is not None or end is not None or period in (None, "max"):
+        return hist
+
+    last = hist.index[-1]
+    if period == "ytd":
+        return hist[hist.index.year == last.year]
+    if period.endswith("d"):
+        sessions = hist.index.normalize().unique()[-int(period[:-1]):]
+        return hist[hist.index.normalize().isin(sessions)]
+    for suffix, unit in (("wk", "weeks"), ("mo", "months"), ("y", "years")):
+        if period.endswith(suffix):
+            cutoff = last - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+            return hist[hist.index > cutoff]
+    raise ValueError(f"Unsupported period: {period}")
+
+class RecordingTicker:
+    """Passes every call through to the wrapped handle and records the payload."""
+    def __init__(self, inner, symbol, root, lock):
+        self._inner = inner
+        self.symbol = symbol
+        self._root = root
+        self._lock = lock
+
+    @property
+    def info(self):
+        info = self._inner.info
+        path = os.path.join(_symbol_dir(self._root, self.symbol), "info.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(info, f, default=str)
+        return info
+
+    def history(self, period="1mo", interval="1d", start=None, end=None, **kwargs):
+        # Only forward window arguments that were given (duck-typed handles may not take `end`)
+        kwargs.update({k: v for k, v in (("start", start), ("end", end)) if v is not None})
+        hist = self._inner.history(period=period, interval=interval, **kwargs)
+        if hist is not None and not hist.empty:
+            path = _history_path(self._root, self.symbol, interval)
+            with self._lock: # Same symbol can be recorded from several threads (app + refresh)
+                if os.path.exists(path):
+                    # Union with earlier recordings; the newest fetch wins on overlap
+                    merged = pd.concat([pd.read_parquet(path), hist])
+                    merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+                else:
+                    merged = hist
+                _write_parquet(merged, path)
+        return hist
+
+    def _statement(self, kind):
+        df = getattr(self._inner, kind)
+        if df is not None:
+            _save_statement(df, os.path.join(_symbol_dir(self._root, self.symbol), f"{kind}.parquet"))
+        return df
+
+    @property
+    def financials(self):
+        return self._statement("financials")
+
+    @property
+    def balance_sheet(self):
+        return self._statement("balance_sheet")
+
+    @property
+    def cashflow(self):
+        return self._statement("cashflow")
+
+class RecordingProvider:
+    """Wraps another provider (yfinance by default) and saves everything it serves under `root`."""
+    def __init__(self, root, inner=None):
+        self.root = root
+        self.inner = inner or YFinanceProvider()
+        self.name = f"record:{root}"
+        self._lock = threading.Lock()
+
+    def ticker(self, symbol):
+        return RecordingTicker(self.inner.ticker(symbol), symbol, self.root, self._lock)
+
+    def universe(self):
+        df = self.inner.universe()
+        if not df.empty:
+            _write_parquet(df, os.path.join(self.root, UNIVERSE_FILE))
+        return df
+
+    def universe_changes(self):
+        if not hasattr(self.inner, "universe_changes"):
+            return pd.DataFrame()
+        return self.inner.universe_changes()
+
+class ReplayTicker:
+    """
+    Serves one symbol's recording. Every access sleeps `latency` (+/- jitter) seconds
+    to stand in for the network. Payloads that were never recorded come back the way
+    yfinance reports an unknown symbol: {} / empty frames.
+    """
+    def __init__(self, symbol, root, latency=0.0, jitter=0.0, rng=None):
+        self.symbol = symbol
+        self._root = root
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+
+    def _call(self, fn):
+        if self.latency:
+            time.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        return fn()
+
+    def _read_info(self):
+        path = os.path.join(_symbol_dir(self._root, self.symbol), "info.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+
+    @property
+    def info(self):
+        return self._call(self._read_info)
+
+    def history(self, period="1mo", interval="1d", start=None, end=None, **kwargs):
+        def read():
+            path = _history_path(self._root, self.symbol, interval)
+            if not os.path.exists(path):
+                return pd.DataFrame()
+            return _slice_history(pd.read_parquet(path), period, start, end)
+        return self._call(read)
+
+    def _statement(self, kind):
+        return self._call(lambda: _load_statement(os.path.join(_symbol_dir(self._root, self.symbol), f"{kind}.parquet")))
+
+    @property
+    def financials(self):
+        return self._statement("financials")
+
+    @property
+    def balance_sheet(self):
+        return self._statement("balance_sheet")
+
+    @property
+    def cashflow(self):
+        return self._statement("cashflow")
+
+class ReplayProvider:
+    """Deterministic offline provider over a directory written by RecordingProvider."""
+    def __init__(self, root, latency=0.0, jitter=0.0, seed=None):
+        if not os.path.isdir(root):
+            raise FileNotFoundError(f"No recording found at {root}")
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.name = f"replay:{root}"
+
+    def ticker(self, symbol):
+        # Per-symbol RNG so simulated latency is reproducible per seed (as in synthetic_market)
+        rng = random.Random(None if self.seed is None else (zlib.crc32(symbol.encode()) + self.seed) % (2 ** 32))
+        return ReplayTicker(symbol, self.root, self.latency, self.jitter, rng)
+
+    def universe(self):
+        path = os.path.join(self.root, UNIVERSE_FILE)
+        if not os.path.exists(path):
+            # Fall back to every recorded symbol
+            symbols = sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+            return pd.DataFrame({"Ticker": symbols, "Sector": None, "Security": symbols})
+        return pd.read_parquet(path)
+
+class CountingTicker:
+    """Profiling wrapper: each payload access (info, history, statements) counts as one network call."""
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __getattr__(self, name):
+        if name in ("info",) + STATEMENTS:
+            profiling.count("network_calls")
+        return getattr(self._inner, name)
+
+    def history(self, *args, **kwargs):
+        profiling.count("network_calls")
+        return self._inner.history(*args, **kwargs)
+
+class ProfiledProvider:
+    """Wraps a provider so every call through it is counted (only used when profiling is enabled)."""
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+
+    def ticker(self, symbol):
+        return CountingTicker(self.inner.ticker(symbol))
+
+    def universe(self):
+        profiling.count("network_calls")
+        return self.inner.universe()
+
+    def universe_changes(self):
+        if not hasattr(self.inner, "universe_changes"):
+            return pd.DataFrame()
+        profiling.count("network_calls")
+        return self.inner.universe_changes()
+
+_PROVIDERS = {}
+_PROVIDERS_LOCK = threading.Lock()
+
+def make_provider(spec):
+    """
+    Builds a provider from a spec string:
+      yfinance | record:<dir> | replay:<dir>[?latency=0.05&jitter=0.01&seed=1] | synthetic[:<n>]
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "yfinance":
+        return YFinanceProvider()
+    if kind == "record":
+        return RecordingProvider(arg or "recordings")
+    if kind == "replay":
+        root, _, query = arg.partition("?")
+        opts = dict(p.split("=", 1) for p in query.split("&") if p)
+        return ReplayProvider(root or "recordings", latency=float(opts.get("latency", 0)),
+                              jitter=float(opts.get("jitter", 0)),
+                              seed=int(opts["seed"]) if "seed" in opts else None)
+    if kind == "synthetic":
+        import synthetic_market
+        return synthetic_market.SyntheticProvider(n=int(arg) if arg else 500)
+    raise ValueError(f"Unknown data provider: {spec}")
+
+def get_provider(spec=None):
+    """Process-wide provider for `spec` (default: $STOCK_PROVIDER, else yfinance)."""
+    spec = spec or os.environ.get(PROVIDER_ENV) or DEFAULT_PROVIDER
+    with _PROVIDERS_LOCK:
+        if spec not in _PROVIDERS:
+            provider = make_provider(spec)
+            _PROVIDERS[spec] = ProfiledProvider(provider) if profiling.enabled() else provider
+        return _PROVIDERS[spec]
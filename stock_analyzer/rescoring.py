@@ -0,0 +1,120 @@
+import pandas as pd
+import numpy as np
+import argparse
+import itertools
+import json
+import os
+import time
+import scanner_pro
+
+# What-if rescoring over the normalized Score_* columns cached by the last scan.
+# A scenario is {"name": str, "weights": {layer: w}, "filters": {HARD_FILTERS key: value}};
+# layers left out keep scanner_pro.LAYER_WEIGHTS. All scenarios are scored with one
+# (tickers x components) @ (components x scenarios) matrix multiply.
+#
+# Note: percentile ranks were computed over the universe that passed the scan's
+# hard filters, so scenario filters can only tighten that set, not widen it.
+
+SCORE_CACHE_FILE = scanner_pro.SCORE_CACHE_FILE # Written by scanner_pro.build_score_cache
+CACHE_INFO_COLUMNS = scanner_pro.SCORE_CACHE_INFO_COLUMNS
+
+def load_score_cache(path=SCORE_CACHE_FILE):
+    if not os.path.exists(path):
+        print(f"No score cache found at {path}. Please run scanner_pro.py first.")
+        return pd.DataFrame()
+    cache = pd.read_parquet(path)
+    for c in scanner_pro.COMPONENT_COLUMNS:
+        if c not in cache.columns:
+            cache[c] = 50.0 # Cache written before this component existed (Neutral)
+    return cache
+
+def weight_matrix(scenarios):
+    """(components x scenarios) coefficients: layer weight x component weight within the layer."""
+    W = np.zeros((len(scanner_pro.COMPONENT_COLUMNS), len(scenarios)))
+    row = {c: i for i, c in enumerate(scanner_pro.COMPONENT_COLUMNS)}
+    for j, sc in enumerate(scenarios):
+        weights = {**scanner_pro.LAYER_WEIGHTS, **sc.get("weights", {})}
+        for layer, comps in scanner_pro.LAYER_COMPONENTS.items():
+            for col, w in comps.items():
+                W[row[col], j] = weights[layer] * w
+    return W
+
+def rescore(cache, scenarios, top_n=10):
+    """
+    Scores every scenario at once and returns the top-N of each as a long frame:
+    Scenario, Rank, Ticker, Name, Sector, TotalScore.
+    """
+    if cache.empty or not scenarios:
+        return pd.DataFrame(columns=["Scenario", "Rank", "Ticker", "Name", "Sector", "TotalScore"])
+    X = cache[scanner_pro.COMPONENT_COLUMNS].to_numpy(dtype=np.float64)
+    scores = X @ weight_matrix(scenarios) # (tickers x scenarios)
+
+    # Filter masks only need computing once per distinct threshold set
+    masks = {}
+    for j, sc in enumerate(scenarios):
+        key = json.dumps(sc.get("filters", {}), sort_keys=True)
+        if key not in masks:
+            masks[key] = scanner_pro.hard_filter_mask(cache, sc.get("filters")).to_numpy()
+        scores[~masks[key], j] = -np.inf
+
+    k = min(top_n, len(cache))
+    top = np.argpartition(-scores, k - 1, axis=0)[:k] # Unordered top-k per column
+    order = np.argsort(-np.take_along_axis(scores, top, axis=0), axis=0, kind="stable")
+    top = np.take_along_axis(top, order, axis=0)
+    top_scores = np.take_along_axis(scores, top, axis=0)
+
+    names = [sc.get("name", f"scenario_{j}") for j, sc in enumerate(scenarios)]
+    out = pd.DataFrame({
+        "Scenario": np.repeat(names, k),
+        "Rank": np.tile(np.arange(1, k + 1), len(scenarios)),
+        "Row": top.T.ravel(),
+        "TotalScore": top_scores.T.ravel(),
+    })
+    out = out[np.isfinite(out["TotalScore"])] # Fewer than N names passed that scenario's filters
+    info = cache[CACHE_INFO_COLUMNS].iloc[out["Row"]].reset_index(drop=True)
+    out = pd.concat([out.drop(columns="Row").reset_index(drop=True), info], axis=1)
+    return out[["Scenario", "Rank", "Ticker", "Name", "Sector", "TotalScore"]]
+
+def weight_grid(step=0.1):
+    """Every layer-weight vector on a `step` grid that sums to 1 (step 0.1 -> 1001 scenarios)."""
+    layers = list(scanner_pro.LAYER_WEIGHTS)
+    units = int(round(1 / step))
+    scenarios = []
+    for combo in itertools.product(range(units + 1), repeat=len(layers) - 1):
+        rest = units - sum(combo)
+        if rest < 0:
+            continue
+        w = dict(zip(layers, [c * step for c in combo] + [rest * step]))
+        name = "/".join(f"{layer[0]}{v:.2f}" for layer, v in w.items())
+        scenarios.append({"name": name, "weights": w})
+    return scenarios
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore the last scan under alternative weights / filters.")
+    parser.add_argument("scenarios", nargs="?", help="JSON file with a list of scenarios.")
+    parser.add_argument("--grid", type=float, default=None, help="Also add every layer-weight combo on this step.")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default=None, help="Write all results to CSV.")
+    args = parser.parse_args()
+
+    cache = load_score_cache()
+    if cache.empty: exit()
+
+    scenarios = [{"name": "default"}]
+    if args.scenarios:
+        with open(args.scenarios, "r") as f:
+            scenarios += json.load(f)
+    if args.grid:
+        scenarios += weight_grid(args.grid)
+
+    start = time.perf_counter()
+    results = rescore(cache, scenarios, top_n=args.top)
+    elapsed = time.perf_counter() - start
+    print(f"Rescored {len(cache)} tickers under {len(scenarios)} scenarios in {elapsed * 1000:.1f} ms.")
+
+    if args.out:
+        results.to_csv(args.out, index=False)
+        print(f"Saved results to {args.out}")
+    else:
+        for name, group in itertools.islice(results.groupby("Scenario", sort=False), 20):
+            print(f"\n[{name}] " + ", ".join(group["Ticker"]))
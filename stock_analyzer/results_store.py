@@ -0,0 +1,77 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import datetime
+import os
+import profiling
+
+# Scanner output handed to the app (and any other reader) as one parquet file:
+#   market_data/results/scan_results.parquet   full scored universe, best TotalScore first
+#   market_data/results/stream_top.parquet     scanner_stream's top-K only (the app does not read it)
+# The scan date and universe size ride along in the file's key-value metadata, so
+# results_info() answers "which scan is this?" from the footer without reading rows.
+# Rows are in rank order, so the top N / any page is a slice of the first row group(s).
+# Excel (top10_pro.xlsx) is an optional export only; it is still read as a fallback when
+# no results file exists yet (output of an older scanner).
+
+RESULTS_DIR = os.path.join("market_data", "results")
+RESULTS_FILE = "scan_results.parquet"
+STREAM_FILE = "stream_top.parquet"
+LEGACY_EXCEL = "top10_pro.xlsx"
+
+def results_path(results_dir=RESULTS_DIR, name=RESULTS_FILE):
+    return os.path.join(results_dir, name)
+
+def write_results(df, scan_date=None, universe=None, results_dir=RESULTS_DIR, name=RESULTS_FILE):
+    """Writes the ranked frame (sorted best first) atomically. Returns the path."""
+    scan_date = scan_date or datetime.date.today().isoformat()
+    ranked = df.sort_values("TotalScore", ascending=False, kind="stable").reset_index(drop=True)
+    table = pa.Table.from_pandas(ranked, preserve_index=False)
+    meta = {**(table.schema.metadata or {}),
+            b"scan_date": scan_date.encode(),
+            b"universe": str(universe if universe is not None else "").encode()}
+    table = table.replace_schema_metadata(meta)
+    path = results_path(results_dir, name)
+    os.makedirs(results_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+def results_info(results_dir=RESULTS_DIR):
+    """{"scan_date", "universe", "rows"} from the results footer, or None if there are no results."""
+    path = results_path(results_dir)
+    if not os.path.exists(path):
+        return None
+    md = pq.ParquetFile(path).metadata
+    kv = md.metadata or {}
+    universe = kv.get(b"universe", b"").decode()
+    return {"scan_date": kv.get(b"scan_date", b"").decode() or None,
+            "universe": int(universe) if universe else None,
+            "rows": md.num_rows}
+
+def results_mtime(results_dir=RESULTS_DIR, legacy_excel=LEGACY_EXCEL):
+    """Modification time of whichever file read_results() would serve (None if neither exists)."""
+    for path in (results_path(results_dir), legacy_excel):
+        if os.path.exists(path):
+            return os.path.getmtime(path)
+    return None
+
+def read_results(offset=0, limit=None, columns=None, results_dir=RESULTS_DIR, legacy_excel=LEGACY_EXCEL):
+    """
+    Rows [offset, offset + limit) of the latest scan in rank order (all rows if limit is None).
+    Falls back to the legacy Excel export; empty DataFrame if there is no scan output at all.
+    """
+    path = results_path(results_dir)
+    if os.path.exists(path):
+        table = pq.read_table(path, columns=columns)
+        profiling.count_file_read(path)
+        if offset or limit is not None:
+            table = table.slice(offset, limit)
+        return table.to_pandas()
+    if os.path.exists(legacy_excel):
+        df = pd.read_excel(legacy_excel)
+        profiling.count_file_read(legacy_excel)
+        df = df[columns] if columns else df
+        return df.iloc[offset:None if limit is None else offset + limit].reset_index(drop=True)
+    return pd.DataFrame()
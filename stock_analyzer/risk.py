@@ -1,23 +1,30 @@
 import pandas as pd
 import numpy as np
+import analysis_context
+import risk_engine
+import profiling
 
+@profiling.profiled()
 def analyze_risk(data):
     """
     Analyzes risk metrics (Beta, Volatility, Drawdown).
     Returns score (Higher score = Lower Risk / Safer).
+    `data` is a get_stock_data dict or an AnalysisContext.
     """
-    if data is None:
+    ctx = analysis_context.context(data)
+    if ctx is None:
         return None
         
-    history = data.get("history")
-    info = data.get("info", {})
+    info = ctx.info
     
     metrics = {}
     scores = {}
     reasons = []
 
-    # 1. Beta (Market Risk)
-    beta = info.get("beta")
+    # 1. Beta (Market Risk): regression on the stored benchmark, provider beta otherwise
+    beta = risk_engine.context_beta(ctx)
+    if np.isnan(beta):
+        beta = info.get("beta")
     metrics["Beta"] = beta
     
     # Beta < 1 means less volatile than market -> Safe
@@ -32,9 +39,8 @@ def analyze_risk(data):
         scores["Beta"] = 5 # Neutral
 
     # 2. Daily Volatility (Annualized)
-    if history is not None and not history.empty:
-        rets = history["Close"].pct_change().dropna()
-        volatility = rets.std() * np.sqrt(252) # Annualized
+    if ctx.has_history():
+        volatility = ctx.volatility(252) # Annualized
         metrics["Volatility"] = volatility
         
         # Determine safety based on general market standards
@@ -46,10 +52,7 @@ def analyze_risk(data):
         
         # 3. Max Drawdown (1Y)
         # Look at last year
-        one_year = history.iloc[-252:]
-        rolling_max = one_year["Close"].cummax()
-        drawdown = (one_year["Close"] - rolling_max) / rolling_max
-        max_drawdown = drawdown.min()
+        max_drawdown = ctx.max_drawdown(252)
         metrics["Max Drawdown"] = max_drawdown
         
         if max_drawdown > -0.10: scores["DD"] = 10 # Dropped less than 10%
@@ -0,0 +1,234 @@
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import price_store
+import profiling
+
+# Universe risk engine. Loads the stored closes of every ticker into one (dates x tickers)
+# matrix and computes the Risk layer inputs for all names at once:
+#   Beta            OLS slope of daily returns on the BENCHMARK's (SPY), as matrix products
+#                   over the dates both have a bar; replaces the provider's info beta when
+#                   the benchmark's bars are stored (data_update stores them).
+#   Volatility      annualized std of daily returns over the window (Volatility_3M: last VOL_WINDOW days)
+#   Max_Drawdown    deepest peak-to-trough fall of the close over the window (<= 0)
+#   VaR_95 / CVaR_95  historical 1-day loss not exceeded on 95% of days / mean loss on the worst 5%
+# Every ticker uses its own last RISK_WINDOW bars, so a ticker's numbers do not depend on which
+# other tickers are in the batch (scanner_pro and scanner_stream agree).
+# The scanner adds these columns at scan time (add_risk_metrics); backtest.py runs compute_risk
+# on each rebalance date's trailing window for point-in-time values.
+# Usage:
+#   python risk_engine.py --top 20                  (riskiest names by CVaR in the latest snapshot)
+#   python risk_engine.py --synthetic 5000 --years 10   (timing on a generated price store)
+
+BENCHMARK = "SPY"
+RISK_WINDOW = 252 # Daily bars per ticker
+VOL_WINDOW = 63   # Recent volatility (3 months)
+VAR_LEVEL = 0.95  # VaR_95 / CVaR_95
+MIN_OBS = 60      # Fewer returns than this: NaN (normalize_metrics scores it neutral)
+PERIODS = 252     # Annualization
+
+RISK_COLUMNS = ["Beta", "Volatility", "Volatility_3M", "Max_Drawdown", "VaR_95", "CVaR_95", "Risk_Obs"]
+
+def load_window(tickers, bars=RISK_WINDOW, end=None, root=price_store.PRICE_DIR):
+    """
+    (close, returns) as (dates x tickers) DataFrames on the union of the tickers' dates.
+    Each ticker holds only its own last `bars` returns (bars + 1 closes) up to end;
+    returns are taken between a ticker's consecutive stored bars. Tickers without stored
+    prices are left out.
+    """
+    windows = {}
+    for t in dict.fromkeys(tickers):
+        if not price_store.has_ticker(t, root):
+            continue
+        d, cols = price_store.window(t, end=end, fields=("Close",), root=root)
+        windows[t] = (d[-(bars + 1):], cols["Close"][-(bars + 1):])
+    if not windows:
+        empty = pd.DataFrame(index=pd.DatetimeIndex([], name="Date"))
+        return empty, empty.copy()
+    arrays = [d for d, _ in windows.values()]
+    days = arrays[0]
+    if any(len(d) != len(days) or not np.array_equal(d, days) for d in arrays[1:]):
+        days = np.unique(np.concatenate(arrays)) # Tickers trade on different days: union
+    close = np.full((len(days), len(windows)), np.nan)
+    rets = np.full((len(days), len(windows)), np.nan)
+    for j, (d, c) in enumerate(windows.values()):
+        rows = np.searchsorted(days, d)
+        close[rows, j] = c
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rets[rows[1:], j] = c[1:] / c[:-1] - 1
+    index = pd.DatetimeIndex(days.astype("datetime64[ns]"), name="Date")
+    return (pd.DataFrame(close, index=index, columns=list(windows)),
+            pd.DataFrame(rets, index=index, columns=list(windows)))
+
+def benchmark_returns(index, benchmark=BENCHMARK, root=price_store.PRICE_DIR):
+    """Benchmark daily returns on `index` (NaN where it has no bar), or None if it is not stored."""
+    if len(index) == 0 or not price_store.has_ticker(benchmark, root):
+        return None
+    d, cols = price_store.window(benchmark, end=index[-1], fields=("Close",), root=root)
+    c = np.asarray(cols["Close"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = pd.Series(c[1:] / c[:-1] - 1, index=pd.DatetimeIndex(d[1:].astype("datetime64[ns]")))
+    return rets.reindex(index)
+
+def betas(rets, market, min_obs=MIN_OBS):
+    """
+    Slope of every column of rets (T x N) on market (T,) over the rows where both exist,
+    from four matrix-vector products. Returns (beta, observations); beta is NaN below min_obs.
+    """
+    rets, market = np.asarray(rets, dtype=np.float64), np.asarray(market, dtype=np.float64)
+    m = np.nan_to_num(market)
+    valid = (~np.isnan(rets) & ~np.isnan(market)[:, None]).astype(np.float64)
+    x = np.where(valid > 0, rets, 0.0)
+    n = valid.sum(axis=0)
+    sum_m, sum_mm = valid.T @ m, valid.T @ (m * m)
+    sum_x, sum_xm = x.sum(axis=0), x.T @ m
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xm - sum_x * sum_m / n
+        var = sum_mm - sum_m * sum_m / n
+        beta = cov / var
+    return np.where((n >= min_obs) & (var > 0), beta, np.nan), n.astype(np.int64)
+
+def volatility(rets, periods=PERIODS, min_obs=MIN_OBS):
+    """Annualized std (ddof=1) of each column, ignoring NaN. NaN below min_obs."""
+    rets = np.asarray(rets, dtype=np.float64)
+    valid = ~np.isnan(rets)
+    n = valid.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(valid, rets, 0.0).sum(axis=0) / n
+        var = np.where(valid, (rets - mean) ** 2, 0.0).sum(axis=0) / (n - 1)
+    return np.where(n >= min_obs, np.sqrt(var) * np.sqrt(periods), np.nan)
+
+def max_drawdown(close, min_obs=MIN_OBS):
+    """Deepest fall from a running peak for each column (<= 0), skipping missing bars. NaN below min_obs returns."""
+    close = np.asarray(close, dtype=np.float64)
+    peak = np.fmax.accumulate(close, axis=0) # fmax ignores NaN
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.nan_to_num(close / peak - 1, nan=0.0)
+    n = (~np.isnan(close)).sum(axis=0) - 1 # Returns spanned, as for the other metrics
+    return np.where(n >= min_obs, dd.min(axis=0, initial=0.0), np.nan)
+
+def historical_var(rets, level=VAR_LEVEL, min_obs=MIN_OBS):
+    """
+    (VaR, CVaR) per column as positive 1-day loss fractions: the k-th worst return and the
+    mean of the k worst, k = ceil((1 - level) * observations). NaN below min_obs.
+    """
+    rets = np.asarray(rets, dtype=np.float64)
+    n = (~np.isnan(rets)).sum(axis=0)
+    k = np.maximum(np.ceil((1 - level) * n).astype(np.int64), 1)
+    if rets.size == 0:
+        return np.full(rets.shape[1], np.nan), np.full(rets.shape[1], np.nan)
+    tail = np.sort(rets, axis=0)[:k.max()] # NaN sorts last
+    cols = np.arange(rets.shape[1])
+    rows = np.minimum(k, len(tail)) - 1
+    var = -tail[rows, cols]
+    cvar = -np.cumsum(np.nan_to_num(tail), axis=0)[rows, cols] / k
+    ok = n >= min_obs
+    return np.where(ok, var, np.nan), np.where(ok, cvar, np.nan)
+
+def compute_risk(close, rets, market=None, level=VAR_LEVEL, vol_window=VOL_WINDOW, min_obs=MIN_OBS):
+    """
+    RISK_COLUMNS for every ticker of load_window()'s (close, returns) frames in one pass.
+    market: benchmark returns on the same index (None = no Beta). Returns a frame indexed by ticker.
+    """
+    r = rets.to_numpy(dtype=np.float64)
+    out = pd.DataFrame(index=rets.columns)
+    if market is not None:
+        out["Beta"], _ = betas(r, market.to_numpy(dtype=np.float64), min_obs)
+    else:
+        out["Beta"] = np.nan
+    out["Volatility"] = volatility(r, min_obs=min_obs)
+    # Recent regime: each ticker's last vol_window returns
+    valid = ~np.isnan(r)
+    recent = valid & (valid[::-1].cumsum(axis=0)[::-1] <= vol_window)
+    out["Volatility_3M"] = volatility(np.where(recent, r, np.nan), min_obs=min(vol_window, min_obs))
+    out["Max_Drawdown"] = max_drawdown(close.to_numpy(dtype=np.float64), min_obs)
+    out["VaR_95"], out["CVaR_95"] = historical_var(r, level, min_obs)
+    out["Risk_Obs"] = valid.sum(axis=0)
+    return out
+
+def context_beta(ctx, benchmark=BENCHMARK, window=RISK_WINDOW, root=price_store.PRICE_DIR):
+    """
+    Beta of one analysis_context.AnalysisContext's last `window` returns on the stored
+    benchmark (risk.analyze_risk). NaN without history, benchmark bars or MIN_OBS overlap.
+    """
+    def compute():
+        if not ctx.has_history():
+            return np.nan
+        rets = ctx.returns.iloc[-window:]
+        index = pd.DatetimeIndex(rets.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        market = benchmark_returns(index.normalize(), benchmark, root)
+        if market is None:
+            return np.nan
+        beta, _ = betas(rets.to_numpy(dtype=np.float64)[:, None], market.to_numpy(dtype=np.float64))
+        return float(beta[0])
+    return ctx.memo(("beta", benchmark, window), compute)
+
+@profiling.profiled()
+def add_risk_metrics(df, benchmark=BENCHMARK, window=RISK_WINDOW, end=None, root=price_store.PRICE_DIR):
+    """
+    Adds the RISK_COLUMNS for every row from the stored prices. Beta is replaced by the
+    computed beta where there is one (the snapshot's provider beta is kept otherwise);
+    rows without stored prices get NaN (normalize_metrics scores them neutral).
+    """
+    close, rets = load_window(df["Ticker"], window, end, root)
+    if rets.shape[1]:
+        metrics = compute_risk(close, rets, benchmark_returns(rets.index, benchmark, root))
+    else:
+        metrics = pd.DataFrame(columns=RISK_COLUMNS, dtype=np.float64)
+    for col in RISK_COLUMNS:
+        values = df["Ticker"].map(metrics[col])
+        if col == "Beta" and "Beta" in df.columns:
+            values = values.fillna(df["Beta"])
+        df[col] = values.astype(np.float64)
+    return df
+
+def _synthetic_store(n, years, root):
+    """Writes n generated tickers plus the benchmark under root (price_store layout)."""
+    import synthetic_market
+    days = 252 * years
+    for t in [BENCHMARK] + list(synthetic_market.synthetic_universe(n)["Ticker"]):
+        price_store.write(t, synthetic_market.synthetic_history(t, days), full_history=True, root=root)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Universe risk metrics from the stored prices.")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--window", type=int, default=RISK_WINDOW, help="Daily bars per ticker.")
+    parser.add_argument("--benchmark", default=BENCHMARK)
+    parser.add_argument("--synthetic", type=int, default=None, help="Time a generated store of N tickers.")
+    parser.add_argument("--years", type=int, default=10, help="Years of generated history (with --synthetic).")
+    args = parser.parse_args()
+
+    root, scratch = price_store.PRICE_DIR, None
+    if args.synthetic:
+        scratch = tempfile.mkdtemp(prefix="risk_engine_")
+        root = os.path.join(scratch, "prices")
+        start = time.perf_counter()
+        _synthetic_store(args.synthetic, args.years, root)
+        print(f"Generated {args.synthetic} tickers x {args.years}Y in {time.perf_counter() - start:.1f}s")
+        tickers, window = price_store.list_tickers(root), 252 * args.years
+    else:
+        import snapshot_store
+        if snapshot_store.latest_snapshot_date() is None:
+            print("No market data found. Please run data_update.py first.")
+            exit()
+        tickers, window = list(snapshot_store.read_snapshot(columns=["Ticker"])["Ticker"]), args.window
+
+    try:
+        start = time.perf_counter()
+        close, rets = load_window(tickers, window, root=root)
+        loaded = time.perf_counter()
+        market = benchmark_returns(rets.index, args.benchmark, root)
+        metrics = compute_risk(close, rets, market)
+        done = time.perf_counter()
+        print(f"Risk for {rets.shape[1]} tickers x {rets.shape[0]} days: load {loaded - start:.2f}s, "
+              f"compute {done - loaded:.2f}s" + ("" if market is not None else f" ({args.benchmark} not stored: no beta)"))
+        print(metrics.drop(index=args.benchmark, errors="ignore").nlargest(args.top, "CVaR_95").round(3).to_string())
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
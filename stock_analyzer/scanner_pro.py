@@ -1,210 +1,287 @@
 import pandas as pd
 import numpy as np
-import os
-import glob
-from scipy.stats import percentileofscore
+import pyarrow.compute as pc
+import argparse
 import datetime
-import time
+from typing import NamedTuple, Optional
 import ai_insights # Import the new module
+import snapshot_store
+import results_store
+import dcf_engine
+import risk_engine
+import history_store
+import utils
+import profiling
 
-MARKET_DATA_DIR = "market_data"
-HISTORY_FILE = "scan_history.csv"
-OUTPUT_FILE = "top10_pro.xlsx"
+OUTPUT_FILE = "top10_pro.xlsx" # Optional Excel export (--excel); the app reads results_store
+EXPORT_TOP_N = 20 # Rows in the Excel export
 
-def load_market_data():
-    """Loads all parquet files from market_data into a single DataFrame."""
-    files = glob.glob(os.path.join(MARKET_DATA_DIR, "*.parquet"))
-    if not files:
-        print("No market data found. Please run data_update.py first.")
-        return pd.DataFrame()
-    
-    # Freshness Check
-    now = time.time()
-    old_files = 0
-    for f in files:
-        if os.stat(f).st_mtime < now - 7 * 86400:
-            old_files += 1
-            
-    if old_files > 0:
-        print(f"WARNING: {old_files} data files are older than 7 days. Please run data_update.py.")
-    
-    print(f"Loading {len(files)} tickers...")
-    df_list = [pd.read_parquet(f) for f in files]
-    df = pd.concat(df_list, ignore_index=True)
+@profiling.profiled()
+def load_market_data(columns=None, filters=None):
+    """
+    Loads the latest consolidated market_data snapshot in a single read.
+    columns: only these snapshot columns are read (default: all).
+    filters: pyarrow expression pushed into the parquet scan (e.g. hard_filter_expression()).
+    """
+    if snapshot_store.latest_snapshot_date() is None:
+        # Migration path from the legacy {TICKER}_data.parquet layout
+        if snapshot_store.migrate_legacy() is None:
+            print("No market data found. Please run data_update.py first.")
+            return pd.DataFrame()
+
+    with profiling.stage("read_snapshot"):
+        df = snapshot_store.read_snapshot(columns=columns, filter=filters)
+    
+    # Freshness Check (per-ticker refresh date stored in the snapshot)
+    old_rows = 0
+    if "AsOf" in df.columns:
+        with profiling.stage("freshness_check"):
+            cutoff = datetime.date.today() - datetime.timedelta(days=7)
+            old_rows = int((df["AsOf"] < cutoff).sum())
+    if old_rows > 0:
+        print(f"WARNING: {old_rows} tickers have data older than 7 days. Please run data_update.py.")
+    
+    print(f"Loading {len(df)} tickers...")
     return df
 
-def apply_hard_filters(df):
+# Snapshot columns the hard filters read (see load_candidates)
+FILTER_COLUMNS = ["Rev_CAGR_3Y", "FCF_Positive", "Price", "MA200", "Debt_EBITDA"]
+# Below this many rows the second file read costs more than converting the discarded rows
+TWO_PHASE_MIN_ROWS = 100_000
+
+# Hard filter thresholds (see apply_hard_filters)
+HARD_FILTERS = {
+    "min_rev_cagr": 0.0,      # Rev CAGR 3Y must exceed this
+    "require_fcf_positive": True,
+    "min_vs_ma200": -0.25,    # Price vs 200DMA floor
+    "max_debt_ebitda": 6,     # NaN Debt/EBITDA passes
+}
+
+def hard_filter_mask(df, filters=None):
+    """Boolean Series: True where a row passes every hard filter."""
+    f = {**HARD_FILTERS, **(filters or {})}
+    mask = df["Rev_CAGR_3Y"] > f["min_rev_cagr"]
+    if f["require_fcf_positive"]:
+        mask &= df["FCF_Positive"] == True
+    mask &= (df["Price"] - df["MA200"]) / df["MA200"] > f["min_vs_ma200"]
+    mask &= (df["Debt_EBITDA"] < f["max_debt_ebitda"]) | (df["Debt_EBITDA"].isna())
+    return mask
+
+def hard_filter_expression(filters=None):
+    """
+    The hard filters as a pyarrow expression, for pushing into a parquet scan.
+    Same semantics as hard_filter_mask: missing values fail every filter except Debt/EBITDA.
+    """
+    f = {**HARD_FILTERS, **(filters or {})}
+    expr = pc.field("Rev_CAGR_3Y") > f["min_rev_cagr"]
+    if f["require_fcf_positive"]:
+        expr &= pc.field("FCF_Positive") == True
+    expr &= (pc.field("Price") - pc.field("MA200")) / pc.field("MA200") > f["min_vs_ma200"]
+    debt = pc.field("Debt_EBITDA")
+    expr &= (debt < f["max_debt_ebitda"]) | debt.is_null(nan_is_null=True)
+    return expr
+
+@profiling.profiled()
+def apply_hard_filters(df, filters=None):
     """
     Applies binary pass/fail filters.
-    1. Rev CAGR 3Y > 3%
+    1. Rev CAGR 3Y > 0% (Relaxed)
     2. FCF > 0
-    3. Price vs 200DMA > -15%
-    4. Interest Cov / Debt Check (Debt/EBITDA < 4 if IntCov missing)
+    3. Kill Switch: Price vs 200DMA > -25% (allows "Deep Value" picks even if trend is weak)
+    4. Debt/EBITDA < 6 (or missing) - generous filter for safety
+    Thresholds come from HARD_FILTERS; pass `filters` to override any of them.
     """
     initial_count = len(df)
+    df = df[hard_filter_mask(df, filters)].copy()
+    print(f"Filters: {initial_count} -> {len(df)} tickers passed.")
+    return df
+
+@profiling.profiled()
+def load_candidates(filters=None):
+    """
+    Two-phase load + hard filters: reads only Ticker, AsOf and the filter columns for the
+    whole universe, filters, then pulls the remaining columns for the survivors alone.
+    Same frame as apply_hard_filters(load_market_data(), filters), without converting
+    the rows that are thrown away. Snapshots under TWO_PHASE_MIN_ROWS use the single read.
+    """
+    token = snapshot_store.snapshot_token()
+    if token is None or snapshot_store.snapshot_rows(token[0]) < TWO_PHASE_MIN_ROWS:
+        return apply_hard_filters(load_market_data(), filters)
+    df = load_market_data(columns=["Ticker", "AsOf"] + FILTER_COLUMNS)
+    if df.empty:
+        return df
+    df = apply_hard_filters(df, filters)
+    if df.empty:
+        return df
+    rest = [c for c in snapshot_store.SCHEMA.names if c not in df.columns]
+    with profiling.stage("read_survivors"):
+        # read_snapshot returns file order, so the survivors' index labels are their row positions
+        extra = snapshot_store.read_snapshot(token[0], columns=rest, rows=df.index.to_numpy())
+    if snapshot_store.snapshot_token() != token:
+        # A refresh replaced the snapshot between the two reads
+        return apply_hard_filters(load_market_data(), filters)
+    extra.index = df.index
+    return pd.concat([df, extra], axis=1)[snapshot_store.SCHEMA.names]
+
+# Metrics to normalize and their direction (True = Higher is Better)
+METRICS_CONFIG = {
+    # Fundamentals
+    "ROIC": True,
+    "Rev_CAGR_3Y": True,
+    "Gross_Margin": True, # New
     
-    # 1. Growth Filter (Relaxed to > 0%)
-    df = df[df["Rev_CAGR_3Y"] > 0.0].copy()
-    
-    # 2. Cash Flow Filter
-    df = df[df["FCF_Positive"] == True].copy()
-    
-    # 3. Kill Switch: Price vs 200DMA
-    # Relaxed to -25% to allow "Deep Value" picks even if trend is weak
-    mask_trend = (df["Price"] - df["MA200"]) / df["MA200"] > -0.25
-    df = df[mask_trend].copy()
+    # Valuation
+    "ForwardPE": False, # Lower is better
+    "PegRatio": False,  # Lower is better (Need to be careful with negative PEG? assume cleaned in data update)
+    "DCF_Upside": True, # Intrinsic value vs price (dcf_engine.add_dcf_upside, computed at scan time)
     
-    # 4. Debt Filter (Debt/EBITDA < 6)
-    # Generous filter for safety
-    mask_debt = (df["Debt_EBITDA"] < 6) | (df["Debt_EBITDA"].isna())
-    df = df[mask_debt].copy()
+    # Risk
+    "Beta": False,      # Lower is better (regression beta vs SPY from risk_engine, provider beta if no prices)
+    "Debt_EBITDA": False, # Lower is better
+    "Volatility": False,  # Annualized, trailing year (risk_engine.add_risk_metrics, computed at scan time)
+    "Max_Drawdown": True, # <= 0, shallower is better
+    "CVaR_95": False,     # Mean daily loss on the worst 5% of days
     
-    print(f"Filters: {initial_count} -> {len(df)} tickers passed.")
-    return df
+    # Technicals
+    "RSI": True,        # Mid-range is best, but for raw percentile, High RSI = Strong Momentum logic (filtered by O/B later)
+    "Vol_Avg": True     # Volume vs 20D average (relative volume)
+}
 
-def normalize_metrics(df):
+# Groups smaller than this are ranked against the whole universe instead
+MIN_GROUP_SIZE = 5
+
+@profiling.profiled()
+def normalize_metrics(df, metrics_config=None, group_by="Sector", min_group_size=MIN_GROUP_SIZE):
     """
     Applies Sector-Relative Normalization across 7-Layer Framework metrics.
+    All percentile ranks are computed in one grouped pass. group_by may be a
+    column name or a list of columns (e.g. ["Sector", "Industry", "CapBucket"]) forming
+    a composite peer group; groups below min_group_size fall back to universe ranks.
     """
-    # Define metrics to normalize and their direction (True = Higher is Better)
-    metrics_config = {
-        # Fundamentals
-        "ROIC": True,
-        "Rev_CAGR_3Y": True,
-        "Gross_Margin": True, # New
-        
-        # Valuation
-        "ForwardPE": False, # Lower is better
-        "PegRatio": False,  # Lower is better (Need to be careful with negative PEG? assume cleaned in data update)
-        
-        # Risk
-        "Beta": False,      # Lower is better
-        "Debt_EBITDA": False, # Lower is better
-        
-        # Technicals
-        "RSI": True,        # Mid-range is best, but for raw percentile, High RSI = Strong Momentum logic (filtered by O/B later)
-        "Vol_Avg": True     # Higher vol relative to avg? Or absolute? Let's use Relative Vol if available. 
-                            # If not diff, just rank by volume liquidity?
-    }
+    metrics_config = metrics_config or METRICS_CONFIG
+    group_cols = [group_by] if isinstance(group_by, str) else list(group_by)
+    metrics = [m for m in metrics_config if m in df.columns]
     
     df_scored = df.copy()
-    df_scored["NormSource"] = "Sector" # Default
     
-    for sector in df["Sector"].unique():
-        sector_mask = df["Sector"] == sector
-        sector_df = df[sector_mask]
-        
-        # Fallback to Universe if small sector
-        if len(sector_df) < 5:
-             df_scored.loc[sector_mask, "NormSource"] = "Universe (Fallback)"
-             pass 
-
-        for metric, higher_better in metrics_config.items():
-            if metric not in sector_df.columns:
-                continue
-                
-            if sector_df[metric].isna().all():
-                continue
-                
-            ranks = sector_df[metric].rank(pct=True, ascending=higher_better) * 100
-            df_scored.loc[sector_mask, f"Score_{metric}"] = ranks
-            
+    # Lower-is-better metrics are negated so a single ascending rank serves every column
+    signs = np.array([1.0 if metrics_config[m] else -1.0 for m in metrics])
+    values = df[metrics].astype(float) * signs
+    keys = [df[c] for c in group_cols]
+    
+    group_ranks = values.groupby(keys, dropna=False, sort=False).rank(pct=True) * 100
+    universe_ranks = values.rank(pct=True) * 100
+    group_size = df.groupby(keys, dropna=False, sort=False)[group_cols[0]].transform("size").to_numpy()
+    
+    # Fallback to Universe if small group
+    small = group_size < min_group_size
+    ranks = group_ranks.mask(pd.Series(small, index=df.index), universe_ranks, axis=0)
+    df_scored["NormSource"] = np.where(small, "Universe (Fallback)", "+".join(group_cols))
+    
     # Fill NaN scores with 50 (Neutral)
-    score_cols = [f"Score_{m}" for m in metrics_config.keys() if f"Score_{m}" in df_scored]
-    df_scored[score_cols] = df_scored[score_cols].fillna(50)
+    score_cols = [f"Score_{m}" for m in metrics]
+    df_scored[score_cols] = ranks.fillna(50).to_numpy()
     
     return df_scored
 
-def calculate_final_score(df):
+# 7-Layer weights and the normalized scores that make up each layer.
+# The final score is linear in the component columns, which lets rescoring.py
+# evaluate many weightings with a single matrix multiply.
+LAYER_WEIGHTS = {
+    "Quality": 0.30,     # ROIC, Margins
+    "Growth": 0.20,      # Revenue CAGR
+    "Valuation": 0.25,   # PE, PEG, DCF upside
+    "Technicals": 0.15,  # RSI, Trend (Price vs MA200)
+    "Risk": 0.10,        # Beta, Debt, Volatility, Drawdown, CVaR
+}
+LAYER_COMPONENTS = {
+    "Quality": {"Score_ROIC": 0.6, "Score_Gross_Margin": 0.4},
+    "Growth": {"Score_Rev_CAGR_3Y": 1.0},
+    "Valuation": {"Score_ForwardPE": 0.4, "Score_PegRatio": 0.3, "Score_DCF_Upside": 0.3},
+    "Technicals": {"Score_RSI": 0.4, "Score_Trend": 0.6},
+    "Risk": {"Score_Beta": 0.3, "Score_Debt_EBITDA": 0.3, "Score_Volatility": 0.15,
+             "Score_Max_Drawdown": 0.1, "Score_CVaR_95": 0.15},
+}
+COMPONENT_COLUMNS = [c for comps in LAYER_COMPONENTS.values() for c in comps]
+
+@profiling.profiled()
+def calculate_final_score(df, weights=None):
     """
     Weights the normalized scores into a final 0-100 score based on 7-Layer logic.
+    `weights` overrides any of LAYER_WEIGHTS. Missing component scores count as 50 (Neutral).
     """
-    # 1. Quality (30%) - ROIC, Margins
-    score_qual = (df.get("Score_ROIC", 50) * 0.6) + (df.get("Score_Gross_Margin", 50) * 0.4)
-    
-    # 2. Growth (20%) - Revenue CAGR
-    score_grow = df.get("Score_Rev_CAGR_3Y", 50)
-    
-    # 3. Valuation (25%) - PE, PEG
-    score_val = (df.get("Score_ForwardPE", 50) * 0.6) + (df.get("Score_PegRatio", 50) * 0.4)
+    weights = {**LAYER_WEIGHTS, **(weights or {})}
     
-    # 4. Technicals (15%) - RSI, Trend (Price vs MA200)
-    # Calc Trend Score manually from Price vs MA200 deviation
+    # Trend Score calculated manually from Price vs MA200 deviation
     pct_above_ma200 = (df["Price"] / df["MA200"]) - 1
-    score_trend = 50 + (pct_above_ma200 * 100).clip(-50, 50)
+    df["Score_Trend"] = 50 + (pct_above_ma200 * 100).clip(-50, 50)
     
-    score_tech = (df.get("Score_RSI", 50) * 0.4) + (score_trend * 0.6)
-    
-    # 5. Risk (10%) - Beta, Debt
-    score_risk = (df.get("Score_Beta", 50) * 0.5) + (df.get("Score_Debt_EBITDA", 50) * 0.5)
-
-    # Weighted Sum
-    total = (score_qual * 0.30) + (score_grow * 0.20) + (score_val * 0.25) + (score_tech * 0.15) + (score_risk * 0.10)
-    
-    # Save Sub-Scores for UI Radar
-    df["Score_Quality"] = score_qual
-    df["Score_Growth"] = score_grow
-    df["Score_Valuation"] = score_val
-    df["Score_Technicals"] = score_tech
-    df["Score_Risk"] = score_risk
+    total = 0
+    for layer, components in LAYER_COMPONENTS.items():
+        layer_score = sum(df.get(col, 50) * w for col, w in components.items())
+        
+        # Save Sub-Scores for UI Radar
+        df[f"Score_{layer}"] = layer_score
+        total = total + layer_score * weights[layer]
     
     df["TotalScore"] = total
     return df
 
-def update_history(df):
+# Component scores of the last scan, for rescoring.py's what-if runs (rescoring imports
+# this module, never the other way round)
+SCORE_CACHE_FILE = "score_cache.parquet"
+SCORE_CACHE_INFO_COLUMNS = ["Ticker", "Name", "Sector"]
+
+def build_score_cache(df_scored, path=SCORE_CACHE_FILE):
+    """Persists the component scores (+ raw filter inputs) of a scan. Called once per run_scan."""
+    cols = SCORE_CACHE_INFO_COLUMNS + FILTER_COLUMNS + COMPONENT_COLUMNS
+    cache = pd.DataFrame({c: df_scored[c] if c in df_scored.columns else np.nan for c in cols})
+    cache[COMPONENT_COLUMNS] = cache[COMPONENT_COLUMNS].astype(float).fillna(50)
+    cache = cache.reset_index(drop=True)
+    if path:
+        cache.to_parquet(path, index=False)
+    return cache
+
+@profiling.profiled()
+def update_history(df, write=True):
     """
-    Updates scan_history.csv and calculates Rank Delta.
+    Appends today's ranks to the scan history store and calculates Rank Delta
+    against the previous scan date. write=False only computes the delta.
     """
     today = datetime.date.today().isoformat()
     
     # Prepare current snapshot
     snapshot = df[["Ticker", "TotalScore"]].copy()
-    snapshot["Date"] = today
     snapshot["Rank"] = snapshot["TotalScore"].rank(ascending=False)
     
-    if os.path.exists(HISTORY_FILE):
-        history = pd.read_csv(HISTORY_FILE)
-        # Remove today if exists (rerun support)
-        history = history[history["Date"] != today]
-        history = pd.concat([history, snapshot], ignore_index=True)
-    else:
-        history = snapshot
+    if write:
+        # First run after the switch: import the legacy scan_history.csv
+        history_store.migrate_csv()
         
-    history.to_csv(HISTORY_FILE, index=False)
-    
-    # Calculate Rank Delta (vs 7d Avg or Last)
-    # Simplest: Rank Prev Day - Rank Today
-    # If Prev Day missing, Delta = 0
-    
-    latest_ranks = snapshot.set_index("Ticker")["Rank"]
+        # Only today's partition is written (rerun support: it is replaced)
+        history_store.write_date(snapshot, today)
     
-    # Get distinct dates
-    dates = sorted(history["Date"].unique())
-    if len(dates) > 1:
-        prev_date = dates[-2]
-        prev_ranks = history[history["Date"] == prev_date].set_index("Ticker")["Rank"]
-        
-        # Delta: Positive means improved rank (Lower number is better rank, so Prev - Curr)
-        # e.g. Prev 10, Curr 5 -> 10 - 5 = +5 (Jumped 5 spots)
-        df["Rank_Delta"] = df["Ticker"].map(lambda x: prev_ranks.get(x, 0) - latest_ranks.get(x, 0))
+    # Delta: Positive means improved rank (Lower number is better rank, so Prev - Curr)
+    # If there is no previous scan, Delta = 0
+    prev_date = history_store.previous_date(today)
+    if prev_date:
+        df["Rank_Delta"] = history_store.rank_delta(snapshot, history_store.read_date(prev_date))
     else:
         df["Rank_Delta"] = 0
         
     return df
 
-def generate_explanations(df):
+@profiling.profiled()
+def generate_explanations(df, top_n=None):
     """
     Generates 'Why This Stock?' string using ai_insights module.
+    Only the top_n rows by TotalScore get a narrative (all rows if None).
     """
     df["Rank"] = df["TotalScore"].rank(ascending=False)
     
-    # Apply AI generation row by row
-    insights = df.apply(ai_insights.generate_insight, axis=1)
-    
-    # Unpack tuple (Insight, Risk, Version)
-    df["AI_Insight"] = [x[0] for x in insights]
-    df["Risk_Note"] = [x[1] for x in insights]
-    df["AI_Version"] = [x[2] for x in insights]
+    # Batched: rule masks over the frame, strings only for the emitted rows
+    insights = ai_insights.generate_insights(df, top_n=top_n)
+    df[["AI_Insight", "Risk_Note", "AI_Version"]] = insights
     
     # Confidence Score (Placeholder based on data completeness)
     # If key metrics are NaN (filled 50), confidence drops
@@ -213,43 +290,103 @@ def generate_explanations(df):
     
     return df
 
-if __name__ == "__main__":
-    print("--- 5-STAR PRO SCANNER ---")
-    
-    # 1. Load Data
-    df = load_market_data()
-    if df.empty: exit()
-    
-    # 2. Hard Filters
-    df_filtered = apply_hard_filters(df)
-    
-    if df_filtered.empty:
+# run_scan() defaults; pass a dict with any of these keys to override them
+SCAN_CONFIG = {
+    "filters": None,                           # HARD_FILTERS overrides (see apply_hard_filters)
+    "explain_top_n": None,                     # Rows that get an AI insight (None = all; the app pages through every row)
+    "write_history": True,                     # Append today's ranks to the scan history store
+    "score_cache": True,                       # Refresh SCORE_CACHE_FILE for rescoring.py
+    "results_dir": results_store.RESULTS_DIR,  # Full ranked universe for the app (None = not persisted)
+    "excel": None,                             # Optional Excel export path
+    "excel_rows": EXPORT_TOP_N,
+    "dcf_assumptions": None,                   # dcf_engine.DCF_ASSUMPTIONS overrides
+    "dcf_sector_assumptions": None,            # Replaces dcf_engine.SECTOR_ASSUMPTIONS
+    "risk_benchmark": risk_engine.BENCHMARK,   # Beta is regressed on this ticker's stored prices
+}
+
+class ScanResult(NamedTuple):
+    """run_scan() output. ranked is the full scored universe, best TotalScore first."""
+    ranked: pd.DataFrame
+    scan_date: str
+    universe: int                # Tickers in the snapshot
+    passed: int                  # Tickers through the hard filters
+    results_path: Optional[str]  # results_store file written (None if not persisted)
+    excel_path: Optional[str]    # Excel export written (None if not requested or failed)
+
+    def top(self, n=10):
+        return self.ranked.head(n)
+
+def run_scan(config=None):
+    """
+    Full scan: load + hard filters, normalize, score, history, explanations, output.
+    config overrides SCAN_CONFIG keys. Returns a ScanResult (ranked is empty if
+    there is no market data or nothing passed the filters).
+    """
+    cfg = {**SCAN_CONFIG, **(config or {})}
+    scan_date = datetime.date.today().isoformat()
+
+    # 1-2. Load Data + Hard Filters (filter columns first, everything else only for survivors)
+    if snapshot_store.latest_snapshot_date() is None and snapshot_store.migrate_legacy() is None:
+        print("No market data found. Please run data_update.py first.")
+        return ScanResult(pd.DataFrame(), scan_date, 0, 0, None, None)
+    universe = snapshot_store.snapshot_rows()
+    df = load_candidates(cfg["filters"])
+    if df.empty:
         print("No stocks passed the hard filters.")
-        # exit() 
-        
-    # 3. Normalization & Scoring
-    if not df_filtered.empty:
-        df_scored = normalize_metrics(df_filtered)
-        df_scored = calculate_final_score(df_scored)
-        
-        # 4. History Tracking
-        df_scored = update_history(df_scored)
-        
-        # 5. Explain
-        df_final = generate_explanations(df_scored)
-        
-        # 6. Output
-        cols = ["Rank", "Ticker", "Name", "TotalScore", "Rank_Delta", "AI_Insight", "Risk_Note", "Confidence", "AI_Version", "Sector", "Price", "ForwardPE", "EPS_Growth_3Y", "Rev_CAGR_3Y", "ROIC", "GrossMarginTrend", "RSI", "MA200", "Debt_EBITDA", "Beta", "Score_Quality", "Score_Growth", "Score_Valuation", "Score_Technicals", "Score_Risk"]
-        top10 = df_final.sort_values("TotalScore", ascending=False).head(10)[cols]
-        
-        print("\nTOP 10 STOCKS:")
-        pd.set_option('display.max_colwidth', 50)
-        print(top10[["Rank", "Ticker", "TotalScore", "AI_Insight", "Risk_Note"]].to_string(index=False))
-        
+        return ScanResult(df, scan_date, universe, 0, None, None)
+
+    # 3. DCF upside and price risk for every candidate at once, then Normalization & Scoring
+    df = dcf_engine.add_dcf_upside(df, cfg["dcf_assumptions"], cfg["dcf_sector_assumptions"])
+    df = risk_engine.add_risk_metrics(df, cfg["risk_benchmark"])
+    df = normalize_metrics(df)
+    df = calculate_final_score(df)
+
+    # Cache component scores for what-if rescoring (rescoring.py)
+    if cfg["score_cache"]:
+        with profiling.stage("build_score_cache"):
+            build_score_cache(df)
+
+    # 4. History Tracking
+    df = update_history(df, write=cfg["write_history"])
+
+    # 5. Explain
+    df = generate_explanations(df, top_n=cfg["explain_top_n"])
+    ranked = df.sort_values("TotalScore", ascending=False, kind="stable").reset_index(drop=True)
+
+    # 6. Output: the full ranked universe, Excel only on request
+    path = excel_path = None
+    if cfg["results_dir"]:
+        with profiling.stage("write_results", rows=len(ranked)):
+            path = results_store.write_results(ranked, scan_date, universe, cfg["results_dir"])
+        print(f"\nSaved {len(ranked)} ranked tickers to {path}")
+    if cfg["excel"]:
         try:
-            df_final.sort_values("TotalScore", ascending=False).head(20).to_excel(OUTPUT_FILE, index=False)
-            print(f"\nSaved top 20 to {OUTPUT_FILE}")
+            with profiling.stage("write_excel", rows=cfg["excel_rows"]):
+                ranked.head(cfg["excel_rows"]).to_excel(cfg["excel"], index=False)
+            excel_path = cfg["excel"]
+            print(f"Saved top {cfg['excel_rows']} to {excel_path}")
         except Exception as e:
             print(f"Error saving Excel: {e}")
-    else:
+    if path or excel_path:
+        # Tell a running dashboard to pick up the new scan
+        utils.bump_output_version("scanner")
+    return ScanResult(ranked, scan_date, universe, len(ranked), path, excel_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the latest market_data snapshot.")
+    parser.add_argument("--excel", nargs="?", const=OUTPUT_FILE, default=None,
+                        help=f"Also export the top rows to Excel (default path: {OUTPUT_FILE}).")
+    parser.add_argument("--excel-rows", type=int, default=EXPORT_TOP_N)
+    parser.add_argument("--no-history", action="store_true", help="Don't record this scan in the history store.")
+    args = parser.parse_args()
+
+    print("--- 5-STAR PRO SCANNER ---")
+    result = run_scan({"excel": args.excel, "excel_rows": args.excel_rows, "write_history": not args.no_history})
+    if result.ranked.empty:
         print("No stocks passed filtering.")
+        exit()
+
+    print("\nTOP 10 STOCKS:")
+    pd.set_option('display.max_colwidth', 50)
+    print(result.top(10)[["Rank", "Ticker", "TotalScore", "AI_Insight", "Risk_Note"]].to_string(index=False))
+    print(f"\n{result.passed} of {result.universe} tickers passed the hard filters.")
@@ -0,0 +1,189 @@
+import pandas as pd
+import numpy as np
+import argparse
+import datetime
+import heapq
+import itertools
+import scanner_pro
+import snapshot_store
+import dcf_engine
+import risk_engine
+import history_store
+import results_store
+import utils
+import profiling
+
+# Streaming scanner for universes that don't fit comfortably in memory (global listings, 50k+).
+# Same scores as scanner_pro, but the snapshot is never loaded whole:
+#   Pass 1  stream the snapshot with the hard filters pushed into the parquet scan, reading only
+#           Sector + the METRICS_CONFIG columns (+ dcf_engine inputs for DCF_Upside; risk_engine reads
+#           each batch's stored prices), and fold each batch into one percentile sketch per
+#           (sector, metric) plus one per metric for the whole universe.
+#   Pass 2  stream it again (all columns, same filter), score each batch against the sketches
+#           with normalize_metrics' rules and calculate_final_score, keep only a top-K heap.
+# Peak memory is one batch + groups x metrics x SKETCH_SIZE values + top-K rows, whatever the
+# universe size. Percentiles are exact while a group holds <= SKETCH_SIZE values and
+# approximate beyond (rank error of order 1 / SKETCH_SIZE).
+# Only the top-K rows are ranked, so this mode does not write a scan history partition;
+# Rank_Delta is still computed against the latest stored scan. The top-K rows go to their own
+# results_store file (STREAM_FILE), leaving scanner_pro's full ranked universe - what the app
+# pages through - in place; --excel adds the old spreadsheet export.
+# Usage: python scanner_stream.py --top 20 --batch-size 65536 [--excel]
+
+SKETCH_SIZE = 4096
+UNIVERSE = "__universe__" # Sketch key for universe-wide ranks (small-group fallback)
+NO_SECTOR = "__none__" # normalize_metrics groups missing sectors together
+SCAN_TIME_METRICS = ["DCF_Upside"] + risk_engine.RISK_COLUMNS # Added per batch, not stored in the snapshot
+
+class PercentileSketch:
+    """
+    Mergeable rank summary of one metric's values. Level 0 holds raw values; when a level
+    exceeds `size` it is sorted and every other value moves up a level with double weight.
+    Exact (pandas average-rank percentiles) until the first compaction.
+    """
+    def __init__(self, size=SKETCH_SIZE):
+        self.size = size
+        self.levels = [np.empty(0)] # levels[i] values each stand for 2**i observations
+        self.n = 0
+
+    def add(self, values):
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        level = 0
+        while len(self.levels[level]) > self.size:
+            data = np.sort(self.levels[level])
+            if len(data) % 2: # The odd value out stays at this level
+                self.levels[level], data = data[-1:], data[:-1]
+            else:
+                self.levels[level] = np.empty(0)
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], data[::2]])
+            level += 1
+
+    def percentile(self, values):
+        """0-100 average-rank percentile of each value within the sketch (NaN stays NaN)."""
+        less = np.zeros(len(values))
+        equal = np.zeros(len(values))
+        for i, level in enumerate(self.levels):
+            level = np.sort(level)
+            lo = np.searchsorted(level, values, side="left")
+            hi = np.searchsorted(level, values, side="right")
+            less += lo * 2 ** i
+            equal += (hi - lo) * 2 ** i
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pct = (less + (equal + 1) / 2) / self.n * 100
+        return np.where(np.isnan(values), np.nan, pct)
+
+def _signed(df, metric, metrics_config):
+    # Lower-is-better metrics are negated, as in normalize_metrics
+    return df[metric].to_numpy(dtype=np.float64) * (1.0 if metrics_config[metric] else -1.0)
+
+@profiling.profiled()
+def collect_sketches(filters=None, metrics_config=None, batch_size=snapshot_store.BATCH_SIZE,
+                     sketch_size=SKETCH_SIZE, date=None):
+    """Pass 1. Returns (sketches {(group, metric): sketch}, group row counts, rows passed)."""
+    metrics_config = metrics_config or scanner_pro.METRICS_CONFIG
+    stored = [m for m in metrics_config if m in snapshot_store.SCHEMA.names]
+    metrics = [m for m in metrics_config if m in stored or m in SCAN_TIME_METRICS]
+    columns = list(dict.fromkeys(["Ticker", "Sector"] + stored + dcf_engine.INPUT_COLUMNS))
+    sketches, counts, passed = {}, {}, 0
+    expr = scanner_pro.hard_filter_expression(filters)
+    for batch in snapshot_store.iter_batches(date, columns, expr, batch_size):
+        batch = risk_engine.add_risk_metrics(dcf_engine.add_dcf_upside(batch))
+        passed += len(batch)
+        groups = batch["Sector"].fillna(NO_SECTOR)
+        for group, idx in groups.groupby(groups, sort=False).indices.items():
+            counts[group] = counts.get(group, 0) + len(idx)
+            for m in metrics:
+                values = _signed(batch, m, metrics_config)[idx]
+                sketches.setdefault((group, m), PercentileSketch(sketch_size)).add(values)
+        for m in metrics:
+            sketches.setdefault((UNIVERSE, m), PercentileSketch(sketch_size)).add(_signed(batch, m, metrics_config))
+    return sketches, counts, passed
+
+def score_batch(df, sketches, counts, metrics_config=None, min_group_size=scanner_pro.MIN_GROUP_SIZE):
+    """Pass 2 scoring of one batch: normalize_metrics' Score_* columns from the sketches, then calculate_final_score."""
+    metrics_config = metrics_config or scanner_pro.METRICS_CONFIG
+    metrics = [m for m in metrics_config if m in df.columns]
+    groups = df["Sector"].fillna(NO_SECTOR)
+    small = groups.map(counts).fillna(0).to_numpy() < min_group_size
+    keys = np.where(small, UNIVERSE, groups.to_numpy(dtype=object))
+    positions = pd.Series(keys).groupby(keys, sort=False).indices
+    for m in metrics:
+        values = _signed(df, m, metrics_config)
+        scores = np.full(len(df), np.nan)
+        for key, idx in positions.items():
+            scores[idx] = sketches[(key, m)].percentile(values[idx])
+        df[f"Score_{m}"] = np.where(np.isnan(scores), 50, scores) # Fill NaN scores with 50 (Neutral)
+    df["NormSource"] = np.where(small, "Universe (Fallback)", "Sector")
+    return scanner_pro.calculate_final_score(df)
+
+@profiling.profiled()
+def stream_top_k(sketches, counts, top_k=scanner_pro.EXPORT_TOP_N, filters=None, metrics_config=None,
+                 batch_size=snapshot_store.BATCH_SIZE, date=None):
+    """Pass 2. Returns the top_k scored rows (best first) holding at most top_k rows between batches."""
+    heap = [] # (TotalScore, tiebreak, row): heap[0] is the weakest kept row
+    tiebreak = itertools.count()
+    expr = scanner_pro.hard_filter_expression(filters)
+    for batch in snapshot_store.iter_batches(date, None, expr, batch_size):
+        batch = risk_engine.add_risk_metrics(dcf_engine.add_dcf_upside(batch))
+        scored = score_batch(batch, sketches, counts, metrics_config)
+        for row in scored.nlargest(top_k, "TotalScore").to_dict("records"):
+            item = (row["TotalScore"], -next(tiebreak), row)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+    rows = [item[2] for item in sorted(heap, key=lambda x: x[:2], reverse=True)]
+    return pd.DataFrame(rows)
+
+def scan(top_k=scanner_pro.EXPORT_TOP_N, filters=None, batch_size=snapshot_store.BATCH_SIZE,
+         sketch_size=SKETCH_SIZE, date=None):
+    """Two-pass streaming scan. Returns the top_k rows with Rank, Rank_Delta and insights."""
+    sketches, counts, passed = collect_sketches(filters, None, batch_size, sketch_size, date)
+    print(f"Filters: {passed} tickers passed (streamed in batches of {batch_size}).")
+    if not passed:
+        return pd.DataFrame()
+    top = stream_top_k(sketches, counts, top_k, filters, None, batch_size, date)
+
+    # The top-K are the best scores overall, so their rank within top is their global rank
+    top["Rank"] = top["TotalScore"].rank(ascending=False)
+    prev_date = history_store.previous_date(datetime.date.today().isoformat())
+    if prev_date:
+        top["Rank_Delta"] = history_store.rank_delta(top, history_store.read_date(prev_date))
+    else:
+        top["Rank_Delta"] = 0
+    return scanner_pro.generate_explanations(top, top_n=top_k)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming two-pass scanner with bounded memory.")
+    parser.add_argument("--top", type=int, default=scanner_pro.EXPORT_TOP_N)
+    parser.add_argument("--batch-size", type=int, default=snapshot_store.BATCH_SIZE)
+    parser.add_argument("--sketch-size", type=int, default=SKETCH_SIZE)
+    parser.add_argument("--excel", nargs="?", const=scanner_pro.OUTPUT_FILE, default=None,
+                        help=f"Also export the top rows to Excel (default path: {scanner_pro.OUTPUT_FILE}).")
+    args = parser.parse_args()
+
+    print("--- 5-STAR PRO SCANNER (streaming) ---")
+    if snapshot_store.latest_snapshot_date() is None:
+        print("No market data found. Please run data_update.py first.")
+        exit()
+    df_final = scan(args.top, batch_size=args.batch_size, sketch_size=args.sketch_size)
+    if df_final.empty:
+        print("No stocks passed filtering.")
+        exit()
+
+    print("\nTOP 10 STOCKS:")
+    pd.set_option('display.max_colwidth', 50)
+    print(df_final.head(10)[["Rank", "Ticker", "TotalScore", "AI_Insight", "Risk_Note"]].to_string(index=False))
+    path = results_store.write_results(df_final, universe=snapshot_store.snapshot_rows(), name=results_store.STREAM_FILE)
+    print(f"\nSaved top {len(df_final)} to {path}")
+    if args.excel:
+        try:
+            df_final.to_excel(args.excel, index=False)
+            print(f"Saved top {len(df_final)} to {args.excel}")
+            utils.bump_output_version("scanner") # The app falls back to the Excel export when there is no full scan
+        except Exception as e:
+            print(f"Error saving Excel: {e}")
@@ -1,3 +1,11 @@
+import analysis_context
+import fundamentals
+import valuation
+import technicals
+import risk
+import profiling
+
+@profiling.profiled()
 def factor_scores(fundamentals, valuation, technicals, risk):
     """
     Aggregates scores from all modules and provides a final recommendation.
@@ -46,3 +54,23 @@ def factor_scores(fundamentals, valuation, technicals, risk):
             "Risk": round(r_score, 1)
         }
     }
+
+def analyze(data):
+    """
+    Runs the four analyzers on one shared AnalysisContext, then factor_scores.
+    Returns (fund_res, val_res, tech_res, risk_res, score_res); None if there is no data.
+    """
+    ctx = analysis_context.context(data)
+    if ctx is None:
+        return None
+    fund_res = fundamentals.analyze_fundamentals(ctx)
+    val_res = valuation.analyze_valuation(ctx)
+    tech_res = technicals.analyze_technicals(ctx)
+    risk_res = risk.analyze_risk(ctx)
+    return fund_res, val_res, tech_res, risk_res, factor_scores(fund_res, val_res, tech_res, risk_res)
+
+def analyze_many(datas):
+    """analyze() for many tickers; their technicals come from one batch-engine pass."""
+    contexts = [analysis_context.context(d) for d in datas]
+    technicals.prime_technicals(contexts)
+    return [analyze(c) for c in contexts]
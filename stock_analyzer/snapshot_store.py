@@ -0,0 +1,217 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import argparse
+import datetime
+import glob
+import os
+import profiling
+
+# Consolidated, date-partitioned store for the scanner's cross-sectional data.
+# One parquet file per scan date, every ticker in one file, one schema:
+#   market_data/snapshots/date=2026-01-08/snapshot.parquet
+# Replaces the legacy market_data/{TICKER}_data.parquet files (see migrate_legacy).
+
+MARKET_DATA_DIR = "market_data"
+SNAPSHOT_DIR = os.path.join(MARKET_DATA_DIR, "snapshots")
+SNAPSHOT_FILE = "snapshot.parquet"
+LEGACY_PATTERN = "*_data.parquet"
+ROW_GROUP_SIZE = 65536 # Bounds what a streaming read (iter_batches) decodes at once
+BATCH_SIZE = 65536
+
+# Shared schema for every ticker / every date. New fields are appended here;
+# older snapshots are conformed on read (missing columns come back as null).
+SCHEMA = pa.schema([
+    ("Ticker", pa.string()),
+    ("Name", pa.string()),
+    ("Sector", pa.string()),
+    ("AsOf", pa.date32()), # Date this row was last refreshed
+    ("Price", pa.float64()),
+    ("MA200", pa.float64()),
+    ("MA50", pa.float64()),
+    ("RSI", pa.float64()),
+    ("GrossMarginTrend", pa.float64()),
+    ("Beta", pa.float64()),
+    ("ForwardPE", pa.float64()),
+    ("PegRatio", pa.float64()),
+    ("Employees", pa.float64()),
+    ("EPS_Growth_3Y", pa.float64()),
+    ("ROIC", pa.float64()),
+    ("Rev_CAGR_3Y", pa.float64()),
+    ("FCF_Positive", pa.bool_()),
+    ("Debt_EBITDA", pa.float64()),
+    ("Vol_Avg", pa.float64()), # Volume / 20D average volume
+    ("Range_Pos", pa.float64()), # Position in 52W range (0 = low, 1 = high)
+    ("FCF", pa.float64()), # Latest annual free cash flow (dcf_engine input)
+    ("Shares", pa.float64()), # Shares outstanding (dcf_engine input)
+])
+
+def _partition_path(date, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"date={date}", SNAPSHOT_FILE)
+
+def _to_iso(date):
+    if date is None:
+        return datetime.date.today().isoformat()
+    return pd.Timestamp(date).date().isoformat()
+
+def conform(df):
+    """Coerces a frame to SCHEMA: fixed column order, fixed dtypes, missing columns as null."""
+    df = df.copy()
+    for field in SCHEMA:
+        if field.name not in df.columns:
+            df[field.name] = None
+    df = df[SCHEMA.names]
+    if df["AsOf"].notna().any():
+        df["AsOf"] = pd.to_datetime(df["AsOf"]).dt.date
+    for field in SCHEMA:
+        if pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").astype("float64")
+    df["FCF_Positive"] = df["FCF_Positive"].fillna(False).astype(bool)
+    return df.sort_values("Ticker").reset_index(drop=True)
+
+def write_snapshot(df, date=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Writes one scan date atomically: the file is written next to its final
+    location and os.replace'd in, so readers never see a partial snapshot.
+    Returns the written path.
+    """
+    date = _to_iso(date)
+    path = _partition_path(date, snapshot_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(conform(df), schema=SCHEMA, preserve_index=False)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp, path)
+    return path
+
+def list_snapshot_dates(snapshot_dir=SNAPSHOT_DIR):
+    """Sorted ISO dates that have a complete snapshot file."""
+    dates = []
+    for d in glob.glob(os.path.join(snapshot_dir, "date=*")):
+        if os.path.exists(os.path.join(d, SNAPSHOT_FILE)):
+            dates.append(os.path.basename(d).split("=", 1)[1])
+    return sorted(dates)
+
+def latest_snapshot_date(snapshot_dir=SNAPSHOT_DIR):
+    dates = list_snapshot_dates(snapshot_dir)
+    return dates[-1] if dates else None
+
+def snapshot_token(date=None, snapshot_dir=SNAPSHOT_DIR):
+    """Identity of one date's snapshot file; changes when a refresh replaces it (None if missing)."""
+    date = date or latest_snapshot_date(snapshot_dir)
+    if date is None:
+        return None
+    try:
+        st = os.stat(_partition_path(_to_iso(date), snapshot_dir))
+    except OSError:
+        return None
+    return (date, st.st_ino, st.st_mtime_ns, st.st_size)
+
+def snapshot_rows(date=None, snapshot_dir=SNAPSHOT_DIR):
+    """Row count of one date's snapshot from the parquet footer (0 if missing)."""
+    date = date or latest_snapshot_date(snapshot_dir)
+    if date is None:
+        return 0
+    return pq.ParquetFile(_partition_path(_to_iso(date), snapshot_dir)).metadata.num_rows
+
+def read_snapshot(date=None, columns=None, snapshot_dir=SNAPSHOT_DIR, filter=None, rows=None):
+    """
+    Single bulk read of one scan date (latest by default).
+    columns: projection pushed into the parquet read (unlisted columns are never decoded).
+    filter: pyarrow.compute expression evaluated inside the scan; row groups whose
+            statistics rule it out are skipped.
+    rows: row positions to keep (e.g. survivors of an earlier read of the filter columns),
+          taken before the conversion to pandas.
+    Returns an empty DataFrame when no snapshot exists.
+    """
+    date = date or latest_snapshot_date(snapshot_dir)
+    if date is None:
+        return pd.DataFrame()
+    path = _partition_path(_to_iso(date), snapshot_dir)
+    wanted = columns or SCHEMA.names
+    pf = pq.ParquetFile(path)
+    present = [c for c in wanted if c in pf.schema_arrow.names]
+    table = pf.read(columns=present) if filter is None else pq.read_table(path, columns=present, filters=filter)
+    profiling.count_file_read(path)
+    if rows is not None:
+        table = table.take(pa.array(rows, type=pa.int64()))
+    # Older snapshots may predate a schema addition
+    for name in wanted:
+        if name not in table.column_names:
+            field = SCHEMA.field(name)
+            table = table.append_column(field, pa.nulls(len(table), field.type))
+    return table.select(wanted).to_pandas()
+
+def iter_batches(date=None, columns=None, filter=None, batch_size=BATCH_SIZE, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Streams one scan date as DataFrames of at most batch_size rows. `columns` is pushed
+    into the parquet read as a projection and `filter` (a pyarrow.compute expression)
+    as a predicate, so only matching rows of the projected columns are ever decoded.
+    Columns missing from older snapshots come back as null, as in read_snapshot.
+    """
+    date = date or latest_snapshot_date(snapshot_dir)
+    if date is None:
+        return
+    path = _partition_path(_to_iso(date), snapshot_dir)
+    profiling.count_file_read(path)
+    dataset = ds.dataset(path, format="parquet", schema=SCHEMA)
+    for batch in dataset.to_batches(columns=columns or SCHEMA.names, filter=filter, batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+def merge_with_previous(records_df, date=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Carries forward rows from the latest earlier snapshot for tickers that were not
+    refreshed this run (failed fetch, --limit, ...), so a partial refresh never
+    shrinks the universe. AsOf keeps their original refresh date.
+    """
+    date = _to_iso(date)
+    prev_dates = [d for d in list_snapshot_dates(snapshot_dir) if d <= date]
+    if not prev_dates:
+        return records_df
+    prev = read_snapshot(prev_dates[-1], snapshot_dir=snapshot_dir)
+    if records_df.empty:
+        return prev
+    carried = prev[~prev["Ticker"].isin(records_df["Ticker"])]
+    if carried.empty:
+        return records_df
+    return pd.concat([conform(records_df), carried], ignore_index=True)
+
+def migrate_legacy(market_data_dir=MARKET_DATA_DIR, snapshot_dir=SNAPSHOT_DIR, remove=False):
+    """
+    One-time import of the legacy {TICKER}_data.parquet files into a snapshot.
+    AsOf comes from each file's mtime; the snapshot is dated by the newest file.
+    Returns the snapshot date, or None if there was nothing to migrate.
+    """
+    files = sorted(glob.glob(os.path.join(market_data_dir, LEGACY_PATTERN)))
+    if not files:
+        return None
+    print(f"Migrating {len(files)} legacy per-ticker files into {snapshot_dir}...")
+    frames = []
+    for f in files:
+        df = pd.read_parquet(f)
+        df["AsOf"] = datetime.date.fromtimestamp(os.stat(f).st_mtime)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    # Older files were written before Name was stored
+    df["Name"] = df["Name"].fillna(df["Ticker"]) if "Name" in df.columns else df["Ticker"]
+    date = max(df["AsOf"]).isoformat()
+    write_snapshot(df, date, snapshot_dir)
+    if remove:
+        for f in files:
+            os.remove(f)
+    print(f"Migration complete: snapshot {date} ({len(df)} tickers).")
+    return date
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the consolidated market_data snapshot store.")
+    parser.add_argument("--migrate", action="store_true", help="Import legacy {TICKER}_data.parquet files.")
+    parser.add_argument("--remove-legacy", action="store_true", help="Delete legacy files after migrating.")
+    args = parser.parse_args()
+
+    if args.migrate:
+        if migrate_legacy(remove=args.remove_legacy) is None:
+            print("No legacy files found.")
+    for d in list_snapshot_dates():
+        print(f"{d}: {pq.ParquetFile(_partition_path(d)).metadata.num_rows} tickers")
@@ -1,9 +1,8 @@
 # stock_picker_daily.py
-import yfinance as yf
+import providers
 import pandas as pd
 import numpy as np
-from ta.momentum import RSIIndicator
-from ta.trend import MACD
+import technicals # RSI / MACD from the batch engine (same Wilder / 12-26-9 definitions as the `ta` package)
 from datetime import datetime
 
 # -----------------------------
@@ -17,7 +16,7 @@ tickers = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'META', 'JPM', 'V',
 # -----------------------------
 def fundamental_score(ticker):
     try:
-        stock = yf.Ticker(ticker)
+        stock = providers.get_provider().ticker(ticker)
         info = stock.info
         score = 0
 
@@ -50,13 +49,13 @@ def fundamental_score(ticker):
 # -----------------------------
 def technical_score(ticker):
     try:
-        df = yf.download(ticker, period='6mo', interval='1d', progress=False)
+        df = providers.get_provider().ticker(ticker).history(period='6mo', interval='1d')
         if df.empty:
             return 0
 
         score = 0
         
-        # Ensure flat columns for ta library if MultiIndex
+        # Ensure flat columns if MultiIndex
         if isinstance(df.columns, pd.MultiIndex):
             df.columns = df.columns.get_level_values(0)
 
@@ -67,17 +66,16 @@ def technical_score(ticker):
             score += 5  # Bullish
 
         # RSI
-        rsi_series = RSIIndicator(df['Close'], window=14).rsi()
-        rsi = rsi_series.iloc[-1]
+        frames = technicals.technical_frames(df[['Close']])
+        rsi = frames['RSI']['Close'].iloc[-1]
         
         if rsi < 30:
             score += 5  # Oversold, potential buy
         elif rsi < 50:
             score += 3
 
-        # MACD
-        macd_series = MACD(df['Close']).macd_diff()
-        macd = macd_series.iloc[-1]
+        # MACD (histogram: MACD - signal)
+        macd = (frames['MACD']['Close'] - frames['MACD_Signal']['Close']).iloc[-1]
         
         if macd > 0:
             score += 5  # bullish
@@ -92,7 +90,7 @@ def technical_score(ticker):
 # -----------------------------
 def risk_score(ticker):
     try:
-        df = yf.download(ticker, period='1y', interval='1d', progress=False)
+        df = providers.get_provider().ticker(ticker).history(period='1y', interval='1d')
         if df.empty: return 0
         
         # Ensure flat columns
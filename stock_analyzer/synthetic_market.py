@@ -0,0 +1,220 @@
+import pandas as pd
+import numpy as np
+import random
+import time
+import zlib
+
+# Offline stand-in for yfinance used to test and benchmark the refresh pipeline.
+# Every payload is derived from a seed hashed from the ticker symbol, so the same
+# ticker always produces the same data regardless of thread scheduling or retries.
+
+SECTORS = [
+    "Information Technology", "Health Care", "Financials", "Consumer Discretionary",
+    "Communication Services", "Industrials", "Consumer Staples", "Energy",
+    "Utilities", "Real Estate", "Materials",
+]
+
+def _seed(symbol, salt=0):
+    return (zlib.crc32(symbol.encode()) + salt) % (2 ** 32)
+
+def synthetic_universe(n, prefix="T"):
+    """Returns a tickers_df shaped like data_update.get_sp500_tickers() with n synthetic names."""
+    tickers = [f"{prefix}{i:05d}" for i in range(n)]
+    return pd.DataFrame({
+        "Ticker": tickers,
+        "Sector": [SECTORS[_seed(t) % len(SECTORS)] for t in tickers],
+        "Security": [f"Synthetic Corp {t}" for t in tickers],
+    })
+
+def synthetic_history(symbol, days=252, end=None):
+    """Geometric random-walk OHLCV frame in the yfinance history() layout."""
+    rng = np.random.default_rng(_seed(symbol, 1))
+    end = pd.Timestamp(end or "2026-01-02").normalize()
+    dates = pd.bdate_range(end=end, periods=days, tz="America/New_York")
+    drift = rng.normal(0.0004, 0.0003)
+    vol = rng.uniform(0.01, 0.03)
+    close = rng.uniform(20, 400) * np.exp(np.cumsum(rng.normal(drift, vol, days)))
+    spread = close * rng.uniform(0.002, 0.02, days)
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 1, days) * spread / 2,
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": rng.integers(500_000, 50_000_000, days).astype(float),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=pd.DatetimeIndex(dates, name="Date"))
+
+def synthetic_statements(symbol, periods=4, end=None):
+    """Returns (financials, balance_sheet, cashflow) with metrics as rows and fiscal year-ends as columns (newest first)."""
+    rng = np.random.default_rng(_seed(symbol, 2))
+    last_fy = pd.Timestamp(end or "2025-09-30")
+    cols = [last_fy - pd.DateOffset(years=i) for i in range(periods)]
+    growth = rng.normal(0.06, 0.08)
+    revenue = rng.uniform(1e9, 1e11) / (1 + growth) ** np.arange(periods)
+    gross = revenue * rng.uniform(0.2, 0.7, periods)
+    ebit = revenue * rng.uniform(0.05, 0.3, periods)
+    fins = pd.DataFrame({
+        "Total Revenue": revenue,
+        "Gross Profit": gross,
+        "EBIT": ebit,
+        "EBITDA": ebit * 1.2,
+        "Net Income": ebit * 0.75,
+    }, index=cols).T
+    assets = revenue * rng.uniform(0.8, 2.5)
+    bs = pd.DataFrame({
+        "Total Assets": np.full(periods, assets),
+        "Total Current Liabilities": np.full(periods, assets * rng.uniform(0.1, 0.4)),
+        "Total Debt": np.full(periods, ebit[0] * rng.uniform(0, 5)),
+    }, index=cols).T
+    fcf = revenue * rng.normal(0.12, 0.1, periods)
+    bs.loc["Ordinary Shares Number"] = rng.uniform(5e7, 5e9) # Drawn last: earlier fields keep their values
+    cf = pd.DataFrame({
+        "Operating Cash Flow": fcf * 1.3,
+        "Free Cash Flow": fcf,
+    }, index=cols).T
+    return fins, bs, cf
+
+def synthetic_info(symbol):
+    rng = np.random.default_rng(_seed(symbol, 3))
+    return {
+        "symbol": symbol,
+        "longName": f"Synthetic Corp {symbol}",
+        "beta": float(rng.uniform(0.4, 2.0)),
+        "forwardPE": float(rng.uniform(8, 60)),
+        "trailingPE": float(rng.uniform(8, 70)),
+        "pegRatio": float(rng.uniform(0.5, 3.5)),
+        "fullTimeEmployees": int(rng.integers(1_000, 300_000)),
+        "earningsGrowth": float(rng.normal(0.08, 0.1)),
+        "returnOnEquity": float(rng.uniform(-0.05, 0.45)),
+        "debtToEquity": float(rng.uniform(0, 250)),
+        "profitMargins": float(rng.uniform(0.02, 0.35)),
+        "sharesOutstanding": int(rng.integers(50_000_000, 5_000_000_000)),
+    }
+
+def synthetic_snapshot(n, as_of=None, seed=0):
+    """
+    Scanner snapshot rows (snapshot_store.SCHEMA columns) for synthetic_universe(n), generated
+    column-wise so 50k tickers take well under a second. Roughly 5-10% of the optional metrics
+    are missing and about half the universe passes the hard filters, like the live data.
+    """
+    rng = np.random.default_rng(seed)
+    universe = synthetic_universe(n)
+    ma200 = rng.uniform(20, 400, n)
+    price = ma200 * np.exp(rng.normal(0.03, 0.15, n))
+
+    def with_gaps(values, frac):
+        values = values.astype(float)
+        values[rng.random(n) < frac] = np.nan
+        return values
+
+    df = pd.DataFrame({
+        "Ticker": universe["Ticker"],
+        "Name": universe["Security"],
+        "Sector": universe["Sector"],
+        "AsOf": pd.Timestamp(as_of or pd.Timestamp.today()).date(),
+        "Price": price,
+        "MA200": ma200,
+        "MA50": ma200 * np.exp(rng.normal(0.02, 0.08, n)),
+        "RSI": rng.uniform(15, 85, n),
+        "GrossMarginTrend": rng.normal(0.0, 0.03, n),
+        "Beta": with_gaps(rng.uniform(0.3, 2.2, n), 0.03),
+        "ForwardPE": with_gaps(rng.lognormal(3.0, 0.4, n), 0.05),
+        "PegRatio": with_gaps(rng.uniform(0.3, 4.0, n), 0.10),
+        "Employees": rng.integers(500, 300_000, n).astype(float),
+        "EPS_Growth_3Y": with_gaps(rng.normal(0.08, 0.15, n), 0.05),
+        "ROIC": with_gaps(rng.normal(0.12, 0.10, n), 0.05),
+        "Rev_CAGR_3Y": rng.normal(0.06, 0.08, n),
+        "FCF_Positive": rng.random(n) < 0.85,
+        "Debt_EBITDA": with_gaps(rng.lognormal(0.5, 0.9, n), 0.08),
+        "Vol_Avg": rng.lognormal(0.0, 0.3, n),
+        "Range_Pos": rng.uniform(0, 1, n),
+    })
+    # DCF inputs (FCF yield on market cap ~5%, some negative), drawn last so the columns above keep their values
+    shares = rng.lognormal(19.5, 1.0, n)
+    df["Shares"] = shares
+    df["FCF"] = with_gaps(price * shares * rng.normal(0.05, 0.04, n), 0.05)
+    return df
+
+def synthetic_scan_history(tickers, dates, seed=0):
+    """
+    Rows in the scan_history.csv layout (Ticker, TotalScore, Date, Rank), one block per date.
+    Scores follow a per-ticker random walk so rank deltas look like real day-to-day churn.
+    """
+    rng = np.random.default_rng(seed)
+    tickers = np.asarray(tickers)
+    score = rng.uniform(20, 80, len(tickers))
+    blocks = []
+    for d in dates:
+        score = np.clip(score + rng.normal(0, 2, len(tickers)), 0, 100)
+        blocks.append(pd.DataFrame({
+            "Ticker": tickers,
+            "TotalScore": score,
+            "Date": pd.Timestamp(d).date().isoformat(),
+            "Rank": pd.Series(score).rank(ascending=False).to_numpy(),
+        }))
+    return pd.concat(blocks, ignore_index=True)
+
+class SyntheticTicker:
+    """
+    Duck-typed replacement for yf.Ticker. Each network-style access sleeps for
+    `latency` seconds (+/- jitter) and fails with probability `failure_rate`.
+    """
+    def __init__(self, symbol, latency=0.0, jitter=0.0, failure_rate=0.0, rng=None):
+        self.symbol = symbol
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._rng = rng or random.Random()
+
+    def _call(self, fn):
+        if self.latency:
+            time.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise ConnectionError(f"Injected failure for {self.symbol}")
+        return fn()
+
+    @property
+    def info(self):
+        return self._call(lambda: synthetic_info(self.symbol))
+
+    def history(self, period="1y", interval="1d", start=None):
+        days = {"1y": 252, "2y": 504, "5y": 1260, "max": 2520}.get(period, 252)
+        hist = self._call(lambda: synthetic_history(self.symbol, days))
+        if start is not None:
+            hist = hist[hist.index >= pd.Timestamp(start).tz_localize(hist.index.tz)]
+        return hist
+
+    @property
+    def financials(self):
+        return self._call(lambda: synthetic_statements(self.symbol)[0])
+
+    @property
+    def balance_sheet(self):
+        return self._call(lambda: synthetic_statements(self.symbol)[1])
+
+    @property
+    def cashflow(self):
+        return self._call(lambda: synthetic_statements(self.symbol)[2])
+
+def make_ticker_factory(latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+    """
+    Returns a yf.Ticker-compatible factory for data_update.update_market_data(ticker_factory=...).
+    Latency / failure draws come from a per-symbol RNG seeded from (seed, symbol), so injected
+    faults are reproducible per seed whatever thread fetches the symbol.
+    """
+    def factory(symbol):
+        rng = random.Random(None if seed is None else _seed(symbol, seed))
+        return SyntheticTicker(symbol, latency, jitter, failure_rate, rng)
+
+    return factory
+
+class SyntheticProvider:
+    """providers.py-compatible provider over the synthetic data (STOCK_PROVIDER=synthetic[:n])."""
+    def __init__(self, n=500, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.n = n
+        self.name = f"synthetic:{n}"
+        self.ticker = make_ticker_factory(latency, jitter, failure_rate, seed)
+
+    def universe(self):
+        return synthetic_universe(self.n)
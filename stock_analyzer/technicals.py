@@ -1,5 +1,7 @@
 import pandas as pd
 import numpy as np
+import analysis_context
+import profiling
 
 def calculate_rsi(series, period=14):
     delta = series.diff()
@@ -8,28 +10,218 @@ def calculate_rsi(series, period=14):
     rs = gain / loss
     return 100 - (100 / (1 + rs))
 
+# ===== BATCH ENGINE =====
+# Every indicator is computed once over a (dates x tickers) matrix, so the whole
+# universe costs one rolling/ewm pass per indicator instead of one per ticker.
+# Both data_update (scanner snapshot) and analyze_technicals (single stock) use it.
+
+TECHNICAL_COLUMNS = ["Price", "SMA50", "SMA200", "RSI", "MACD", "MACD_Signal",
+                     "Vol_Ratio", "Low_52W", "High_52W", "Range_Pos"]
+
+def price_matrix(histories, fields=("Close", "Volume")):
+    """
+    Aligns per-ticker history frames {ticker: hist} on a shared (union) date index.
+    Returns one (dates x tickers) DataFrame per field, NaN where a ticker has no bar.
+    """
+    tickers, days = [], []
+    for t, h in histories.items():
+        if h is None or h.empty:
+            continue
+        idx = pd.DatetimeIndex(h.index)
+        if idx.tz is not None:
+            idx = idx.tz_localize(None)
+        tickers.append(t)
+        days.append(idx.values.astype("datetime64[D]"))
+    all_days = np.unique(np.concatenate(days)) if days else np.array([], dtype="datetime64[D]")
+    mats = {f: np.full((len(all_days), len(tickers)), np.nan) for f in fields}
+    for j, t in enumerate(tickers):
+        rows = np.searchsorted(all_days, days[j])
+        for f in fields:
+            # Duplicate days resolve to the last bar, as fancy assignment keeps the last write
+            mats[f][rows, j] = histories[t][f].to_numpy(dtype=np.float64)
+    index = pd.DatetimeIndex(all_days.astype("datetime64[ns]"), name="Date")
+    return tuple(pd.DataFrame(mats[f], index=index, columns=tickers) for f in fields)
+
+def _rolling_mean(x, window):
+    """Trailing mean along axis 0; NaN unless the full window is present (pandas rolling(window).mean())."""
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    ccount = np.cumsum(valid, axis=0)
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    total = csum[window - 1:].copy()
+    total[1:] -= csum[:-window]
+    count = ccount[window - 1:].copy()
+    count[1:] -= ccount[:-window]
+    out[window - 1:] = np.where(count == window, total / window, np.nan)
+    return out
+
+def _rolling_extreme(x, window, fn):
+    """
+    Trailing min/max along axis 0 over the up-to-`window` bars available (fn = np.fmin / np.fmax,
+    which skip NaN), as hist.tail(window).min() / .max(): a 52-week range does not need 252 bars.
+    """
+    if len(x) == 0:
+        return np.full(x.shape, np.nan)
+    padded = np.vstack([np.full((window - 1, x.shape[1]), np.nan), x])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0)
+    return fn.reduce(windows, axis=-1) # All-NaN window -> NaN
+
+def _pack(valid):
+    """
+    Row positions that move each column's valid entries to the bottom of a (bars x tickers)
+    matrix, in order, with leading NaN padding. Returns (rows, cols, packed rows, packed length).
+    """
+    counts = valid.sum(axis=0)
+    length = int(counts.max()) if counts.size else 0
+    rows, cols = np.nonzero(valid)
+    packed = (length - counts)[cols] + (np.cumsum(valid, axis=0) - 1)[rows, cols]
+    return rows, cols, packed, length
+
+def _ewm_mean(x, alpha):
+    """
+    ewm(alpha=..., adjust=False).mean() along axis 0, vectorized across tickers.
+    Mirrors pandas' NaN handling: leading NaNs stay NaN, gaps carry the last value.
+    The recursion is a Python loop over dates, so long/narrow matrices (one stock's
+    full history) are handed to pandas' compiled per-column loop instead.
+    """
+    if x.shape[1] < len(x) // 2:
+        return pd.DataFrame(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    out = np.empty(x.shape)
+    weighted = x[0].copy()
+    old_wt = np.ones(x.shape[1])
+    out[0] = weighted
+    for i in range(1, len(x)):
+        cur = x[i]
+        obs = ~np.isnan(cur)
+        started = ~np.isnan(weighted)
+        old_wt = np.where(started, old_wt * (1 - alpha), old_wt)
+        upd = started & obs
+        weighted = np.where(upd, (old_wt * weighted + alpha * cur) / (old_wt + alpha), weighted)
+        weighted = np.where(~started & obs, cur, weighted)
+        old_wt = np.where(obs, 1.0, old_wt)
+        out[i] = weighted
+    return out
+
+def technical_frames(close, volume=None):
+    """
+    Full indicator time series for a (dates x tickers) close matrix, one wide frame per indicator.
+    Each ticker's indicators roll over its own bars: on a union calendar (mixed exchanges, a
+    missing or extra bar) the columns are packed to their valid closes, computed, and scattered
+    back, so a ticker gets the same values as on its own series. Dates without a close are NaN.
+    """
+    full = close.to_numpy(dtype=np.float64)
+    if len(full) == 0:
+        return {name: close.astype(float) for name in TECHNICAL_COLUMNS}
+    valid = ~np.isnan(full)
+    v_full = volume.reindex_like(close).to_numpy(dtype=np.float64) if volume is not None else None
+    if valid.all():
+        c, v = full, v_full
+    else:
+        rows, cols, packed, length = _pack(valid)
+        c = np.full((length, full.shape[1]), np.nan)
+        c[packed, cols] = full[rows, cols]
+        if v_full is not None:
+            v = np.full(c.shape, np.nan)
+            v[packed, cols] = v_full[rows, cols]
+    arrays = {
+        "Price": c,
+        "SMA50": _rolling_mean(c, 50),
+        "SMA200": _rolling_mean(c, 200),
+        "Low_52W": _rolling_extreme(c, 252, np.fmin),
+        "High_52W": _rolling_extreme(c, 252, np.fmax),
+    }
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # RSI (14), Wilder smoothing (com=13)
+        delta = np.vstack([np.full((1, c.shape[1]), np.nan), np.diff(c, axis=0)])
+        ema_up = _ewm_mean(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), 1 / 14)
+        ema_down = _ewm_mean(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), 1 / 14)
+        arrays["RSI"] = 100 - (100 / (1 + ema_up / ema_down))
+
+        # MACD (12, 26, 9)
+        macd = _ewm_mean(c, 2 / 13) - _ewm_mean(c, 2 / 27)
+        arrays["MACD"] = macd
+        arrays["MACD_Signal"] = _ewm_mean(macd, 2 / 10)
+
+        if v_full is not None:
+            avg_vol = _rolling_mean(v, 20)
+            arrays["Vol_Ratio"] = np.where(avg_vol > 0, v / avg_vol, 1.0)
+
+        rng = arrays["High_52W"] - arrays["Low_52W"]
+        arrays["Range_Pos"] = np.where(rng > 0, (c - arrays["Low_52W"]) / rng, np.nan)
+
+    if not valid.all():
+        # Scatter back from each ticker's own bars to the shared calendar
+        for name, a in arrays.items():
+            out = np.full(full.shape, np.nan)
+            out[rows, cols] = a[packed, cols]
+            arrays[name] = out
+    return {name: pd.DataFrame(a, index=close.index, columns=close.columns) for name, a in arrays.items()}
+
+def compute_technicals(close, volume=None):
+    """
+    Latest technicals for every ticker in a (dates x tickers) close matrix.
+    Values are taken at each ticker's last available bar, so stale or
+    halted names still get their own latest reading.
+    Returns a DataFrame indexed by ticker with TECHNICAL_COLUMNS.
+    """
+    frames = technical_frames(close, volume)
+    valid = close.notna().to_numpy()
+    n_dates = len(close)
+    last_pos = n_dates - 1 - np.argmax(valid[::-1], axis=0)
+    cols = np.arange(close.shape[1])
+    out = {name: frames[name].to_numpy()[last_pos, cols] if name in frames else np.full(len(cols), np.nan)
+           for name in TECHNICAL_COLUMNS}
+    out = pd.DataFrame(out, index=close.columns)
+    out.loc[~valid.any(axis=0)] = np.nan
+    return out
+
+def context_technicals(ctx):
+    """Latest TECHNICAL_COLUMNS for one AnalysisContext (batch engine on a single-column matrix), memoized."""
+    def compute():
+        history = ctx.history
+        return compute_technicals(history[["Close"]].set_axis([ctx.symbol], axis=1),
+                                  history[["Volume"]].set_axis([ctx.symbol], axis=1)).iloc[0]
+    return ctx.memo("technicals", compute)
+
+def prime_technicals(contexts):
+    """
+    Fills the technicals of many AnalysisContexts with one batch-engine pass over their
+    aligned price matrix. Every column rolls over its own bars, so the values are the same
+    as one pass per ticker whatever the tickers' trading calendars.
+    """
+    contexts = [c for c in contexts if c is not None and c.has_history() and not c.is_cached("technicals")]
+    if not contexts:
+        return
+    keys = [str(i) for i in range(len(contexts))] # Positional keys: symbols may repeat
+    close, volume = price_matrix({k: c.history for k, c in zip(keys, contexts)})
+    tech = compute_technicals(close, volume)
+    for k, c in zip(keys, contexts):
+        c.put("technicals", tech.loc[k].rename(c.symbol))
+
+@profiling.profiled()
 def analyze_technicals(data):
     """
     Analyzes technical indicators (SMA, RSI, MACD) and returns a score/signal.
+    `data` is a get_stock_data dict or an AnalysisContext.
     """
-    if data is None:
-        return None
-        
-    history = data.get("history")
-    if history is None or history.empty:
+    ctx = analysis_context.context(data)
+    if ctx is None or not ctx.has_history():
         return None
     
-    # Use Close price
-    close = history["Close"]
+    # Indicators from the batch engine (single-column matrix, or primed for a batch)
+    tech = context_technicals(ctx)
     
     metrics = {}
     scores = {}
     reasons = []
 
     # 1. Moving Averages
-    sma_50 = close.rolling(window=50).mean().iloc[-1]
-    sma_200 = close.rolling(window=200).mean().iloc[-1]
-    current_price = close.iloc[-1]
+    sma_50 = tech["SMA50"]
+    sma_200 = tech["SMA200"]
+    current_price = tech["Price"]
     
     metrics["SMA 50"] = sma_50
     metrics["SMA 200"] = sma_200
@@ -49,15 +241,7 @@ def analyze_technicals(data):
         scores["Trend"] = 4 # Choppy
         
     # 2. RSI (14)
-    # Manual RSI calc to avoid 'ta' dependency issues if library missing
-    delta = close.diff()
-    up = delta.clip(lower=0)
-    down = -1 * delta.clip(upper=0)
-    ema_up = up.ewm(com=13, adjust=False).mean()
-    ema_down = down.ewm(com=13, adjust=False).mean()
-    rs = ema_up / ema_down
-    rsi = 100 - (100 / (1 + rs))
-    current_rsi = rsi.iloc[-1]
+    current_rsi = tech["RSI"]
     
     metrics["RSI (14)"] = current_rsi
     
@@ -71,13 +255,8 @@ def analyze_technicals(data):
         reasons.append("Overbought (RSI > 70)")
         
     # 3. MACD
-    exp1 = close.ewm(span=12, adjust=False).mean()
-    exp2 = close.ewm(span=26, adjust=False).mean()
-    macd = exp1 - exp2
-    signal = macd.ewm(span=9, adjust=False).mean()
-    
-    metrics["MACD"] = macd.iloc[-1]
-    if macd.iloc[-1] > signal.iloc[-1]:
+    metrics["MACD"] = tech["MACD"]
+    if tech["MACD"] > tech["MACD_Signal"]:
         scores["Momentum"] = 8
         reasons.append("Bullish MACD Cross")
     else:
@@ -85,29 +264,27 @@ def analyze_technicals(data):
         
     # 4. Volume Spike / Demand
     # Current Vol vs 20-Day Avg Vol
-    vol = history["Volume"]
-    avg_vol = vol.rolling(window=20).mean().iloc[-1]
-    curr_vol = vol.iloc[-1]
-    metrics["Vol/Avg"] = curr_vol / avg_vol if avg_vol > 0 else 1.0
+    vol_ratio = tech["Vol_Ratio"]
+    metrics["Vol/Avg"] = vol_ratio
     
-    if curr_vol > 1.5 * avg_vol:
+    if vol_ratio > 1.5:
         scores["Volume"] = 10
         reasons.append("High Volume Spike (>1.5x Avg)")
-    elif curr_vol > avg_vol:
+    elif vol_ratio > 1:
         scores["Volume"] = 7
     else:
         scores["Volume"] = 5
         
     # 5. Support / Risk Reward
     # Proximity to 52-Week Low (Buying near support is safer)
-    low_52 = close.rolling(window=252).min().iloc[-1]
-    high_52 = close.rolling(window=252).max().iloc[-1]
+    low_52 = tech["Low_52W"]
+    high_52 = tech["High_52W"]
     metrics["52W Low"] = low_52
     metrics["52W High"] = high_52
     
     # Position in Range (0 = at Low, 1 = at High)
     if high_52 > low_52:
-        range_pos = (current_price - low_52) / (high_52 - low_52)
+        range_pos = tech["Range_Pos"]
         metrics["Range Pos"] = range_pos
         
         if range_pos < 0.20:
@@ -0,0 +1,277 @@
+import pandas as pd
+import numpy as np
+import argparse
+import datetime
+import json
+import os
+import providers
+import profiling
+
+# Local universe registry. The constituent list is fetched (S&P 500 from the data provider, or any
+# local CSV) only when the cached copy is stale, and every distinct membership is kept, so the
+# refresh starts without network / HTML parsing and a backtest can ask who was in the index on a date.
+# Layout per universe:
+#   market_data/universe/{name}/index.json               {"source", "checked", "versions": [dates]}
+#   market_data/universe/{name}/members_YYYY-MM-DD.parquet  Ticker, Sector, Security (one per change)
+#   market_data/universe/{name}/changes.parquet          Date, Ticker, Action (add/remove), Security, Source
+# Changes come from diffing consecutive versions ("refresh") and, for the S&P 500, from the
+# provider's published change list ("provider"), which reaches back before the first version.
+# Universe specs: "sp500" (default) or a CSV path ("universes/tsx.csv", needs a Ticker column;
+# Sector / Security are optional). A CSV is re-read whenever the file changes.
+# Usage: python universe.py [--universe sp500] [--refresh] [--changes 20] [--on 2024-06-28]
+
+UNIVERSE_DIR = os.path.join("market_data", "universe")
+INDEX_FILE = "index.json"
+CHANGES_FILE = "changes.parquet"
+DEFAULT_UNIVERSE = "sp500"
+MAX_AGE_DAYS = 7 # Index changes are announced days ahead; a weekly re-check is enough
+COLUMNS = ["Ticker", "Sector", "Security"]
+CHANGE_COLUMNS = ["Date", "Ticker", "Action", "Security", "Source"]
+# Only live fetches are cached; replay/synthetic providers are local already and must not
+# overwrite the live registry
+CACHED_PROVIDERS = ("yfinance", "record:")
+
+def registry_name(spec):
+    """Registry name for a universe spec (CSV files are keyed by their file name)."""
+    if spec.lower().endswith(".csv"):
+        return os.path.splitext(os.path.basename(spec))[0]
+    return spec
+
+def _dir(name, root=UNIVERSE_DIR):
+    return os.path.join(root, name)
+
+def _version_path(name, date, root=UNIVERSE_DIR):
+    return os.path.join(_dir(name, root), f"members_{date}.parquet")
+
+def load_index(name, root=UNIVERSE_DIR):
+    path = os.path.join(_dir(name, root), INDEX_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"versions": []}
+
+def _save_index(name, index, root=UNIVERSE_DIR):
+    """tmp + rename, as market_cache.save_manifest."""
+    path = os.path.join(_dir(name, root), INDEX_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, path)
+
+def _write_parquet(df, path):
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def conform(df):
+    """Ticker / Sector / Security frame, one row per ticker (CSV and provider lists alike)."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    df = df.rename(columns={"Symbol": "Ticker", "GICS Sector": "Sector", "Name": "Security"})
+    if "Ticker" not in df.columns:
+        raise ValueError("Universe list needs a Ticker column")
+    df = df.copy()
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df["Ticker"] = df["Ticker"].astype(str).str.strip()
+    df = df[df["Ticker"] != ""].drop_duplicates("Ticker")
+    return df[COLUMNS].sort_values("Ticker").reset_index(drop=True)
+
+def read_version(name, date, root=UNIVERSE_DIR):
+    return pd.read_parquet(_version_path(name, date, root))
+
+def latest(name=DEFAULT_UNIVERSE, root=UNIVERSE_DIR):
+    """Cached members of the newest version (empty frame if never fetched)."""
+    versions = load_index(name, root)["versions"]
+    if not versions:
+        return pd.DataFrame(columns=COLUMNS)
+    return read_version(name, versions[-1], root)
+
+def read_changes(name=DEFAULT_UNIVERSE, root=UNIVERSE_DIR):
+    path = os.path.join(_dir(name, root), CHANGES_FILE)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    return pd.read_parquet(path)
+
+def parse_changes(changes):
+    """Provider change list (Date, Ticker, Action[, Security]) -> CHANGE_COLUMNS rows, ISO dates."""
+    if changes is None or changes.empty:
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    out = changes.copy()
+    out["Date"] = pd.to_datetime(out["Date"], errors="coerce", format="mixed")
+    out = out.dropna(subset=["Date", "Ticker"])
+    out["Date"] = out["Date"].dt.date.map(datetime.date.isoformat)
+    if "Security" not in out.columns:
+        out["Security"] = None
+    out["Source"] = "provider"
+    return out[CHANGE_COLUMNS]
+
+def record(name, members, source, provider_changes=None, today=None, root=UNIVERSE_DIR):
+    """
+    Stores a freshly fetched member list. A new version is written only when membership differs
+    from the latest one; the diff (adds/removes dated today) is appended to the change log unless
+    the provider's own change list already dated that event. Returns the change log rows added.
+    """
+    today = (today or datetime.date.today()).isoformat()
+    os.makedirs(_dir(name, root), exist_ok=True)
+    index = load_index(name, root)
+    versions = index["versions"]
+    members = conform(members)
+
+    log = read_changes(name, root)
+    new_rows = parse_changes(provider_changes)
+    changed = True
+    if versions:
+        prev = read_version(name, versions[-1], root)
+        old_set, new_set = set(prev["Ticker"]), set(members["Ticker"])
+        if old_set != new_set:
+            diff = [(t, "add") for t in sorted(new_set - old_set)] + [(t, "remove") for t in sorted(old_set - new_set)]
+            print(f"Universe {name} changed: " + ", ".join(f"{'+' if a == 'add' else '-'}{t}" for t, a in diff))
+            # Events the provider already dated since the last version keep the provider's date
+            known = pd.concat([log, new_rows]) if not new_rows.empty else log
+            known = known[known["Date"] > versions[-1]]
+            known = set(zip(known["Ticker"], known["Action"]))
+            names = dict(zip(prev["Ticker"], prev["Security"])) | dict(zip(members["Ticker"], members["Security"]))
+            diff = pd.DataFrame([{"Date": today, "Ticker": t, "Action": a, "Security": names.get(t), "Source": "refresh"}
+                                 for t, a in diff if (t, a) not in known], columns=CHANGE_COLUMNS)
+            new_rows = pd.concat([new_rows, diff], ignore_index=True) if not new_rows.empty else diff
+        changed = not prev.fillna("").astype(str).equals(members.fillna("").astype(str))
+
+    seen = set(zip(log["Date"], log["Ticker"], log["Action"]))
+    new_rows = new_rows.drop_duplicates(["Date", "Ticker", "Action"])
+    added = new_rows[[k not in seen for k in zip(new_rows["Date"], new_rows["Ticker"], new_rows["Action"])]]
+    if not added.empty:
+        merged = pd.concat([log, added], ignore_index=True) if not log.empty else added
+        _write_parquet(merged.sort_values(["Date", "Action", "Ticker"]).reset_index(drop=True),
+                       os.path.join(_dir(name, root), CHANGES_FILE))
+
+    if changed:
+        _write_parquet(members, _version_path(name, today, root))
+        if not versions or versions[-1] != today:
+            versions.append(today)
+    index.update({"source": source, "checked": datetime.datetime.now().isoformat(timespec="seconds"),
+                  "versions": versions})
+    _save_index(name, index, root)
+    return added
+
+def is_stale(index, max_age_days=MAX_AGE_DAYS, source_mtime=None):
+    if not index.get("versions") or not index.get("checked"):
+        return True
+    checked = datetime.datetime.fromisoformat(index["checked"])
+    if source_mtime is not None and datetime.datetime.fromtimestamp(source_mtime) > checked:
+        return True
+    return datetime.datetime.now() - checked > datetime.timedelta(days=max_age_days)
+
+def fetch(spec, provider=None):
+    """(members, provider change list or None) straight from the source, bypassing the registry."""
+    if spec.lower().endswith(".csv"):
+        return conform(pd.read_csv(spec)), None
+    if spec != DEFAULT_UNIVERSE:
+        raise ValueError(f"Unknown universe: {spec} (use {DEFAULT_UNIVERSE} or a CSV path)")
+    provider = provider or providers.get_provider()
+    members = provider.universe()
+    changes = provider.universe_changes() if hasattr(provider, "universe_changes") else None
+    return members, changes
+
+@profiling.profiled("universe")
+def load(spec=DEFAULT_UNIVERSE, provider=None, max_age_days=MAX_AGE_DAYS, refresh=False, root=UNIVERSE_DIR):
+    """
+    Universe members (Ticker, Sector, Security). Served from the registry while it is fresh;
+    otherwise fetched and recorded. A failed or empty fetch falls back to the cached copy.
+    """
+    provider = provider or providers.get_provider()
+    is_csv = spec.lower().endswith(".csv")
+    if not is_csv and not provider.name.startswith(CACHED_PROVIDERS):
+        return provider.universe()
+
+    name = registry_name(spec)
+    index = load_index(name, root)
+    mtime = os.path.getmtime(spec) if is_csv and os.path.exists(spec) else None
+    if not refresh and not is_stale(index, max_age_days, mtime):
+        return latest(name, root)
+
+    try:
+        members, changes = fetch(spec, provider)
+    except Exception as e:
+        print(f"Error fetching universe {spec}: {e}")
+        members, changes = pd.DataFrame(), None
+    if members is None or members.empty:
+        cached = latest(name, root)
+        if not cached.empty:
+            print(f"Using cached {name} universe ({len(cached)} tickers, checked {index.get('checked')}).")
+        return cached
+
+    record(name, members, source=spec if is_csv else provider.name, provider_changes=changes, root=root)
+    return latest(name, root)
+
+def members_on(date, name=DEFAULT_UNIVERSE, root=UNIVERSE_DIR, changes=None, _versions=None):
+    """
+    Set of tickers in the universe on `date`: the first stored version on/after the date with the
+    logged changes in between undone (or the latest version with later changes applied).
+    None if the universe was never recorded.
+    """
+    versions = load_index(name, root)["versions"]
+    if not versions:
+        return None
+    day = pd.Timestamp(date).date().isoformat()
+    changes = read_changes(name, root) if changes is None else changes
+    after = [v for v in versions if v >= day]
+    if after:
+        base = after[0]
+        steps = changes[(changes["Date"] > day) & (changes["Date"] <= base)].sort_values("Date", ascending=False)
+        undo = True
+    else:
+        base = versions[-1]
+        steps = changes[(changes["Date"] > base) & (changes["Date"] <= day)].sort_values("Date")
+        undo = False
+    if _versions is None or base not in _versions:
+        tickers = set(read_version(name, base, root)["Ticker"])
+        if _versions is not None:
+            _versions[base] = tickers
+    else:
+        tickers = _versions[base]
+    members = set(tickers)
+    for ticker, action in zip(steps["Ticker"], steps["Action"]):
+        if (action == "add") != undo:
+            members.add(ticker)
+        else:
+            members.discard(ticker)
+    return members
+
+def member_sets(dates, name=DEFAULT_UNIVERSE, root=UNIVERSE_DIR):
+    """{date: members_on(date)} for many dates (each stored version read once), or None if never recorded."""
+    if not load_index(name, root)["versions"]:
+        return None
+    changes, cache = read_changes(name, root), {}
+    return {d: members_on(d, name, root, changes, cache) for d in pd.DatetimeIndex(dates)}
+
+def membership(dates, tickers, name=DEFAULT_UNIVERSE, root=UNIVERSE_DIR, sets=None):
+    """(dates x tickers) bool frame of point-in-time membership, or None if the universe was never recorded."""
+    sets = sets if sets is not None else member_sets(dates, name, root)
+    if sets is None:
+        return None
+    tickers = pd.Index(tickers)
+    return pd.DataFrame(np.array([tickers.isin(list(sets[d])) for d in pd.DatetimeIndex(dates)]).reshape(len(dates), len(tickers)),
+                        index=pd.DatetimeIndex(dates), columns=tickers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show / refresh the cached universe lists.")
+    parser.add_argument("--universe", default=DEFAULT_UNIVERSE, help="sp500 or a CSV path.")
+    parser.add_argument("--refresh", action="store_true", help="Fetch now even if the cached copy is fresh.")
+    parser.add_argument("--changes", type=int, default=10, help="Show the N most recent changes.")
+    parser.add_argument("--on", default=None, help="Show the member count on a past date.")
+    parser.add_argument("--provider", default=None)
+    args = parser.parse_args()
+
+    members = load(args.universe, providers.get_provider(args.provider), refresh=args.refresh)
+    name = registry_name(args.universe)
+    index = load_index(name)
+    print(f"{name}: {len(members)} tickers, checked {index.get('checked')}, "
+          f"{len(index['versions'])} versions ({', '.join(index['versions'][-3:])})")
+    log = read_changes(name)
+    if not log.empty:
+        print(log.tail(args.changes).to_string(index=False))
+    if args.on:
+        on = members_on(args.on, name)
+        print(f"Members on {args.on}: {len(on) if on is not None else 'unknown'}")
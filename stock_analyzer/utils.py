@@ -1,6 +1,7 @@
 import pandas as pd
 import json
 import os
+import datetime
 
 def format_number(num, decimals=2):
     """
@@ -80,3 +81,30 @@ def toggle_watchlist(ticker):
         msg = "Added to"
     save_watchlist(wl)
     return msg
+
+# ===== OUTPUT VERSION STAMP =====
+# data_update.py / scanner_pro.py bump their entry when they finish writing; the app keys
+# its caches on these stamps so new output is picked up on the next rerun.
+OUTPUT_VERSION_FILE = "output_version.json"
+
+def load_output_versions(root="market_data"):
+    path = os.path.join(root, OUTPUT_VERSION_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except:
+            pass
+    return {}
+
+def bump_output_version(kind, root="market_data"):
+    """Records that `kind` ("data_update" / "scanner") just produced new output."""
+    versions = load_output_versions(root)
+    versions[kind] = datetime.datetime.now().isoformat(timespec="microseconds")
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, OUTPUT_VERSION_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(versions, f)
+    os.replace(tmp, path)
+    return versions[kind]
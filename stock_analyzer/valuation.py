@@ -1,16 +1,21 @@
 import pandas as pd
 import numpy as np
+import analysis_context
+import dcf_engine
+import profiling
 
+@profiling.profiled()
 def analyze_valuation(data):
     """
     Analyzes valuation metrics (P/E, DCF) and returns a score (0->Overvalued, 10->Undervalued).
     Note: High score = Good Value (Undervalued).
+    `data` is a get_stock_data dict or an AnalysisContext.
     """
-    if data is None:
+    ctx = analysis_context.context(data)
+    if ctx is None:
         return None
         
-    info = data.get("info", {})
-    cashflow = data.get("cashflow")
+    info = ctx.info
     
     metrics = {}
     scores = {}
@@ -68,24 +73,19 @@ def analyze_valuation(data):
 
     # 3. Simple DCF (Discounted Cash Flow)
     # Value = FCF / (Discount Rate - Growth Rate) (Gordon Growth for Terminal)
-    # Using simplistic 5Y growth phase + Terminal
+    # Using simplistic 5Y growth phase + Terminal (dcf_engine, same assumptions as the scanner)
     try:
         shares_outstanding = info.get("sharesOutstanding", 1)
-        fcf = cashflow.loc["Free Cash Flow"].iloc[0] if "Free Cash Flow" in cashflow.index else 0
+        if ctx.statement("cashflow") is None:
+            raise ValueError("No cash flow statement")
+        fcf = ctx.latest("cashflow", "Free Cash Flow")
         
         if fcf > 0:
-            growth_rate = 0.08 # Conservative 8% growth assumption
-            discount_rate = 0.10 # 10% discount rate
-            terminal_growth = 0.03
-            
-            # 5 Year Projection
-            future_cashflows = [fcf * ((1 + growth_rate) ** i) for i in range(1, 6)]
-            terminal_value = (future_cashflows[-1] * (1 + terminal_growth)) / (discount_rate - terminal_growth)
-            
-            dcf_value = sum([fc / ((1 + discount_rate) ** (i+1)) for i, fc in enumerate(future_cashflows)])
-            dcf_value += terminal_value / ((1 + discount_rate) ** 5)
-            
-            intrinsic_value = dcf_value / shares_outstanding
+            a = dcf_engine.assumptions_for([info.get("sector")])
+            intrinsic_value = float(np.ravel(dcf_engine.intrinsic_value(
+                fcf, float(shares_outstanding), a["growth"], a["discount"], a["terminal"], a["years"]))[0])
+            if np.isnan(intrinsic_value):
+                raise ValueError("DCF undefined (shares outstanding / discount rate)")
             metrics["Intrinsic Value (DCF)"] = intrinsic_value
             
             # Upside
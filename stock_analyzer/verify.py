@@ -10,6 +10,7 @@ import valuation
 import technicals
 import risk
 import scoring
+import analysis_context
 
 def test_pipeline(ticker="AAPL"):
     print(f"--- Testing Pipeline for {ticker} ---")
@@ -20,21 +21,22 @@ def test_pipeline(ticker="AAPL"):
         print("FAILED: Could not fetch data.")
         return
     print("MATCH: Data fetched successfully.")
+    ctx = analysis_context.AnalysisContext(data) # Shared by the four analyzers
     
     print("2. Running Fundamentals...")
-    fund = fundamentals.analyze_fundamentals(data)
+    fund = fundamentals.analyze_fundamentals(ctx)
     print(f"MATCH: Fundamentals Score: {fund['score']:.2f}")
     
     print("3. Running Valuation...")
-    val = valuation.analyze_valuation(data)
+    val = valuation.analyze_valuation(ctx)
     print(f"MATCH: Valuation Score: {val['score']:.2f}")
     
     print("4. Running Technicals...")
-    tech = technicals.analyze_technicals(data)
+    tech = technicals.analyze_technicals(ctx)
     print(f"MATCH: Technicals Score: {tech['score']:.2f}")
     
     print("5. Running Risk...")
-    r = risk.analyze_risk(data)
+    r = risk.analyze_risk(ctx)
     print(f"MATCH: Risk Score: {r['score']:.2f}")
     
     print("6. Aggregating Scores...")
@@ -0,0 +1,113 @@
+import pandas as pd
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import data_fetcher
+import scoring
+from ai_insights import generate_fidelity_card
+
+# Watchlist evaluation for the app's Watchlist page.
+# evaluate_many fans fetch + analysis out over a bounded thread pool (the work is
+# network-bound), so a watchlist renders in about the time of its slowest ticker.
+# Analysis results are memoized per (ticker, last bar): a ticker is only re-analyzed
+# when its data actually moved. The HTML card is built on demand (card_html) so
+# collapsed rows cost nothing beyond the shared fetch.
+
+MAX_WORKERS = 8
+MAX_MEMO = 256 # Least recently used results are evicted past this
+
+_memo = OrderedDict() # (ticker, data timestamp) -> result
+_memo_lock = threading.Lock()
+
+def _data_timestamp(data):
+    """Last bar of the fetched history; identifies the data an analysis was run on."""
+    hist = data.get("history")
+    if hist is None or hist.empty:
+        return None
+    return pd.Timestamp(hist.index[-1]).isoformat()
+
+def _memo_get(key):
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    return None
+
+def _memo_put(key, result):
+    with _memo_lock:
+        _memo[key] = result
+        _memo.move_to_end(key)
+        while len(_memo) > MAX_MEMO:
+            _memo.popitem(last=False)
+
+def clear():
+    with _memo_lock:
+        _memo.clear()
+
+def analyze(ticker, data):
+    """Runs the four analyzers + factor_scores and builds the card metrics. Pure computation."""
+    fund_res, val_res, tech_res, risk_res, score_res = scoring.analyze(data)
+
+    # Build metrics for card
+    metrics = {
+        "ROE": (fund_res['metrics'].get('ROE') or 0) * 100,
+        "RevenueGrowth": fund_res['metrics'].get('Revenue Growth (3Y)') or fund_res['metrics'].get('Revenue Growth (1Y)') or 0,
+        "EPSGrowth": data['info'].get('earningsGrowth', 0),
+        "PE": val_res['metrics'].get('Trailing P/E') or 0,
+        "ForwardPE": val_res['metrics'].get('Forward P/E') or 0,
+        "DebtToEquity": (data['info'].get('debtToEquity') or 0),
+        "Price": tech_res['metrics'].get('Price') or 0,
+        "Beta": risk_res['metrics'].get('Beta') or 1.0,
+        "CompanyName": data['info'].get('longName', ticker),
+        "Rank": "N/A",
+        "TotalScore": score_res['total_score'] * 0.6,
+        "Score_Fundamentals": fund_res.get('score', 0) * 10,
+        "Score_Technicals": tech_res.get('score', 0) * 10,
+        "Score_Risk": risk_res.get('score', 0) * 10
+    }
+    return {
+        "ticker": ticker,
+        "rating": score_res['recommendation'].split(" ")[0].upper(),
+        "total_score": score_res['total_score'],
+        "scores": score_res,
+        "metrics": metrics,
+        "error": None,
+    }
+
+def evaluate(ticker, fetch=None):
+    """
+    Fetch + analyze one ticker. Never raises: failures come back as {"ticker", "error"}.
+    `fetch` defaults to data_fetcher.get_stock_data; the app passes its cached version.
+    """
+    fetch = fetch or data_fetcher.get_stock_data
+    try:
+        data = fetch(ticker)
+        if not data:
+            return {"ticker": ticker, "error": "No data found"}
+        key = (ticker, _data_timestamp(data))
+        result = _memo_get(key)
+        if result is None:
+            result = analyze(ticker, data)
+            result["data_timestamp"] = key[1]
+            _memo_put(key, result)
+        return result
+    except Exception as e:
+        return {"ticker": ticker, "error": str(e)}
+
+def evaluate_many(tickers, fetch=None, workers=MAX_WORKERS, thread_init=None):
+    """
+    Evaluates a watchlist concurrently. Returns {ticker: result} in watchlist order.
+    thread_init runs once in each worker (the app uses it to attach its script context).
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}
+    if workers <= 1 or len(tickers) == 1:
+        return {t: evaluate(t, fetch) for t in tickers}
+    with ThreadPoolExecutor(max_workers=min(workers, len(tickers)), initializer=thread_init) as pool:
+        results = list(pool.map(lambda t: evaluate(t, fetch), tickers))
+    return dict(zip(tickers, results))
+
+def card_html(result):
+    """Analyst card for one evaluated ticker (built only when a row is opened)."""
+    return generate_fidelity_card(result["ticker"], result["rating"], result["metrics"])